@@ -1,8 +1,18 @@
 import sys
 import os
-import shutil
 import subprocess
 import logging
+import argparse
+import importlib.util
+import io
+import itertools
+import threading
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from datetime import datetime
 
 # === 版权信息 ===
@@ -14,7 +24,7 @@ def show_copyright():
 
 # === 依赖检查模块 ===
 def check_dependencies():
-    """强制优先执行的依赖检查"""
+    """强制优先执行的依赖检查（只查找模块不导入，依赖齐全时几乎没有开销）"""
     required = {
         'Pillow': 'PIL',
         'rawpy': 'rawpy',
@@ -23,9 +33,7 @@ def check_dependencies():
 
     missing = []
     for pkg, imp in required.items():
-        try:
-            __import__(imp)
-        except ImportError:
+        if importlib.util.find_spec(imp) is None:
             missing.append(pkg)
 
     # 检查ffmpeg
@@ -60,25 +68,73 @@ def check_dependencies():
             input("按下 [Enter] 键退出...")
             sys.exit(1)
 
-# === 强制优先执行依赖检查 ===
-check_dependencies()
-
-# === 导入第三方库（依赖检查通过后执行）===
+# === 导入模块（Pillow、rawpy、pillow_heif在首次用到对应格式时才导入）===
 import re
-from PIL import Image
-import pillow_heif
-import rawpy
-
-# 初始化HEIF支持
-pillow_heif.register_heif_opener()
+import archive_input
+import raw_probe
+import heif_probe
+import image_probe
+import video_probe
+import media_cache
+import journal
+import link_view
+import transfer
+import run_stats
+import watcher
+import decoder_pool
+import dedup
+import exif
+import io_scheduler
+import media_keys
+import output_dirs
+import progress
+import shard
 
 # === 文件类型配置 ===
+RAW_EXTS = ('.arw', '.dng', '.cr2', '.nef', '.raf', '.sr2', '.pef', '.orf')
+
 IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', 
-             '.webp', '.heic', '.arw', '.dng', '.cr2',
+             '.webp', '.heic', '.heif', '.arw', '.dng', '.cr2',
              '.nef', '.raf', '.sr2', '.pef', '.orf')
 
-VIDEO_EXTS = ('.mp4', '.mov', '.avi', '.mkv', '.flv',
-             '.wmv', '.mpeg', '.mpg', '.m4v', '.3gp')
+VIDEO_EXTS = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.flv',
+             '.wmv', '.asf', '.mpeg', '.mpg', '.m4v', '.3gp')
+
+# 扩展名 -> 媒体类型
+EXT_KINDS = {**{ext: "photo" for ext in IMAGE_EXTS}, **{ext: "video" for ext in VIDEO_EXTS}}
+
+
+# === 并行配置 ===
+PIPELINE_DEPTH = 4      # 每个探测线程最多预先排队的文件数
+TYPE_LOOKAHEAD = 5000   # 开始处理前为确定媒体类型组合最多预读的扫描条目数
+
+# === 探测时限 ===
+DEFAULT_PROBE_TIMEOUT = 60      # ffmpeg和原生解码库探测单个文件的默认时限（秒）
+QUARANTINE_FOLDER = "损坏"       # 启用隔离时无法探测的文件移入的目录
+MAX_NAME_RETRIES = 8            # 目标文件名被其他程序占用时重新分配文件名的次数
+# 旧版本创建的分类目录没有登记，按固定的目录名识别
+LEGACY_OUTPUT_FOLDERS = {f"{orientation}{media}" for orientation in ('横屏', '竖屏', '方屏')
+                         for media in ('图片', '视频', '媒体')} | {dedup.DUPLICATE_FOLDER, QUARANTINE_FOLDER}
+
+# === 缓存与日志配置 ===
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media_cache.sqlite3")
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal")
+
+# === 格式后端（按需加载） ===
+_heif_lock = threading.Lock()
+_heif_registered = False
+
+def load_image_backend(ext):
+    """导入Pillow；HEIC/HEIF文件首次出现时才导入pillow_heif并注册HEIF解码器"""
+    global _heif_registered
+    from PIL import Image
+    if ext in heif_probe.HEIF_EXTS and not _heif_registered:
+        with _heif_lock:
+            if not _heif_registered:
+                import pillow_heif
+                pillow_heif.register_heif_opener()
+                _heif_registered = True
+    return Image
 
 # === 日志配置 ===
 class ColorFormatter(logging.Formatter):
@@ -88,22 +144,172 @@ class ColorFormatter(logging.Formatter):
         logging.INFO: "\033[36m[INFO]\033[0m %(message)s"
     }
 
+    def __init__(self):
+        super().__init__()
+        # 每个级别的格式化器只创建一次
+        self._formatters = {level: logging.Formatter(fmt) for level, fmt in self.FORMATS.items()}
+        self._default = logging.Formatter()
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
-        return formatter.format(record)
+        return self._formatters.get(record.levelno, self._default).format(record)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 handler = logging.StreamHandler()
 handler.setFormatter(ColorFormatter())
 logger.addHandler(handler)
+file_logger = logger.getChild("files")     # 逐个文件的记录（显示进度行时不输出到控制台）
+
+# === 运行状态 ===
+class RunContext:
+    """一次运行（或嵌入接口的一个批次）的全部状态，由处理流程的各个函数逐层传递
+
+    不使用模块全局状态，同一进程中的多个运行互不影响。log为接收日志的logger（默认为本模块的logger），
+    逐个文件的记录写入其子logger "files"。
+    """
+
+    def __init__(self, template=None, stats=None, log=None):
+        self.logger = log or logger
+        self.file_logger = self.logger.getChild("files")    # 逐个文件的记录（显示进度行时不输出到控制台）
+        self.journal = None         # 操作日志（None表示不记录）
+        self.ignored_files = 0      # 不支持文件计数器
+        self.processed_files = 0    # 已处理文件计数器
+        self.duplicate_files = 0    # 跳过或链接的重复文件计数器
+        self.failed_files = 0       # 探测失败（损坏或超时）的文件计数器
+        self.counter_lock = threading.Lock()
+        self.media_types = set()    # 检测到的媒体类型
+        self.cache = None           # 探测结果缓存（None表示不使用缓存）
+        self.stats = stats or run_stats.RunStats()      # 分阶段耗时统计（默认不启用）
+        self.template = template or media_keys.FolderTemplate(media_keys.DEFAULT_TEMPLATE)   # 分类目录模板
+        self.output_dirs = output_dirs.OutputDirs()     # 程序新建的分类目录登记表
+        self.target_dirs = TargetDirs(registry=self.output_dirs)    # 分类目录及文件名占用表
+        self.progress_line = None   # 控制台进度行（None表示逐个文件输出日志）
+        self.result_sink = None     # 逐个文件的处理结果回调（嵌入接口使用，None表示不回调）
+        self.extracted_members = None   # 续跑时已解压的压缩包成员 (压缩包, 成员名)
+        self.plan = None            # 规划模式下的计划文件（None表示直接移动）
+        self.view = None            # 链接视图（None表示移动文件）
+        self.probe_timeout = None   # ffmpeg和解码进程的探测时限（秒，None表示不限时）
+        self.decoders = None        # 原生解码进程池（None表示在当前进程解码）
+        self.quarantine = False     # 是否把探测失败的文件移到隔离目录
+        self.transfer_pool = None   # 跨设备复制线程池（None表示在当前线程复制）
+        self.transfer_slots = None  # 限制排队中的跨设备复制数量
+        self.verify_mode = "size"   # 跨设备复制后删除源文件前的校验方式
+        self.duplicate_index = None     # 重复文件索引（None表示不检测重复）
+        self.duplicate_action = None    # 重复文件的处理方式：skip / hardlink / folder
+
+    def report(self, status, file_path, dest=None, original=None, error=None):
+        """把单个文件的处理结果交给result_sink：moved / extracted / linked / planned / duplicate / ignored / failed"""
+        if self.result_sink is not None:
+            self.result_sink(status, file_path, dest, original, error)
+
+    def counters(self):
+        """统计报告中的文件计数"""
+        return {"processed_files": self.processed_files, "duplicate_files": self.duplicate_files,
+                "ignored_files": self.ignored_files, "failed_files": self.failed_files}
+
+    def is_classified_folder(self, path):
+        """目录是否由程序创建（分片、监视模式和嵌入接口不进入这些目录）：登记表中的分类目录，
+        或是旧版本创建的（没有登记）默认模板、重复和隔离目录"""
+        return os.path.basename(path) in LEGACY_OUTPUT_FOLDERS or path in self.output_dirs
+
+# === 目录扫描 ===
+class MediaEntry:
+    """扫描得到的文件条目，缓存扩展名分类和DirEntry的stat结果"""
+    __slots__ = ('path', 'base_dir', 'ext', 'kind', '_entry', '_stat')
+
+    def __init__(self, path, base_dir, entry=None):
+        self.path = path
+        self.base_dir = base_dir
+        self.ext = os.path.splitext(path)[1].lower()
+        self.kind = EXT_KINDS.get(self.ext)     # "photo" / "video" / None（不支持）
+        self._entry = entry
+        self._stat = None
 
-# === 全局状态 ===
-operations = []         # 操作记录
-ignored_files = 0       # 不支持文件计数器
-processed_files = 0     # 已处理文件计数器
-media_types = set()     # 检测到的媒体类型
+    def stat(self):
+        if self._stat is None:
+            self._stat = self._entry.stat() if self._entry else os.stat(self.path)
+        return self._stat
+
+    def inode(self):
+        # Windows上DirEntry.stat()的st_ino恒为0，需单独读取
+        return self._entry.inode() if self._entry else self.stat().st_ino
+
+def _scan_dir(top, keep_dir=None, skip_dir=None, quiet=False, log=logger):
+    """单次遍历目录树（顺序与os.walk一致：先本目录文件，再依次进入子目录）
+
+    keep_dir(目录) 返回False时跳过该目录中的文件，但仍进入其子目录；skip_dir(目录) 返回True时不进入该子目录。
+    链接视图目录（含视图清单）中只有指向其他文件的链接，整个跳过。quiet为True时不记录无法读取的目录。
+    """
+    stack = [top]
+    while stack:
+        root = stack.pop()
+        files, subdirs = [], []
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            if not entry.is_symlink() and not (skip_dir and skip_dir(entry.path)):
+                                subdirs.append(entry.path)
+                        else:
+                            files.append(entry)
+                    except OSError:
+                        files.append(entry)
+        except OSError as e:
+            if not quiet:
+                log.warning(f"无法读取目录: {root} - {str(e)}")
+            continue
+        if any(entry.name == link_view.MANIFEST_NAME for entry in files):
+            continue
+
+        if keep_dir is None or keep_dir(root):
+            for entry in files:
+                yield MediaEntry(entry.path, root, entry)
+        stack.extend(reversed(subdirs))
+
+def scan_paths(ctx, paths, shard_spec=None, skip_classified=False, quiet=False):
+    """展开输入路径，逐个返回MediaEntry（生成器，不缓存整棵目录树）
+
+    shard_spec为 (i, N) 时只返回按相对目录划分给第i个分片的文件，并且不进入分类目录
+    （其他分片可能正在向其中移动文件）；skip_classified为True时同样不进入分类目录。
+    quiet为True时不记录不存在的路径和无法读取的目录（如只为统计总数的遍历）。
+    """
+    skip_dir = ctx.is_classified_folder if shard_spec or skip_classified else None
+    for path in paths:
+        if os.path.isfile(path):
+            if shard_spec and not shard.owns(os.path.dirname(path), os.path.dirname(path), *shard_spec):
+                continue
+            yield MediaEntry(path, os.path.dirname(path))
+        elif os.path.isdir(path):
+            keep_dir = (lambda d, top=path: shard.owns(top, d, *shard_spec)) if shard_spec else None
+            yield from _scan_dir(path, keep_dir, skip_dir, quiet, ctx.logger)
+        elif not quiet:
+            ctx.logger.warning(f"路径不存在: {path}")
+
+def scan_pending(ctx, paths, shard_spec=None, moved=None, quiet=False):
+    """扫描输入路径，跳过续跑日志中已处理的文件"""
+    entries = scan_paths(ctx, paths, shard_spec, quiet=quiet)
+    if moved:
+        entries = (entry for entry in entries if media_cache.normalize_path(entry.path) not in moved)
+    return entries
+
+def summarize_media_types(entries, limit=TYPE_LOOKAHEAD):
+    """预读扫描结果以确定媒体类型组合，返回 (媒体类型集合, 完整的条目迭代器)
+
+    同时发现照片和视频或已预读limit个条目时停止预读，已读取的条目会在返回的迭代器中优先输出；
+    前limit个条目中只有一种类型时按单一类型处理（之后出现的另一种类型按默认方式分开分类）。
+    """
+    found = set()
+    buffered = []
+    for entry in entries:
+        buffered.append(entry)
+        if entry.kind:
+            found.add(entry.kind)
+            if len(found) > 1:
+                break
+        if len(buffered) >= limit:
+            break
+    return found, itertools.chain(buffered, entries)
 
 # === 核心功能 ===
 def get_unique_path(target_path):
@@ -123,81 +329,269 @@ def get_unique_path(target_path):
 
     return os.path.join(base_dir, new_name)
 
-def get_orientation(file_path):
-    """获取媒体方向信息（修复视频旋转判断）"""
+class TargetDirs:
+    """分类目录管理：每个目录只创建并列出一次，之后在内存中分配不冲突的文件名
+
+    命名规则与get_unique_path一致。占用表只反映首次列出时的目录内容和本次运行分配的文件名；
+    运行期间由其他程序写入分类目录的同名文件在移动时才被发现（移动不覆盖已有文件），届时重新分配文件名。
+    新建分类目录时把其中最上层新建的目录记入registry（见output_dirs.OutputDirs）。
+    """
+
+    def __init__(self, create=True, registry=None):
+        self.create = create    # False时只分配文件名，不创建目录（规划模式）
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._names = {}        # 目录 -> 已占用的文件名（normcase）
+        self._counters = {}     # (目录, 冲突文件名) -> 下一个序号
+
+    def _make(self, target_dir):
+        """创建分类目录，并登记其中最上层新建的目录（已存在的源文件夹不登记）"""
+        top = None
+        d = target_dir
+        while not os.path.isdir(d):
+            top = d
+            parent = os.path.dirname(d)
+            if parent == d:
+                break
+            d = parent
+        if top is None:
+            return
+        # 先登记再创建：监视模式和其他分片可能在目录创建后立即扫描到它
+        if self.registry is not None:
+            self.registry.add(top)
+        os.makedirs(target_dir, exist_ok=True)
+
+    def _taken(self, target_dir):
+        names = self._names.get(target_dir)
+        if names is None:
+            if self.create:
+                self._make(target_dir)
+            try:
+                with os.scandir(target_dir) as it:
+                    names = {os.path.normcase(entry.name) for entry in it}
+            except FileNotFoundError:
+                if self.create:
+                    raise
+                names = set()
+            self._names[target_dir] = names
+        return names
+
+    def reserve(self, target_dir, file_name):
+        """为文件分配目标路径并登记占用"""
+        with self._lock:
+            names = self._taken(target_dir)
+            name = file_name
+            if os.path.normcase(name) in names:
+                base_name, ext = os.path.splitext(file_name)
+                prefix = f"{base_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                name = f"{prefix}{ext}"
+                if os.path.normcase(name) in names:
+                    key = (target_dir, os.path.normcase(name))
+                    counter = self._counters.get(key, 1)
+                    while os.path.normcase(name) in names:
+                        name = f"{prefix}_{counter}{ext}"
+                        counter += 1
+                    self._counters[key] = counter
+            names.add(os.path.normcase(name))
+            return os.path.join(target_dir, name)
+
+    def release(self, target_path):
+        """移动失败时释放已分配的文件名"""
+        with self._lock:
+            names = self._names.get(os.path.dirname(target_path))
+            if names is not None:
+                names.discard(os.path.normcase(os.path.basename(target_path)))
+
+# === 媒体探测 ===
+def _pil_metadata(tags, meta):
+    """从Pillow读取的EXIF中取拍摄时间和相机型号"""
+    if meta is None:
+        return
+    taken = tags.get_ifd(exif.TAG_EXIF_IFD).get(exif.TAG_DATETIME_ORIGINAL) or tags.get(exif.TAG_DATETIME)
+    if isinstance(taken, str) and exif.format_datetime(taken):
+        meta.setdefault("taken", exif.format_datetime(taken))
+    camera = exif.camera_name(tags.get(exif.TAG_MAKE), tags.get(exif.TAG_MODEL))
+    if camera:
+        meta.setdefault("camera", camera)
+
+def probe_raw_size(ctx, file_path, meta=None):
+    """读取RAW文件尺寸和EXIF方向，返回 (宽, 高, 方向)；meta为字典时同时读取拍摄时间和相机型号"""
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        with ctx.stats.timer("probe.raw_header", ext):
+            return raw_probe.probe_raw(file_path, meta)
+    except raw_probe.RawProbeError as e:
+        ctx.logger.warning(f"RAW文件头解析失败，改用rawpy: {os.path.basename(file_path)} - {str(e)}")
+
+    with ctx.stats.timer("probe.rawpy", ext):
+        return run_decoder(ctx, decode_raw_size, file_path)
+
+def probe_image_size(ctx, file_path, meta=None):
+    """按文件内容识别格式并读取尺寸和EXIF方向，返回 (宽, 高, 方向)；无法解析时回退到Pillow
+
+    扩展名与内容不符的文件（如保存为.jpg的PNG或HEIC）按实际格式解析。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        with ctx.stats.timer("probe.header", ext):
+            _, width, height, orientation = image_probe.probe_image(file_path, meta)
+        return width, height, orientation
+    except image_probe.ImageProbeError as e:
+        kind = e.kind
+        ctx.logger.warning(f"图片文件头解析失败，改用Pillow: {os.path.basename(file_path)} - {str(e)}")
+
+    # 内容为HEIF时需要注册pillow_heif，与扩展名无关
+    with ctx.stats.timer("probe.pil", ext):
+        width, height, orientation, decoded = run_decoder(
+            ctx, decode_image_size, file_path, '.heic' if kind == "heif" else ext, meta is not None)
+    if decoded:
+        for name, value in decoded.items():
+            meta.setdefault(name, value)
+    return width, height, orientation
+
+# === 原生解码（在解码进程中运行） ===
+def decode_raw_size(file_path):
+    """用rawpy读取RAW尺寸和方向，返回 (宽, 高, 方向)"""
+    import rawpy
+    with rawpy.imread(file_path) as raw:
+        # rawpy的flip: 5/6 表示旋转90度
+        return raw.sizes.width, raw.sizes.height, raw.sizes.flip
+
+def decode_image_size(file_path, backend_ext, details=False):
+    """用Pillow读取尺寸和EXIF方向，返回 (宽, 高, 方向, 拍摄时间和相机型号或None)"""
+    Image = load_image_backend(backend_ext)
+    meta = {} if details else None
+    with Image.open(file_path) as img:
+        tags = img.getexif()
+        _pil_metadata(tags, meta)
+        return img.width, img.height, tags.get(274, 1), meta
+
+def run_decoder(ctx, func, *args):
+    """在解码进程中执行原生解码，超过探测时限时结束该进程；未启用解码进程时在当前线程执行"""
+    if ctx.decoders is None:
+        return func(*args)
+    return ctx.decoders.call(func, args, ctx.probe_timeout)
+
+def open_decoders(ctx, timeout, workers):
+    """设置探测时限并启用原生解码进程（首次需要时才启动）"""
+    ctx.probe_timeout = timeout or None
+    ctx.decoders = decoder_pool.DecoderPool(workers)
+
+def close_decoders(ctx):
+    if ctx.decoders is not None:
+        ctx.decoders.close()
+        ctx.decoders = None
+
+def probe_video_ffmpeg(ctx, file_path, meta=None):
+    """调用ffmpeg读取视频分辨率和旋转角度，返回 (宽, 高, 旋转角度)；meta为字典时同时读取拍摄时间"""
+    ffmpeg_path = os.path.join(os.path.dirname(__file__), "library", "ffmpeg.exe")
+
+    cmd = [ffmpeg_path, "-i", file_path]
+    with ctx.stats.timer("probe.ffmpeg", os.path.splitext(file_path)[1].lower()):
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            _, stderr = process.communicate(timeout=ctx.probe_timeout)
+        except subprocess.TimeoutExpired:
+            # 截断或损坏的视频可能让ffmpeg长时间不退出
+            process.kill()
+            process.communicate()
+            raise decoder_pool.ProbeTimeout(f"探测超时（{ctx.probe_timeout:g}秒）") from None
+    output = stderr.decode('utf-8')
+
+    # 改进分辨率匹配逻辑
+    resolution_match = re.search(r'Stream.*Video.* (\d+)x(\d+)', output)
+    if not resolution_match:
+        return None
+
+    width = int(resolution_match.group(1))
+    height = int(resolution_match.group(2))
+
+    # 改进旋转检测逻辑
+    rotation_match = re.search(r'rotation of ([-+]?\d+\.\d+) degrees', output)
+    rotation = 0.0
+    if rotation_match:
+        rotation = float(rotation_match.group(1))
+
+    if meta is not None:
+        time_match = re.search(r'creation_time\s*:\s*(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})', output)
+        if time_match:
+            meta.setdefault("taken", f"{time_match.group(1)} {time_match.group(2)}")
+        model_match = re.search(r'com\.apple\.quicktime\.model\s*:\s*(.+)', output)
+        if model_match:
+            meta.setdefault("camera", model_match.group(1).strip())
+
+    return width, height, rotation
+
+def probe_video_size(ctx, file_path, meta=None):
+    """读取视频分辨率和旋转角度：常见容器直接解析文件头，其余格式或解析失败时使用ffmpeg"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in video_probe.HEADER_EXTS:
+        try:
+            with ctx.stats.timer("probe.mp4" if ext in video_probe.MP4_EXTS else "probe.container", ext):
+                return video_probe.probe_video(file_path, meta)
+        except video_probe.VideoProbeError as e:
+            ctx.logger.warning(f"视频容器解析失败，改用ffmpeg: {os.path.basename(file_path)} - {str(e)}")
+
+    return probe_video_ffmpeg(ctx, file_path, meta)
+
+class ProbeFailed:
+    """探测失败的结果：与None一样为假值，reason为失败原因"""
+    __slots__ = ('reason',)
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __bool__(self):
+        return False
+
+def probe_media(ctx, file_path, details=False):
+    """探测媒体方向，返回 (方向, 宽, 高, 旋转, 拍摄时间, 相机)；旋转对图片为EXIF方向，对视频为角度
+
+    details为True时在同一次读取中取拍摄时间和相机型号（否则这两项为None）。
+    探测失败时返回ProbeFailed（假值）；每个文件的探测耗时计入统计报告的最慢文件列表。
+    """
+    start = time.perf_counter()
+    try:
+        return _probe_media(ctx, file_path, details)
+    finally:
+        if ctx.stats.enabled:
+            ctx.stats.add_file(os.path.abspath(file_path), time.perf_counter() - start)
+
+def _probe_media(ctx, file_path, details):
     try:
         ext = os.path.splitext(file_path)[1].lower()
-        width = height = 0
+        meta = {} if details else None
 
         # 处理图片
-               # 处理图片
         if ext in IMAGE_EXTS:
-            media_types.add("photo")
+            ctx.media_types.add("photo")
             
-            # ===== 改进的RAW文件处理逻辑 =====
-            if ext == '.dng':
-               with rawpy.imread(file_path) as raw:
-                    width = raw.sizes.width
-                    height = raw.sizes.height
-                    # 如果是DNG文件，读取EXIF方向信息
-                    try:
-                        img = Image.open(file_path)
-                        exif = img.getexif()
-                        orientation = exif.get(274, 1)
-                        # 根据EXIF方向调整
-                        if orientation in [5, 6, 7, 8]:
-                            width, height = height, width
-                    except Exception as e:
-                        logger.warning(f"无法读取DNG文件EXIF方向: {str(e)}")
-
-            elif ext in ('.arw', '.cr2', '.nef', '.raf', '.sr2', '.pef', '.orf'):
-                # 其他RAW格式：仅使用rawpy处理
-                with rawpy.imread(file_path) as raw:
-                    width = raw.sizes.width
-                    height = raw.sizes.height
-                    # 部分RAW文件可能需要交换宽高
-                    if raw.sizes.flip in (5, 6, 7, 8):
-                        width, height = height, width
+            # ===== RAW文件：优先解析文件头，失败时回退到rawpy =====
+            if ext in RAW_EXTS:
+                raw_width, raw_height, orientation = probe_raw_size(ctx, file_path, meta)
 
             else:
-                # 普通图片处理（非RAW格式）
-                with Image.open(file_path) as img:
-                    exif = img.getexif()
-                    orientation = exif.get(274, 1)
-                    if orientation in [5, 6, 7, 8]:
-                        width, height = img.height, img.width
-                    else:
-                        width, height = img.width, img.height
+                # 普通图片：按魔数识别实际格式后解析文件头（HEIC读取ispe/irot），失败时回退到Pillow
+                raw_width, raw_height, orientation = probe_image_size(ctx, file_path, meta)
             # ===== 改进结束 =====
 
-            return '方屏' if width == height else '竖屏' if height > width else '横屏'
+            width, height = raw_width, raw_height
+            if orientation in [5, 6, 7, 8]:
+                width, height = height, width
+
+            result = '方屏' if width == height else '竖屏' if height > width else '横屏'
+            return (result, raw_width, raw_height, orientation) + _details(meta)
 
         # 处理视频
         elif ext in VIDEO_EXTS:
-            media_types.add("video")
+            ctx.media_types.add("video")
             
-            ffmpeg_path = os.path.join(os.path.dirname(__file__), "library", "ffmpeg.exe")
-            # 已存在的ffmpeg路径检查...
-
-            cmd = [ffmpeg_path, "-i", file_path]
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            _, stderr = process.communicate()
-            output = stderr.decode('utf-8')
-
-            # 改进分辨率匹配逻辑
-            resolution_match = re.search(r'Stream.*Video.* (\d+)x(\d+)', output)
-            if not resolution_match:
-                logger.error(f"无法获取视频分辨率: {os.path.basename(file_path)}")
-                return None
-
-            width = int(resolution_match.group(1))
-            height = int(resolution_match.group(2))
-
-            # 改进旋转检测逻辑
-            rotation_match = re.search(r'rotation of ([-+]?\d+\.\d+) degrees', output)
-            rotation = 0.0
-            if rotation_match:
-                rotation = float(rotation_match.group(1))
+            video_size = probe_video_size(ctx, file_path, meta)
+            if not video_size:
+                ctx.logger.error(f"无法获取视频分辨率: {os.path.basename(file_path)}")
+                return ProbeFailed("无法获取视频分辨率")
+            raw_width, raw_height, rotation = video_size
+            width, height = raw_width, raw_height
 
             # 根据实际旋转角度判断方向
             actual_rotation = abs(rotation) % 360
@@ -208,153 +602,1322 @@ def get_orientation(file_path):
                 width, height = height, width
 
             # 最终方向判断
-            if width == height:
-                return '方屏'
-            return '竖屏' if height > width else '横屏'
+            result = '方屏' if width == height else '竖屏' if height > width else '横屏'
+            return (result, raw_width, raw_height, rotation) + _details(meta)
 
         return None
 
     except Exception as e:
-        logger.error(f"处理失败: {os.path.basename(file_path)} - {str(e)}")
+        ctx.logger.error(f"处理失败: {os.path.basename(file_path)} - {str(e)}")
+        return ProbeFailed(str(e))
+
+def _details(meta):
+    return (meta.get("taken"), meta.get("camera")) if meta else (None, None)
+
+def get_orientation(file_path, ctx=None):
+    """获取媒体方向信息（修复视频旋转判断）"""
+    result = probe_media(ctx or RunContext(), file_path)
+    return result[0] if result else None
+
+_worker_context = None      # 进程池子进程中的探测状态（每个子进程一个）
+
+def probe_media_in_process(file_path, details, timeout, with_stats):
+    """在进程池中探测，返回 (探测结果, 统计数据, 最慢文件记录)；with_stats为False时后两项为None"""
+    global _worker_context
+    if _worker_context is None:
+        _worker_context = RunContext(stats=run_stats.RunStats(enabled=True))
+    ctx = _worker_context
+    ctx.probe_timeout = timeout
+    ctx.stats.reset()
+    result = probe_media(ctx, file_path, details)
+    if not with_stats:
+        return result, None, None
+    return result, ctx.stats.export(), ctx.stats.export_files()
+
+def lookup_cache(ctx, entry):
+    """查询缓存中未变化文件的探测结果，未命中返回None"""
+    if ctx.cache is None:
+        return None
+    try:
+        with ctx.stats.timer("cache", entry.ext):
+            return ctx.cache.get(entry.path, entry.stat(), entry.inode(), ctx.template.needs_details)
+    except OSError:
         return None
 
+def store_cache(ctx, entry, result):
+    """保存探测结果到缓存（探测失败的文件不缓存）"""
+    if ctx.cache is None or not result:
+        return
+    try:
+        ctx.cache.put(entry.path, entry.stat(), entry.inode(), result, ctx.template.needs_details)
+    except OSError:
+        pass
 
-def process_file(file_path, base_dir, separate_mode):
-    """处理单个文件"""
-    global ignored_files, processed_files
+def open_cache(ctx, rebuild=False):
+    """打开程序目录下的缓存数据库，失败时不使用缓存继续运行"""
+    try:
+        ctx.cache = media_cache.MediaCache(CACHE_PATH, rebuild=rebuild)
+    except Exception as e:
+        ctx.logger.warning(f"无法打开缓存，本次不使用缓存: {str(e)}")
+        ctx.cache = None
+
+def close_cache(ctx):
+    if ctx.cache is not None:
+        try:
+            ctx.cache.close()
+        except Exception as e:
+            ctx.logger.warning(f"缓存保存失败: {str(e)}")
+        ctx.cache = None
+
+def check_supported(ctx, entry):
+    """检查文件类型，不支持的文件计入忽略数"""
+    if entry.kind is None:
+        ctx.logger.warning(f"不支持的文件类型: {os.path.basename(entry.path)}")
+        with ctx.counter_lock:
+            ctx.ignored_files += 1
+        ctx.report("ignored", entry.path)
+        return False
+    return True
+
+def get_folder_name(ctx, entry, result, separate_mode):
+    """按目录模板确定分类目录（可为多级）；没有拍摄时间时使用文件修改时间"""
+    mtime = None
+    if ctx.template.needs_details and not result[4]:
+        try:
+            mtime = entry.stat().st_mtime
+        except OSError:
+            pass
+    return render_folder(ctx, entry.path, entry.kind, result, separate_mode, mtime)
+
+def render_folder(ctx, path, kind, result, separate_mode, mtime=None):
+    """由探测结果生成分类目录；mtime为没有拍摄时间时使用的修改时间"""
+    taken = media_keys.mtime_datetime(mtime) if mtime is not None else None
+    return ctx.template.render(media_keys.MediaInfo(path, kind, result, separate_mode, taken))
+
+def move_file(ctx, file_path, base_dir, folder_name, file_name=None, failure=None):
+    """移动文件到分类目录（冲突处理和操作记录只在此处进行）；failure为隔离原因时移到隔离目录"""
+    # 链接视图：原文件不动，在视图目录中建立链接
+    if ctx.view is not None:
+        link_file(ctx, file_path, folder_name)
+        return
 
     ext = os.path.splitext(file_path)[1].lower()
-    if ext not in IMAGE_EXTS + VIDEO_EXTS:
-        logger.warning(f"不支持的文件类型: {os.path.basename(file_path)}")
-        ignored_files += 1
+    target_dir = os.path.join(base_dir, folder_name)
+
+    # 重复检测：与目标目录中大小相同的文件比较，重复文件跳过、链接或改放到重复目录
+    size = None
+    if ctx.duplicate_index is not None and failure is None:
+        try:
+            size = os.path.getsize(file_path)
+            with ctx.stats.timer("dedup", ext):
+                original = ctx.duplicate_index.find(file_path, size, target_dir)
+        except OSError as e:
+            ctx.logger.error(f"移动失败: {str(e)}")
+            ctx.report("failed", file_path, error=str(e))
+            return
+        if original is not None:
+            if ctx.duplicate_action != "folder":
+                handle_duplicate(ctx, file_path, original, ctx.duplicate_action)
+                return
+            folder_name = dedup.DUPLICATE_FOLDER
+            target_dir = os.path.join(base_dir, folder_name)
+            size = None
+
+    # 分配目标路径（目录在首次使用时创建）
+    try:
+        with ctx.stats.timer("reserve", ext):
+            target_path = ctx.target_dirs.reserve(target_dir, file_name or os.path.basename(file_path))
+    except OSError as e:
+        ctx.logger.error(f"移动失败: {str(e)}")
+        ctx.report("failed", file_path, error=str(e))
         return
 
-    orientation = get_orientation(file_path)
-    if not orientation:
+    # 规划模式：只写入计划，不移动文件（文件仍在原位置，按原位置登记到重复索引）
+    if ctx.plan is not None:
+        if size is not None:
+            ctx.duplicate_index.add(file_path, size, target_dir, os.path.abspath(target_path))
+        ctx.plan.record("move", src=os.path.abspath(file_path), folder=folder_name,
+                        dest=os.path.abspath(target_path))
+        with ctx.counter_lock:
+            ctx.processed_files += 1
+        ctx.report("planned", file_path, os.path.abspath(target_path))
         return
 
-    # 确定分类模式
-    media_type = "图片" if ext in IMAGE_EXTS else "视频"
-    folder_name = f"{orientation}{media_type}" if separate_mode else f"{orientation}媒体"
+    try:
+        cross_device = transfer.is_cross_device(file_path, os.path.dirname(target_path))
+        # 先记录再移动：进程在两步之间退出时，撤销会跳过不存在的目标文件
+        if ctx.journal is not None:
+            with ctx.stats.timer("journal", ext):
+                journal_move(ctx, file_path, target_path, cross_device, failure)
+    except Exception as e:
+        ctx.target_dirs.release(target_path)
+        ctx.logger.error(f"移动失败: {str(e)}")
+        ctx.report("failed", file_path, error=str(e))
+        return
 
-    # 创建目标目录
-    target_dir = os.path.join(base_dir, folder_name)
-    os.makedirs(target_dir, exist_ok=True)
+    # 缓存只在当前线程更新；移动失败只会导致下次重新探测该文件
+    if ctx.cache is not None and not cross_device:
+        ctx.cache.rename(file_path, target_path)
 
-    # 移动文件
-    target_path = get_unique_path(os.path.join(target_dir, os.path.basename(file_path)))
+    # 同设备重命名直接完成，跨设备复制可交给线程池并发执行
+    if ctx.transfer_pool is None or not cross_device:
+        transfer_file(ctx, file_path, target_path, folder_name, cross_device, failure, size)
+    else:
+        ctx.transfer_slots.acquire()
+        future = ctx.transfer_pool.submit(transfer_file, ctx, file_path, target_path, folder_name, cross_device,
+                                          failure, size)
+        future.add_done_callback(lambda _: ctx.transfer_slots.release())
+
+def journal_move(ctx, file_path, target_path, cross_device, failure=None):
+    fields = {"copy": True} if cross_device else {}
+    if failure is not None:
+        fields["reason"] = failure
+    ctx.journal.record("move", src=os.path.abspath(file_path), dest=os.path.abspath(target_path), **fields)
+
+def _move_unclaimed(ctx, file_path, target_path, cross_device, failure=None):
+    """移动到target_path；该文件名在列出目录之后被其他程序（如另一个分片）占用时，重新分配文件名再移动
+
+    返回实际的目标路径。被占用的文件名保留在占用表中；重新分配时从原文件名开始，不在上次分配的文件名后叠加时间戳。
+    """
+    file_name = os.path.basename(file_path)
+    for attempt in range(MAX_NAME_RETRIES + 1):
+        try:
+            transfer.move(file_path, target_path, cross_device, ctx.verify_mode)
+            return target_path
+        except FileExistsError:
+            if attempt == MAX_NAME_RETRIES:
+                raise
+            new_path = ctx.target_dirs.reserve(os.path.dirname(target_path), file_name)
+            ctx.logger.warning(f"目标文件已存在，改用: {os.path.basename(target_path)} -> {os.path.basename(new_path)}")
+            # 日志中原来的移动记录作废（撤销时跳过），改记新的目标路径
+            if ctx.journal is not None:
+                ctx.journal.record("failed", src=os.path.abspath(file_path), error="目标文件已存在")
+                journal_move(ctx, file_path, new_path, cross_device, failure)
+            if ctx.cache is not None and not cross_device:
+                ctx.cache.rename(target_path, new_path)
+            target_path = new_path
+
+def transfer_file(ctx, file_path, target_path, folder_name, cross_device, failure=None, size=None):
+    """执行移动并计数（可在复制线程中运行）；隔离的文件不计入已处理数
+
+    size不为None时，移动完成后把目标文件登记到重复索引（复制完成前目标文件还不存在或未写完）。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    start = time.perf_counter()
     try:
-        shutil.move(file_path, target_path)
-        operations.append((file_path, target_path))
-        processed_files += 1
-        logger.info(f"已移动: {os.path.basename(file_path)} -> {folder_name}")
+        target_path = _move_unclaimed(ctx, file_path, target_path, cross_device, failure)
     except Exception as e:
-        logger.error(f"移动失败: {str(e)}")
+        if not isinstance(e, FileExistsError):
+            ctx.target_dirs.release(target_path)
+        if ctx.journal is not None:
+            ctx.journal.record("failed", src=os.path.abspath(file_path), error=str(e))
+        ctx.logger.error(f"移动失败: {str(e)}")
+        ctx.report("failed", file_path, error=str(e))
+        return
+    # 跨设备复制完成（源文件已删除）：撤销和续跑时不必再判断该复制是否中断
+    if cross_device and ctx.journal is not None:
+        ctx.journal.record("copied", src=os.path.abspath(file_path), dest=os.path.abspath(target_path))
+    if size is not None:
+        ctx.duplicate_index.add(target_path, size, os.path.dirname(target_path))
 
-def undo_operations():
-    """撤销所有操作"""
-    if not operations:
-        logger.info("没有可撤销的操作")
+    if ctx.stats.enabled:
+        elapsed = time.perf_counter() - start
+        try:
+            nbytes = os.path.getsize(target_path)
+        except OSError:
+            nbytes = 0
+        ctx.stats.add("copy" if cross_device else "rename", ext, elapsed, nbytes)
+
+    if failure is not None:
+        ctx.logger.warning(f"已隔离: {os.path.basename(file_path)} -> {folder_name}（{failure}）")
+        ctx.report("failed", file_path, os.path.abspath(target_path), error=failure)
         return
+    with ctx.counter_lock:
+        ctx.processed_files += 1
+    ctx.file_logger.info(f"已移动: {os.path.basename(file_path)} -> {folder_name}")
+    ctx.report("moved", file_path, os.path.abspath(target_path))
 
-    restored = 0
-    for src, dest in reversed(operations):
+def link_file(ctx, file_path, folder_name):
+    """在视图目录的分类目录中为文件建立链接（源文件已变化时先删除原有链接）"""
+    ext = os.path.splitext(file_path)[1].lower()
+    target_path = None
+    try:
+        st = os.stat(file_path)
+        old_link = ctx.view.discard(file_path)
+        if old_link is not None:
+            ctx.target_dirs.release(old_link)
+        with ctx.stats.timer("reserve", ext):
+            target_path = ctx.target_dirs.reserve(os.path.join(ctx.view.root, folder_name),
+                                                  os.path.basename(file_path))
+        with ctx.stats.timer("link", ext):
+            ctx.view.link(file_path, target_path, st)
+    except OSError as e:
+        if target_path is not None:
+            ctx.target_dirs.release(target_path)
+        ctx.logger.error(f"链接失败: {os.path.basename(file_path)} - {str(e)}")
+        ctx.report("failed", file_path, error=str(e))
+        return
+
+    with ctx.counter_lock:
+        ctx.processed_files += 1
+    ctx.file_logger.info(f"已链接: {os.path.basename(file_path)} -> {folder_name}")
+    ctx.report("linked", file_path, os.path.abspath(target_path))
+
+def view_unchanged(ctx, entry):
+    """链接视图中该文件的链接仍然有效，无需探测"""
+    if ctx.view is None:
+        return False
+    try:
+        return ctx.view.unchanged(entry.path, entry.stat(), entry.inode())
+    except OSError:
+        return False
+
+def open_view(ctx, view_dir, separate_mode, link_type):
+    """打开（或新建）链接视图，之后move_file改为在视图目录中建立链接"""
+    ctx.view = link_view.LinkView(view_dir, ctx.template.text, separate_mode, link_type)
+    if ctx.view.rebuilt:
+        ctx.logger.info("目录模板或分类模式已变化，已删除视图中原有的链接")
+    ctx.logger.info(f"链接视图: {ctx.view.root}")
+
+def close_view(ctx, scopes=None):
+    """结束链接视图：scopes为完整扫描过的输入路径（运行中断时为None，不删除链接）"""
+    view = ctx.view
+    if view is not None:
+        ctx.view = None
+        view.close(scopes)
+    return view
+
+def handle_duplicate(ctx, file_path, original, action):
+    """跳过重复文件，或用指向已有文件的硬链接替换它；决定先写入日志，撤销时可还原硬链接"""
+    fields = {"src": os.path.abspath(file_path), "original": os.path.abspath(original), "action": action}
+    if ctx.plan is not None:
+        ctx.plan.record("duplicate", **fields)
+    else:
+        if ctx.journal is not None:
+            ctx.journal.record("duplicate", **fields)
+        if action == "hardlink":
+            try:
+                dedup.link_duplicate(file_path, original)
+            except OSError as e:
+                ctx.logger.warning(f"无法创建硬链接，已跳过: {os.path.basename(file_path)} - {str(e)}")
+
+    with ctx.counter_lock:
+        ctx.duplicate_files += 1
+    ctx.file_logger.info(f"重复文件: {os.path.basename(file_path)} = {os.path.basename(original)}")
+    ctx.report("duplicate", file_path, original=os.path.abspath(original))
+
+def open_duplicates(ctx, action):
+    """启用重复文件检测"""
+    if action:
+        ctx.duplicate_index = dedup.DuplicateIndex()
+        ctx.duplicate_action = action
+
+def close_duplicates(ctx):
+    ctx.duplicate_index = None
+    ctx.duplicate_action = None
+
+def open_transfers(ctx, transfers, verify):
+    """配置跨设备复制的并发数和校验方式"""
+    ctx.verify_mode = verify
+    if transfers > 1:
+        ctx.transfer_pool = ThreadPoolExecutor(transfers)
+        ctx.transfer_slots = threading.BoundedSemaphore(transfers * PIPELINE_DEPTH)
+
+def close_transfers(ctx):
+    """等待排队中的复制全部完成"""
+    if ctx.transfer_pool is not None:
+        ctx.transfer_pool.shutdown(wait=True)
+        ctx.transfer_pool = None
+
+# === 规划与执行 ===
+def open_plan(ctx, plan_path, paths, separate_mode, shard_spec=None):
+    """新建计划文件，之后move_file只分配目标路径并写入计划"""
+    ctx.target_dirs = TargetDirs(create=False)
+    ctx.plan = journal.Journal(plan_path, truncate=True)
+    ctx.plan.record("plan", version=journal.JOURNAL_VERSION, time=datetime.now().timestamp(),
+                    paths=[os.path.abspath(p) for p in paths], separate_mode=separate_mode,
+                    template=ctx.template.text,
+                    shard=shard.format_spec(*shard_spec) if shard_spec else None)
+
+def close_plan(ctx):
+    if ctx.plan is not None:
+        ctx.plan.close()
+        ctx.plan = None
+
+def _apply_group(ctx, moves):
+    """依次执行同一目标目录下的移动"""
+    for src, base_dir, folder_name, file_name in moves:
+        move_file(ctx, src, base_dir, folder_name, file_name)
+
+def _base_dir(target_dir, folder_name):
+    """由目标目录和（可能为多级的）分类目录名得到基准目录"""
+    for _ in os.path.normpath(folder_name).split(os.sep):
+        target_dir = os.path.dirname(target_dir)
+    return target_dir
+
+def apply_plan(ctx, plan_path, jobs):
+    """按目标目录分组并行执行计划中的移动，不重新探测
+
+    目标文件名已被占用时按常规规则重新分配，实际路径以操作日志为准。
+    """
+    groups = {}
+    duplicates = []
+    for record in journal.iter_records(plan_path):
+        op = record.get("op")
+        if op == "move":
+            target_dir = os.path.dirname(record["dest"])
+            groups.setdefault(target_dir, []).append(
+                (record["src"], _base_dir(target_dir, record["folder"]), record["folder"],
+                 os.path.basename(record["dest"])))
+        elif op == "duplicate":
+            duplicates.append(record)
+
+    with ThreadPoolExecutor(jobs) as pool:
+        futures = [pool.submit(_apply_group, ctx, moves) for moves in groups.values()]
+        for future in futures:
+            future.result()
+
+    # 重复文件最后处理：计划中的原文件此时已移动到位
+    for record in duplicates:
+        if os.path.exists(record["src"]):
+            handle_duplicate(ctx, record["src"], record["original"], record["action"])
+
+def handle_failure(ctx, file_path, base_dir, result):
+    """探测失败：计数并记录原因；启用隔离时把文件移到隔离目录（写入操作日志，可撤销）"""
+    reason = getattr(result, "reason", None) or "无法读取媒体方向"
+    with ctx.counter_lock:
+        ctx.failed_files += 1
+    ctx.stats.add_failure(os.path.abspath(file_path), reason)
+    # 规划和链接视图模式不改动原文件
+    if ctx.quarantine and ctx.plan is None and ctx.view is None:
+        move_file(ctx, file_path, base_dir, QUARANTINE_FOLDER, failure=reason)
+    else:
+        ctx.report("failed", file_path, error=reason)
+
+def process_entry(ctx, entry, separate_mode):
+    """处理扫描得到的单个文件"""
+    if not check_supported(ctx, entry) or view_unchanged(ctx, entry):
+        return
+
+    result = lookup_cache(ctx, entry)
+    if result is None:
+        result = probe_media(ctx, entry.path, ctx.template.needs_details)
+        store_cache(ctx, entry, result)
+    if not result:
+        handle_failure(ctx, entry.path, entry.base_dir, result)
+        return
+
+    move_file(ctx, entry.path, entry.base_dir, get_folder_name(ctx, entry, result, separate_mode))
+
+def process_file(ctx, file_path, base_dir, separate_mode):
+    """处理单个文件"""
+    process_entry(ctx, MediaEntry(file_path, base_dir), separate_mode)
+
+def _entry_size(entry):
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return 0
+
+def _track_progress(ctx, entries):
+    """逐个处理时推进进度行：取下一个条目时上一个已处理完（并行流水线在探测完成时推进）"""
+    for entry in entries:
+        size = _entry_size(entry) if entry.kind else 0
+        yield entry
+        if entry.kind:
+            ctx.progress_line.advance(size)
+
+def process_entries(ctx, entries, separate_mode, jobs=1, raw_processes=0, device_reads=None):
+    """处理扫描结果：jobs>1或启用RAW进程池时使用并行流水线，否则逐个处理；压缩包最后依次处理"""
+    archives = []
+    entries = _split_archives(entries, archives)
+    if jobs > 1 or raw_processes:
+        process_files_parallel(ctx, entries, separate_mode, jobs, raw_processes, device_reads)
+    else:
+        if ctx.progress_line is not None:
+            entries = _track_progress(ctx, entries)
+        for entry in entries:
+            process_entry(ctx, entry, separate_mode)
+    for entry in archives:
+        process_archive(ctx, entry, separate_mode)
+
+def _split_archives(entries, archives):
+    for entry in entries:
+        if entry.kind is None and archive_input.is_archive(entry.path):
+            archives.append(entry)
+        else:
+            yield entry
+
+# === 压缩包 ===
+def probe_media_head(ctx, name, kind, head, details=False):
+    """只用内存中的文件头探测（不回退到Pillow/rawpy/ffmpeg），返回值与probe_media相同
+
+    文件头不足以确定方向（如moov位于文件末尾的视频）或格式需要完整文件时返回None。
+    """
+    ext = os.path.splitext(name)[1].lower()
+    meta = {} if details else None
+    f = io.BytesIO(head)
+    try:
+        with ctx.stats.timer("probe.archive_head", ext):
+            if ext in RAW_EXTS:
+                raw_width, raw_height, rotation = raw_probe.probe_raw_file(f, meta)
+            elif kind == "photo":
+                _, raw_width, raw_height, rotation = image_probe.probe_image_file(f, meta)
+            elif ext in video_probe.HEADER_EXTS:
+                raw_width, raw_height, rotation = video_probe.probe_video_file(f, meta)
+            else:
+                return None
+    except (raw_probe.RawProbeError, image_probe.ImageProbeError, video_probe.VideoProbeError):
+        return None
+
+    ctx.media_types.add(kind)
+    if kind == "photo":
+        rotated = rotation in (5, 6, 7, 8)
+    else:
+        rotated = abs(rotation) % 180 == 90
+    width, height = (raw_height, raw_width) if rotated else (raw_width, raw_height)
+    result = '方屏' if width == height else '竖屏' if height > width else '横屏'
+    return (result, raw_width, raw_height, rotation) + _details(meta)
+
+def process_archive(ctx, entry, separate_mode):
+    """按存储顺序读取压缩包，把媒体成员直接解压到 <压缩包名>/<成员目录>/<分类目录> 中"""
+    if ctx.plan is not None or ctx.view is not None:
+        mode = "规划模式" if ctx.plan is not None else "链接视图"
+        ctx.logger.warning(f"{mode}不处理压缩包: {os.path.basename(entry.path)}")
+        return
+    archive_path = os.path.abspath(entry.path)
+    root = archive_input.archive_root(archive_path)
+    ctx.logger.info(f"正在读取压缩包: {os.path.basename(entry.path)}")
+    try:
+        for member in archive_input.iter_members(archive_path):
+            if ctx.extracted_members and \
+                    (media_cache.normalize_path(archive_path), member.name) in ctx.extracted_members:
+                continue
+            extract_member(ctx, archive_path, member, root, separate_mode)
+            if ctx.progress_line is not None:
+                ctx.progress_line.advance(member.size)
+    except (archive_input.ArchiveError, OSError) as e:
+        ctx.logger.error(f"压缩包处理失败: {os.path.basename(entry.path)} - {str(e)}")
+        ctx.report("failed", entry.path, error=str(e))
+
+def extract_member(ctx, archive_path, member, root, separate_mode):
+    """解压一个成员：文件头能确定方向时直接写入分类目录，否则先写入同目录的临时文件再完整探测"""
+    name = os.path.basename(member.name)
+    ext = os.path.splitext(name)[1].lower()
+    kind = EXT_KINDS.get(ext)
+    label = f"{os.path.basename(archive_path)}:{member.name}"
+    member_dir = archive_input.safe_member_dir(member.name)
+    if kind is None or member_dir is None:
+        if member_dir is None:
+            ctx.logger.warning(f"成员路径不安全，已跳过: {label}")
+        else:
+            ctx.logger.warning(f"不支持的文件类型: {label}")
+        with ctx.counter_lock:
+            ctx.ignored_files += 1
+        ctx.report("ignored", label)
+        return
+
+    base_dir = os.path.join(root, member_dir)
+    details = ctx.template.needs_details
+    head = member.stream.read(archive_input.HEAD_BYTES)
+    result = probe_media_head(ctx, name, kind, head, details)
+    spill = None
+    target_path = None
+    journaled = False
+    try:
+        if result is None:
+            os.makedirs(base_dir, exist_ok=True)
+            fd, spill = tempfile.mkstemp(suffix=ext, prefix=".extract-", dir=base_dir)
+            os.close(fd)
+            with ctx.stats.timer("extract", ext):
+                archive_input.write_member(head, member.stream, spill)
+            result = probe_media(ctx, spill, details)
+            if not result:
+                # 压缩包成员不隔离：临时文件随后删除
+                reason = getattr(result, "reason", None) or "无法读取媒体方向"
+                with ctx.counter_lock:
+                    ctx.failed_files += 1
+                ctx.stats.add_failure(label, reason)
+                ctx.report("failed", label, error=reason)
+                return
+
+        folder_name = render_folder(ctx, name, kind, result, separate_mode, member.mtime)
+        with ctx.stats.timer("reserve", ext):
+            target_path = ctx.target_dirs.reserve(os.path.join(base_dir, folder_name), name)
+        # 先记录再写入：中断后续跑会检查目标文件是否已写完
+        if ctx.journal is not None:
+            with ctx.stats.timer("journal", ext):
+                ctx.journal.record("extract", archive=archive_path, member=member.name,
+                                   dest=os.path.abspath(target_path))
+            journaled = True
+        if spill is not None:
+            written, spill = spill, None
+        else:
+            written = target_path + transfer.PART_SUFFIX
+            with ctx.stats.timer("extract", ext):
+                archive_input.write_member(head, member.stream, written)
         try:
+            target_path = _commit_member(ctx, written, target_path, archive_path, member.name)
+        except BaseException:
+            _remove_quietly(written)
+            raise
+        if member.mtime is not None:
+            os.utime(target_path, (member.mtime, member.mtime))
+    except OSError as e:
+        if target_path is not None:
+            if not isinstance(e, FileExistsError):
+                ctx.target_dirs.release(target_path)
+            _remove_quietly(target_path + transfer.PART_SUFFIX)
+        if journaled:
+            # 解压记录作废：目标文件名可能属于其他程序，撤销时不能删除
+            ctx.journal.record("failed", archive=archive_path, member=member.name, error=str(e))
+        ctx.logger.error(f"解压失败: {label} - {str(e)}")
+        ctx.report("failed", label, error=str(e))
+        return
+    finally:
+        if spill is not None:
+            _remove_quietly(spill)
+
+    with ctx.counter_lock:
+        ctx.processed_files += 1
+    ctx.file_logger.info(f"已解压: {label} -> {folder_name}")
+    ctx.report("extracted", label, os.path.abspath(target_path))
+
+def _commit_member(ctx, written, target_path, archive_path, member_name):
+    """把写完的成员改名为目标文件并返回目标路径；目标文件名已被其他程序占用时重新分配（同_move_unclaimed）"""
+    file_name = os.path.basename(target_path)
+    for attempt in range(MAX_NAME_RETRIES + 1):
+        try:
+            transfer.rename_no_replace(written, target_path)
+            return target_path
+        except FileExistsError:
+            if attempt == MAX_NAME_RETRIES:
+                raise
+            new_path = ctx.target_dirs.reserve(os.path.dirname(target_path), file_name)
+            ctx.logger.warning(f"目标文件已存在，改用: {os.path.basename(target_path)} -> {os.path.basename(new_path)}")
+            if ctx.journal is not None:
+                ctx.journal.record("failed", archive=archive_path, member=member_name, error="目标文件已存在")
+                ctx.journal.record("extract", archive=archive_path, member=member_name,
+                                   dest=os.path.abspath(new_path))
+            target_path = new_path
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# === 并行流水线 ===
+def _move_next(ctx, pending, separate_mode):
+    """取出最早提交的探测结果并移动文件，保证与串行处理顺序一致"""
+    entry, future, origin = pending.popleft()
+    try:
+        result = future.result()
+    except Exception as e:
+        ctx.logger.error(f"处理失败: {os.path.basename(entry.path)} - {str(e)}")
+        ctx.report("failed", entry.path, error=str(e))
+        return
+    if origin == "process":
+        # 子进程中的统计随结果一起返回
+        result, exported, slowest = result
+        if exported is not None:
+            ctx.stats.merge(exported)
+            ctx.stats.merge_files(slowest)
+    if origin != "cache":
+        store_cache(ctx, entry, result)
+    if result:
+        move_file(ctx, entry.path, entry.base_dir, get_folder_name(ctx, entry, result, separate_mode))
+    else:
+        handle_failure(ctx, entry.path, entry.base_dir, result)
+
+def _record_io_wait(ctx, path, seconds):
+    ctx.stats.add("io_wait", os.path.splitext(path)[1].lower(), seconds)
+
+def _submit_probe(scheduler, executor, entry, probe, *args):
+    """经设备调度器提交probe(*args)（机械硬盘和网络共享上限制并发并按位置排序）"""
+    try:
+        st = entry.stat()
+        inode = entry.inode()
+    except OSError:
+        return executor.submit(probe, *args)
+    return scheduler.submit(executor, entry.path, st, inode, probe, *args)
+
+def process_files_parallel(ctx, entries, separate_mode, jobs, raw_processes=0, device_reads=None):
+    """多线程探测方向，RAW文件可交给进程池；移动由当前线程按提交顺序完成
+
+    读取按设备调度：device_reads为每个设备的并发读取数，None时机械硬盘和网络共享自动限制。
+    """
+    pending = deque()
+    max_pending = jobs * PIPELINE_DEPTH
+    details = ctx.template.needs_details
+    progress_line = ctx.progress_line
+    scheduler = io_scheduler.IOScheduler(device_reads, partial(_record_io_wait, ctx) if ctx.stats.enabled else None)
+
+    if raw_processes:
+        from concurrent.futures import ProcessPoolExecutor
+        raw_pool_context = ProcessPoolExecutor(raw_processes)
+    else:
+        raw_pool_context = nullcontext()
+    with ThreadPoolExecutor(jobs) as probe_pool, raw_pool_context as raw_pool:
+        for entry in entries:
+            if not check_supported(ctx, entry):
+                continue
+            if view_unchanged(ctx, entry):
+                if progress_line is not None:
+                    progress_line.advance(_entry_size(entry))
+                continue
+
+            # 缓存只在当前线程访问；命中的文件直接进入移动队列
+            result = lookup_cache(ctx, entry)
+            if result is not None:
+                future = Future()
+                future.set_result(result)
+                pending.append((entry, future, "cache"))
+            elif raw_pool and entry.ext in RAW_EXTS:
+                future = _submit_probe(scheduler, raw_pool, entry, probe_media_in_process,
+                                       entry.path, details, ctx.probe_timeout, ctx.stats.enabled)
+                pending.append((entry, future, "process"))
+            else:
+                future = _submit_probe(scheduler, probe_pool, entry, probe_media, ctx, entry.path, details)
+                pending.append((entry, future, "thread"))
+            # 探测完成时才推进进度行：提交时文件还在排队，按提交计数会超前于实际进度
+            if progress_line is not None:
+                future.add_done_callback(lambda _, size=_entry_size(entry): progress_line.advance(size))
+
+            # 队列已满时先移动最早的文件
+            while len(pending) >= max_pending:
+                _move_next(ctx, pending, separate_mode)
+
+        while pending:
+            _move_next(ctx, pending, separate_mode)
+
+def undo_operations(journal_path, verify="size"):
+    """按操作日志逆序撤销移动（流式读取，只在内存中保留目标目录集合）；verify为跨设备移回时的校验方式"""
+    restored = 0
+    processed_dirs = {}     # 目标目录 -> 源目录（清理空目录时向上清理到源目录为止）
+    has_duplicates = False
+    failed_moves = set()    # 之后记录为失败的移动或解压（目标路径可能已属于其他文件）
+    copied = set()          # 有完成记录的跨设备复制的目标路径
+    for record in journal.iter_records_reverse(journal_path):
+        op = record.get("op")
+        if op == "failed":
+            failed_moves.add(record.get("src") or (record.get("archive"), record.get("member")))
+            continue
+        if op == "undo" and not processed_dirs and not has_duplicates:
+            logger.info("该操作日志已撤销过")
+            return
+        if op == "copied":
+            copied.add(record["dest"])
+            continue
+        if op == "duplicate":
+            has_duplicates = True
+            if record.get("action") == "hardlink":
+                restored += undo_duplicate_link(record["src"], record["original"])
+            continue
+        if op == "extract":
+            # 解压的文件：删除即可，压缩包未被改动
+            if (record["archive"], record["member"]) in failed_moves:
+                failed_moves.discard((record["archive"], record["member"]))
+                continue
+            dest = record["dest"]
+            processed_dirs.setdefault(os.path.dirname(dest), os.path.dirname(record["archive"]))
             if os.path.exists(dest):
+                try:
+                    os.remove(dest)
+                    restored += 1
+                    file_logger.info(f"已撤销: {os.path.basename(dest)}")
+                except OSError as e:
+                    logger.error(f"撤销失败: {str(e)}")
+            continue
+        if op != "move":
+            continue
+
+        src, dest = record["src"], record["dest"]
+        if src in failed_moves:
+            failed_moves.discard(src)
+            continue
+        processed_dirs.setdefault(os.path.dirname(dest), os.path.dirname(src))
+        try:
+            if _rename_finished_before_unlink(record):
+                # 同设备移动已建立目标链接、但源文件名尚未删除：删除目标链接即可
+                os.remove(dest)
+                restored += 1
+                file_logger.info(f"已撤销: {os.path.basename(dest)}")
+            elif record.get("copy") and dest not in copied and _copy_finished_before_delete(src, dest):
+                # 中断的跨设备复制已完成但源文件未删除：删除副本即可
+                os.remove(dest)
+                restored += 1
+                file_logger.info(f"已撤销: {os.path.basename(dest)}")
+            # 目标不存在（未完成的移动或已撤销）或原位置已被占用时跳过
+            elif os.path.exists(dest) and not os.path.exists(src):
                 os.makedirs(os.path.dirname(src), exist_ok=True)
-                shutil.move(dest, src)
+                transfer.move(dest, src, bool(record.get("copy")), verify)
                 restored += 1
-                logger.info(f"已撤销: {os.path.basename(dest)}")
+                file_logger.info(f"已撤销: {os.path.basename(dest)}")
         except Exception as e:
             logger.error(f"撤销失败: {str(e)}")
 
-    # 清理空目录
-    processed_dirs = set(os.path.dirname(dest) for _, dest in operations)
-    for d in processed_dirs:
+    if not processed_dirs and not has_duplicates:
+        logger.info("没有可撤销的操作")
+        return
+
+    # 清理空目录（多级分类目录逐级向上清理），并从分类目录登记表中删除
+    registry = output_dirs.OutputDirs()
+    for d, src_dir in processed_dirs.items():
         try:
-            if os.path.exists(d) and not os.listdir(d):
+            while d != src_dir and os.path.dirname(d) != d and os.path.isdir(d) and not os.listdir(d):
                 os.rmdir(d)
+                registry.discard(d)
                 logger.info(f"清理空目录: {d}")
+                d = os.path.dirname(d)
         except Exception as e:
             logger.error(f"清理目录失败: {str(e)}")
 
-    operations.clear()
+    undo_journal = journal.Journal(journal_path)
+    try:
+        undo_journal.record("undo", restored=restored)
+    finally:
+        undo_journal.close()
     logger.info(f"成功撤销 {restored} 个文件")
 
+def undo_duplicate_link(src, original):
+    """把硬链接还原为独立文件，返回还原的文件数"""
+    try:
+        if not (os.path.exists(src) and os.path.exists(original) and os.path.samefile(src, original)):
+            return 0
+        dedup.unlink_duplicate(src)
+    except Exception as e:
+        logger.error(f"撤销失败: {str(e)}")
+        return 0
+    file_logger.info(f"已撤销: {os.path.basename(src)}")
+    return 1
+
+def open_journal(ctx, paths, separate_mode, resume_path=None, shard_spec=None, stats_path=None):
+    """新建操作日志，或以追加方式打开要续跑的日志
+
+    分片运行的日志名带分片后缀，并记录分片和统计报告路径供合并时使用。
+    """
+    if resume_path:
+        ctx.journal = journal.Journal(resume_path)
+        ctx.journal.record("resume", time=datetime.now().timestamp())
+    else:
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d_%H%M%S") + ".jsonl"
+        fields = {}
+        if shard_spec:
+            name = shard.suffixed(name, *shard_spec)
+            fields["shard"] = shard.format_spec(*shard_spec)
+            fields["stats"] = os.path.abspath(stats_path) if stats_path else None
+        path = get_unique_path(os.path.join(JOURNAL_DIR, name))
+        ctx.journal = journal.create(path, paths, separate_mode, ctx.template.text, **fields)
+    ctx.logger.info(f"操作日志: {ctx.journal.path}")
+
+def close_journal(ctx, completed):
+    if ctx.journal is not None:
+        if completed:
+            ctx.journal.record("end", processed=ctx.processed_files)
+        ctx.journal.close()
+        ctx.journal = None
+
+def _copy_finished_before_delete(src, dest):
+    """跨设备复制已改名为目标文件、但源文件尚未删除：两者内容相同
+
+    只用于没有完成记录的复制；比较完整内容，原位置之后出现的大小相同的其他文件不会被误认。
+    """
+    try:
+        transfer.verify_copy(src, dest, "hash")
+        return True
+    except OSError:
+        return False
+
+def _rename_finished_before_unlink(record):
+    """同设备移动已建立目标链接、但源文件名尚未删除（两者为同一文件）"""
+    if record.get("copy"):
+        return False
+    try:
+        return os.path.samefile(record["src"], record["dest"])
+    except OSError:
+        return False
+
+def moved_targets(journal_path):
+    """续跑时读取已移动文件的目标路径和已处理的重复文件，扫描时跳过这些文件
+
+    同时收尾被中断的移动：已建立目标链接或副本已完成的删除源文件，未完成的复制删除临时文件。
+    """
+    moved = set()
+    unfinished = {}     # 没有完成记录的跨设备复制：源文件 -> 目标文件
+    for record in journal.iter_records(journal_path):
+        if record.get("op") == "failed" and "archive" in record:
+            # 目标文件名已被占用，之后另有改名后的解压记录
+            moved.discard((media_cache.normalize_path(record["archive"]), record["member"]))
+            continue
+        if record.get("op") in ("copied", "failed"):
+            unfinished.pop(record.get("src"), None)
+            continue
+        if record.get("op") == "duplicate":
+            moved.add(media_cache.normalize_path(record["src"]))
+            continue
+        if record.get("op") == "extract":
+            # 已写完的压缩包成员以 (压缩包, 成员名) 记录；未写完的删除临时文件后重新解压
+            if os.path.exists(record["dest"]):
+                moved.add((media_cache.normalize_path(record["archive"]), record["member"]))
+            else:
+                _remove_quietly(record["dest"] + transfer.PART_SUFFIX)
+            continue
+        if record.get("op") != "move":
+            continue
+        src, dest = record["src"], record["dest"]
+        moved.add(media_cache.normalize_path(dest))
+        if record.get("copy"):
+            unfinished[src] = dest
+            continue
+        try:
+            if _rename_finished_before_unlink(record):
+                os.remove(src)
+                logger.info(f"已完成中断的移动: {os.path.basename(src)}")
+        except OSError as e:
+            logger.error(f"处理中断的移动失败: {str(e)}")
+
+    # 只有日志末尾仍在进行的复制可能被中断
+    for src, dest in unfinished.items():
+        try:
+            if _copy_finished_before_delete(src, dest):
+                os.remove(src)
+                logger.info(f"已完成中断的复制: {os.path.basename(src)}")
+            elif os.path.exists(dest + transfer.PART_SUFFIX):
+                os.remove(dest + transfer.PART_SUFFIX)
+        except OSError as e:
+            logger.error(f"处理中断的复制失败: {str(e)}")
+    return moved
+
 # === 主程序 ===
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("必须为正整数")
+    return number
+
+def _non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("不能为负数")
+    return number
+
+def _shard_spec(value):
+    try:
+        return shard.parse_spec(value)
+    except shard.ShardError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _folder_template(value):
+    try:
+        return media_keys.FolderTemplate(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args(argv):
+    """解析命令行参数（拖放时只有路径）"""
+    parser = argparse.ArgumentParser(prog="MediaClassifier", description="按方向分类照片和视频")
+    parser.add_argument("paths", nargs="*", help="要分类的文件或文件夹")
+    parser.add_argument("--jobs", type=_positive_int, default=1,
+                        help="并行探测的线程数（默认1，即串行处理）")
+    parser.add_argument("--device-reads", type=_non_negative_int, default=0,
+                        help="并行模式下每个磁盘同时读取的文件数（默认0：机械硬盘和网络共享自动限制，SSD不限制）")
+    parser.add_argument("--raw-processes", type=_non_negative_int, default=0,
+                        help="用于RAW文件探测/解码的进程数（默认0，不使用进程池）")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--no-cache", action="store_true",
+                             help="不读取也不写入探测结果缓存")
+    cache_group.add_argument("--rebuild-cache", action="store_true",
+                             help="清空探测结果缓存后重新探测")
+    parser.add_argument("--transfers", type=_positive_int, default=1,
+                        help="跨设备移动时并发复制的文件数（默认1）")
+    parser.add_argument("--verify", choices=transfer.VERIFY_MODES, default="size",
+                        help="跨设备复制后删除源文件前的校验方式（默认size）")
+    parser.add_argument("--folder-template", type=_folder_template, metavar="TEMPLATE",
+                        help="分类目录模板，以/分隔多级目录（默认 {orientation}{media}）；可用字段: "
+                             + ", ".join(media_keys.KEYS))
+    parser.add_argument("--probe-timeout", type=_non_negative_int, default=DEFAULT_PROBE_TIMEOUT, metavar="SECONDS",
+                        help=f"ffmpeg和原生解码库（rawpy/Pillow）探测单个文件的时限，超时的文件按失败处理"
+                             f"（默认{DEFAULT_PROBE_TIMEOUT}，0表示不限时）")
+    parser.add_argument("--quarantine", action="store_true",
+                        help=f"把无法探测（损坏或超时）的文件移到「{QUARANTINE_FOLDER}」目录，原因写入操作日志和统计报告")
+    parser.add_argument("--duplicates", choices=dedup.ACTIONS,
+                        help="检测与分类目录中已有文件内容相同的文件：跳过(skip)、替换为硬链接(hardlink)"
+                             f"或移动到「{dedup.DUPLICATE_FOLDER}」目录(folder)；默认不检测")
+    parser.add_argument("--log-file", metavar="FILE",
+                        help="把日志（包括逐个文件的记录）写入FILE")
+    parser.add_argument("--log-level", choices=progress.LOG_LEVELS, default="info",
+                        help="--log-file的记录级别（默认info，包含每个移动的文件）")
+    parser.add_argument("--progress", choices=("auto", "on", "off"), default="auto",
+                        help="控制台显示刷新的进度行而不是逐个文件的日志（默认auto：控制台为终端时显示）")
+    parser.add_argument("--progress-total", action="store_true",
+                        help="进度行显示总数和剩余时间（在后台另行遍历一次输入目录，网络共享上开销较大）")
+    parser.add_argument("--stats-json", metavar="FILE",
+                        help="把各阶段耗时统计写入FILE（JSON）")
+    parser.add_argument("--stats-interval", type=_positive_int, metavar="SECONDS",
+                        help="运行期间每隔SECONDS秒更新一次--stats-json文件")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--resume", metavar="JOURNAL",
+                            help="继续被中断的运行，跳过日志中已移动的文件")
+    mode_group.add_argument("--undo", metavar="JOURNAL",
+                            help="按操作日志撤销一次运行")
+    mode_group.add_argument("--plan", metavar="PLAN",
+                            help="只探测并把计划的移动写入PLAN（JSON Lines），不移动文件")
+    mode_group.add_argument("--apply", metavar="PLAN",
+                            help="按--plan生成的计划移动文件，不重新探测")
+    mode_group.add_argument("--watch", metavar="DIR",
+                            help="持续监视DIR，只分类新到达的文件（Ctrl+C 结束）")
+    mode_group.add_argument("--merge", metavar="OUTPUT",
+                            help="把作为参数给出的各分片操作日志合并为一个可撤销的日志OUTPUT，并汇总统计")
+    mode_group.add_argument("--link-into", metavar="VIEW_DIR",
+                            help="不移动原文件，在VIEW_DIR中按分类目录建立链接；再次运行时只更新变化的链接")
+    parser.add_argument("--link-type", choices=link_view.LINK_TYPES, default="auto",
+                        help="--link-into建立的链接类型（默认auto：同一设备用硬链接，跨设备用符号链接）")
+    parser.add_argument("--shard", type=_shard_spec, metavar="i/N",
+                        help="只处理按相对目录划分的第i个分片（共N个，i从1开始）；各分片可在不同进程或机器上同时运行")
+    parser.add_argument("--settle", type=float, default=watcher.SETTLE_SECONDS,
+                        help=f"监视模式下文件保持不变多少秒后才处理（默认{watcher.SETTLE_SECONDS:g}）")
+    parser.add_argument("--poll-interval", type=float, default=watcher.POLL_INTERVAL,
+                        help=f"无法使用inotify时检查目录的间隔秒数（默认{watcher.POLL_INTERVAL:g}）")
+    args = parser.parse_args(argv)
+    if args.shard and (args.watch or args.undo or args.apply or args.merge or args.link_into):
+        parser.error("--shard 只能用于分类、续跑和规划")
+    if args.link_into and args.duplicates:
+        parser.error("--link-into 不能与 --duplicates 一起使用")
+    return args
+
 def main():
     check_dependencies()  # 确保依赖检查最先执行
     show_copyright()
 
-    if len(sys.argv) < 2:
-        print("使用方法：拖放文件/文件夹到程序图标")
-        input("按下 [Enter] 键退出...")
+    args = parse_args(sys.argv[1:])
+
+    # 撤销历史运行
+    if args.undo:
+        try:
+            journal.read_header(args.undo)
+        except journal.JournalError as e:
+            logger.error(str(e))
+            return
+        undo_operations(args.undo, args.verify)
         return
 
-    # 初始化全局状态
-    global media_types, ignored_files, processed_files
-    media_types.clear()
-    ignored_files = 0
-    processed_files = 0
+    # 合并分片运行的操作日志和统计
+    if args.merge:
+        run_merge(args)
+        return
 
-    # 预扫描媒体类型
-    for path in sys.argv[1:]:
-        if os.path.isfile(path):
-            ext = os.path.splitext(path)[1].lower()
-            if ext in IMAGE_EXTS:
-                media_types.add("photo")
-            elif ext in VIDEO_EXTS:
-                media_types.add("video")
-        elif os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                for f in files:
-                    ext = os.path.splitext(f)[1].lower()
-                    if ext in IMAGE_EXTS:
-                        media_types.add("photo")
-                    elif ext in VIDEO_EXTS:
-                        media_types.add("video")
+    # 续跑：输入路径和分类模式取自日志；执行计划：输入路径和分类模式取自计划
+    header = None
+    if args.resume or args.apply:
+        try:
+            header = journal.read_header(args.resume or args.apply, "plan" if args.apply else "start")
+        except journal.JournalError as e:
+            logger.error(str(e))
+            return
+        args.paths = args.paths or header["paths"]
+        if header.get("shard") and not args.shard:
+            args.shard = shard.parse_spec(header["shard"])
 
-    # 确定分类模式
-    separate_mode = True
-    if len(media_types) > 1:
-        print("\n检测到混合媒体类型（照片+视频）")
-        choice = input("是否分开分类？(Y/n): ").lower()
-        separate_mode = choice in ('', 'y')
+    # 续跑时沿用日志中的目录模板
+    template = args.folder_template or media_keys.FolderTemplate(media_keys.DEFAULT_TEMPLATE)
+    if header and header.get("template") and not args.folder_template:
+        try:
+            template = media_keys.FolderTemplate(header["template"])
+        except ValueError as e:
+            logger.error(f"日志中的目录模板无效: {str(e)}")
+            return
 
-    # 处理文件
-    for path in sys.argv[1:]:
-        if os.path.isfile(path):
-            process_file(path, os.path.dirname(path), separate_mode)
-        elif os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                for f in files:
-                    file_path = os.path.join(root, f)
-                    process_file(file_path, root, separate_mode)
+    # 更新已有的链接视图时沿用视图的目录模板（给出不同的模板时重建视图）
+    view_header = link_view.read_header(args.link_into) if args.link_into else None
+    if view_header and not args.folder_template:
+        try:
+            template = media_keys.FolderTemplate(view_header["template"])
+        except ValueError as e:
+            logger.error(f"视图中的目录模板无效: {str(e)}")
+            return
+
+    if args.watch:
+        args.paths = [args.watch]
+
+    if not args.paths:
+        print("使用方法：拖放文件/文件夹到程序图标")
+        input("按下 [Enter] 键退出...")
+        return
+
+    # 本次运行的状态
+    ctx = RunContext(template, run_stats.RunStats(enabled=bool(args.stats_json)))
+    ctx.quarantine = args.quarantine
+    if args.shard and args.stats_json:
+        args.stats_json = shard.suffixed(args.stats_json, *args.shard)
+
+    log_output = start_log_output(ctx, args)
+    snapshot_writer = None
+    if args.stats_json and args.stats_interval:
+        snapshot_writer = run_stats.SnapshotWriter(ctx.stats, args.stats_json, args.stats_interval, ctx.counters)
+        snapshot_writer.start()
+    try:
+        if args.watch:
+            journal_path = run_watch(ctx, args)
+        elif args.apply:
+            journal_path = run_apply(ctx, args, header)
         else:
-            logger.warning(f"路径不存在: {path}")
+            journal_path = run_classify(ctx, args, header, view_header)
+    finally:
+        log_output.stop()
+        if snapshot_writer is not None:
+            snapshot_writer.stop()
+        if args.stats_json:
+            try:
+                ctx.stats.write_json(args.stats_json, **ctx.counters())
+                logger.info(f"统计报告: {args.stats_json}")
+            except OSError as e:
+                logger.error(f"统计报告写入失败: {str(e)}")
+    if journal_path is None:
+        return
 
     # 显示结果
     print("\n" + "="*40)
-    print(f"成功处理 {processed_files} 个文件")
-    print(f"忽略 {ignored_files} 个不支持的文件")
+    print(f"成功处理 {ctx.processed_files} 个文件")
+    if ctx.duplicate_files:
+        print(f"发现 {ctx.duplicate_files} 个重复文件")
+    print_failures(ctx)
+    print(f"忽略 {ctx.ignored_files} 个不支持的文件")
     print("="*40)
 
+    # 分片运行通常在后台或多台机器上同时进行，不等待输入（合并后可用--undo撤销）
+    if args.shard:
+        return
+
     # 特殊处理：全部文件不支持的情况
-    if processed_files == 0 and ignored_files > 0:
+    if ctx.processed_files == 0 and ctx.duplicate_files == 0 and ctx.failed_files == 0 and ctx.ignored_files > 0:
         print("\n⚠️ 所有拖入的文件均不支持")
         input("按下 [Enter] 键退出...")
         return
 
-    # 撤销功能
-    if processed_files > 0:
+    # 撤销功能（隔离的文件同样可以撤销）
+    if ctx.processed_files > 0 or ctx.duplicate_files > 0 or (ctx.failed_files > 0 and ctx.quarantine):
         print("\n输入 [F] 后按下 [Enter] 键撤销操作\n按下 [Enter] 键退出程序")
         choice = input().lower()
         if choice == 'f':
-            undo_operations()
+            undo_operations(journal_path, args.verify)
             print("\n操作已撤销，按 [Enter] 键退出...")
             input()
         else:
             pass
 
+def print_failures(ctx, quarantined=True):
+    """显示探测失败的文件数；quarantined为False表示本次运行未移动文件（规划、链接视图）"""
+    if ctx.failed_files:
+        where = f"，已移到「{QUARANTINE_FOLDER}」目录" if ctx.quarantine and quarantined else ""
+        print(f"{ctx.failed_files} 个文件无法探测（损坏或超时{where}）")
+
+def watch_folder(ctx, root, separate_mode, settle, poll_interval):
+    """监视root，文件写入完成后逐个调用process_entry，直到被Ctrl+C中断"""
+    folder_watcher = watcher.create_watcher(root, ctx.is_classified_folder, poll_interval)
+    tracker = watcher.StabilityTracker(settle)
+    mode = "inotify" if isinstance(folder_watcher, watcher.InotifyWatcher) else "轮询"
+    logger.info(f"正在监视（{mode}）: {root}，按 Ctrl+C 结束")
+    try:
+        while True:
+            for path in folder_watcher.wait(tracker.timeout()):
+                tracker.add(path)
+            if getattr(folder_watcher, "overflowed", False):
+                logger.warning("文件事件过多，部分新文件可能被遗漏，请稍后重新运行一次普通分类")
+                folder_watcher.overflowed = False
+
+            for path in tracker.ready():
+                process_entry(ctx, MediaEntry(path, os.path.dirname(path)), separate_mode)
+
+            # 空闲时把缓存和日志落盘
+            if not len(tracker):
+                if ctx.cache is not None:
+                    ctx.cache.flush()
+                if ctx.journal is not None:
+                    ctx.journal.sync()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        folder_watcher.close()
+
+def run_watch(ctx, args):
+    """监视模式：按照片/视频分开分类，结束时显示统计；不提供交互式撤销（可使用--undo）"""
+    root = os.path.abspath(args.watch)
+    if not os.path.isdir(root):
+        logger.error(f"路径不存在: {args.watch}")
+        return None
+
+    separate_mode = True
+    open_journal(ctx, [root], separate_mode)
+    if not args.no_cache:
+        open_cache(ctx, rebuild=args.rebuild_cache)
+    open_transfers(ctx, args.transfers, args.verify)
+    open_duplicates(ctx, args.duplicates)
+    open_decoders(ctx, args.probe_timeout, 1)
+    try:
+        watch_folder(ctx, root, separate_mode, args.settle, args.poll_interval)
+    finally:
+        close_decoders(ctx)
+        close_transfers(ctx)     # 排队中的复制完成后还要登记到重复索引
+        close_duplicates(ctx)
+        close_cache(ctx)
+        journal_path = ctx.journal.path
+        close_journal(ctx, True)
+
+    print("\n" + "="*40)
+    print(f"成功处理 {ctx.processed_files} 个文件")
+    if ctx.duplicate_files:
+        print(f"发现 {ctx.duplicate_files} 个重复文件")
+    print_failures(ctx)
+    print(f"忽略 {ctx.ignored_files} 个不支持的文件")
+    print(f"操作日志: {journal_path}")
+    print("="*40)
+    return None
+
+def run_apply(ctx, args, header):
+    """执行计划文件，返回本次运行的操作日志路径"""
+    open_journal(ctx, header["paths"], header["separate_mode"], shard_spec=args.shard, stats_path=args.stats_json)
+    open_transfers(ctx, 1, args.verify)
+    completed = False
+    try:
+        apply_plan(ctx, args.apply, args.jobs)
+        completed = True
+    finally:
+        journal_path = ctx.journal.path
+        close_journal(ctx, completed)
+    return journal_path
+
+def start_log_output(ctx, args):
+    """改为由后台线程写出日志；显示进度行时逐个文件的记录只写入--log-file"""
+    show = args.progress == "on" or (args.progress == "auto" and sys.stderr.isatty())
+    progress_line = ctx.progress_line = progress.ProgressLine() if show and not (args.watch or args.apply) else None
+
+    console = progress.ConsoleHandler(progress_line)
+    console.setLevel(logging.INFO)
+    console.setFormatter(handler.formatter)
+    if progress_line is not None:
+        console.addFilter(progress.ExcludeLogger(file_logger.name))
+    handlers = [console]
+    if args.log_file:
+        level = progress.LOG_LEVELS[args.log_level]
+        try:
+            handlers.append(progress.file_handler(args.log_file, level))
+        except OSError as e:
+            logger.error(f"无法打开日志文件: {str(e)}")
+        logger.setLevel(min(level, logging.INFO))
+    return progress.AsyncLogging(logger, handlers).start()
+
+def run_merge(args):
+    """合并分片操作日志为一个可撤销的日志，并汇总各分片的统计报告"""
+    if not args.paths:
+        logger.error("请给出要合并的分片操作日志")
+        return
+    try:
+        summaries = shard.merge_journals(args.paths, args.merge)
+    except (shard.ShardError, journal.JournalError, OSError) as e:
+        logger.error(f"合并失败: {str(e)}")
+        return
+
+    print("\n" + "="*40)
+    for summary in summaries:
+        state = "" if summary.completed else "（未完成）"
+        print(f"分片 {summary.shard}: 移动 {summary.moved} 个文件，解压 {summary.extracted} 个，"
+              f"重复 {summary.duplicates} 个{state} - {os.path.basename(summary.path)}")
+    count = shard.parse_spec(summaries[0].shard)[1]
+    missing = sorted(set(range(1, count + 1)) - {shard.parse_spec(s.shard)[0] for s in summaries})
+    if missing:
+        print(f"⚠️ 缺少分片: {', '.join(f'{i}/{count}' for i in missing)}")
+    print(f"共移动 {sum(s.moved for s in summaries)} 个文件，解压 {sum(s.extracted for s in summaries)} 个")
+    print(f"合并的操作日志: {args.merge}（可用 --undo 撤销全部分片）")
+
+    stats_path = args.stats_json or os.path.splitext(args.merge)[0] + ".stats.json"
+    try:
+        if shard.merge_stats(summaries, stats_path):
+            print(f"合并的统计报告: {stats_path}")
+    except OSError as e:
+        logger.error(f"统计报告写入失败: {str(e)}")
+    print("="*40)
+
+def run_classify(ctx, args, header, view_header=None):
+    """扫描、探测并移动（或写入计划、建立链接），返回本次运行的操作日志路径；规划和链接视图模式返回None"""
+    # 单次扫描：预读到能确定媒体类型组合为止，其余条目继续流式处理
+    moved = moved_targets(args.resume) if header else None
+    ctx.extracted_members = moved
+    entries = scan_pending(ctx, args.paths, args.shard, moved)
+    found_types, entries = summarize_media_types(entries)
+    ctx.media_types.update(found_types)
+
+    # 确定分类模式
+    separate_mode = True
+    if header:
+        separate_mode = header["separate_mode"]
+    elif view_header:
+        separate_mode = view_header["separate_mode"]
+    elif len(ctx.media_types) > 1 and not args.shard:     # 分片之间需一致，不询问
+        print("\n检测到混合媒体类型（照片+视频）")
+        choice = input("是否分开分类？(Y/n): ").lower()
+        separate_mode = choice in ('', 'y')
+
+    # 处理文件
+    if args.plan:
+        open_plan(ctx, args.plan, args.paths, separate_mode, args.shard)
+    elif args.link_into:
+        try:
+            open_view(ctx, args.link_into, separate_mode, args.link_type)
+        except OSError as e:
+            logger.error(f"无法打开链接视图: {str(e)}")
+            return None
+    else:
+        open_journal(ctx, args.paths, separate_mode, args.resume, args.shard, args.stats_json)
+    if not args.no_cache:
+        open_cache(ctx, rebuild=args.rebuild_cache)
+    open_transfers(ctx, args.transfers, args.verify)
+    open_duplicates(ctx, args.duplicates)
+    open_decoders(ctx, args.probe_timeout, args.jobs)
+    progress_line = ctx.progress_line
+    if progress_line is not None:
+        if args.progress_total:
+            # 另行遍历一次目录统计总数，用于估算剩余时间（只读取目录项；警告已由主扫描记录）
+            progress_line.count_total(entry for entry in scan_pending(ctx, args.paths, args.shard, moved, quiet=True)
+                                      if entry.kind)
+        progress_line.start()
+    completed = False
+    try:
+        process_entries(ctx, entries, separate_mode, args.jobs, args.raw_processes, args.device_reads or None)
+        completed = True
+    finally:
+        if progress_line is not None:
+            progress_line.stop()
+        close_decoders(ctx)
+        close_transfers(ctx)     # 排队中的复制完成后还要登记到重复索引
+        close_duplicates(ctx)
+        close_cache(ctx)
+        close_plan(ctx)
+        view = close_view(ctx, args.paths if completed else None)
+        journal_path = ctx.journal.path if ctx.journal else None
+        close_journal(ctx, completed)
+
+    if view is not None:
+        print("\n" + "="*40)
+        print(f"新建链接 {view.linked} 个，保留未变化的链接 {view.kept} 个，删除失效的链接 {view.removed} 个")
+        print_failures(ctx, False)
+        print(f"忽略 {ctx.ignored_files} 个不支持的文件")
+        print(f"链接视图: {view.root}")
+        print("="*40)
+        return None
+    if args.plan:
+        print("\n" + "="*40)
+        print(f"已规划 {ctx.processed_files} 个文件，计划已写入: {args.plan}")
+        if ctx.duplicate_files:
+            print(f"发现 {ctx.duplicate_files} 个重复文件")
+        print_failures(ctx, False)
+        print(f"忽略 {ctx.ignored_files} 个不支持的文件")
+        print("="*40)
+        return None
+    return journal_path
+
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
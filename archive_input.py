@@ -0,0 +1,102 @@
+"""ZIP/TAR压缩包输入：按存储顺序流式读取成员，不先解压整个压缩包
+
+TAR（包括 .tar.gz/.tar.bz2/.tar.xz）以只进方式读取，压缩的TAR也不需要随机访问；
+ZIP按中央目录顺序读取各成员。成员只能顺序读取一次，由调用方先读取文件头探测方向，
+再把文件头和其余数据一起写入目标文件。
+"""
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+
+# === 读取配置 ===
+HEAD_BYTES = 256 * 1024     # 成员开头读入内存用于探测的字节数
+WRITE_BUFFER = 1024 * 1024  # 写出成员数据时的缓冲区大小
+
+ARCHIVE_EXTS = ('.zip', '.tar', '.tgz', '.tar.gz', '.tbz2', '.tar.bz2', '.txz', '.tar.xz')
+
+
+class ArchiveError(ValueError):
+    """无法读取的压缩包"""
+
+
+class Member:
+    """压缩包中的一个普通文件；stream只能顺序读取一次"""
+    __slots__ = ('name', 'size', 'mtime', 'stream')
+
+    def __init__(self, name, size, mtime, stream):
+        self.name = name        # 压缩包内的相对路径（/ 分隔）
+        self.size = size
+        self.mtime = mtime
+        self.stream = stream
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTS)
+
+
+def archive_root(path):
+    """成员解压后的根目录：压缩包所在目录下与压缩包同名（去掉扩展名）的文件夹"""
+    name = os.path.basename(path)
+    for ext in sorted(ARCHIVE_EXTS, key=len, reverse=True):
+        if name.lower().endswith(ext):
+            name = name[:-len(ext)]
+            break
+    return os.path.join(os.path.dirname(path), name or "archive")
+
+
+def safe_member_dir(name):
+    """成员所在的相对目录；包含绝对路径或 .. 时返回None（不解压到压缩包目录之外）"""
+    parts = [part for part in name.replace('\\', '/').split('/')[:-1] if part not in ('', '.')]
+    if name.startswith(('/', '\\')) or '..' in parts or (parts and ':' in parts[0]):
+        return None
+    return os.path.join(*parts) if parts else ""
+
+
+def _iter_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            mtime = _zip_mtime(info)
+            with archive.open(info) as stream:
+                yield Member(info.filename, info.file_size, mtime, stream)
+
+
+def _zip_mtime(info):
+    try:
+        return time.mktime(info.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return None
+
+
+def _iter_tar(path):
+    # "r|*" 为只进的流式读取：成员按存储顺序读取，不在压缩数据中回跳
+    with tarfile.open(path, "r|*") as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            stream = archive.extractfile(info)
+            try:
+                yield Member(info.name, info.size, info.mtime, stream)
+            finally:
+                stream.close()
+
+
+def iter_members(path):
+    """按存储顺序返回压缩包中的普通文件（Member）；压缩包损坏时抛出ArchiveError"""
+    try:
+        if zipfile.is_zipfile(path):
+            yield from _iter_zip(path)
+        else:
+            yield from _iter_tar(path)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError) as e:
+        raise ArchiveError(f"无法读取压缩包: {e}") from e
+
+
+def write_member(head, stream, dest):
+    """把已读取的文件头和成员的其余数据写入dest"""
+    with open(dest, 'wb') as f:
+        f.write(head)
+        shutil.copyfileobj(stream, f, WRITE_BUFFER)
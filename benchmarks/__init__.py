@@ -0,0 +1 @@
+"""MediaClassifier 基准测试：样本生成（corpus）、性能测量（run）和启动开销检查（startup）"""
@@ -0,0 +1,203 @@
+"""生成确定性的基准测试媒体样本：各EXIF方向的JPEG、PNG/WebP/BMP、HEIC、DNG文件头和带旋转矩阵的MP4/MOV"""
+import argparse
+import os
+import struct
+
+# === 默认配置 ===
+DEFAULT_SIZES = ((640, 480), (480, 640), (1920, 1080))
+DEFAULT_COPIES = 2              # 每种格式/尺寸/方向组合生成的文件数
+
+VIDEO_ROTATIONS = (0, 90, 180, 270)
+
+
+def _color(seed, index):
+    """按种子和序号生成固定颜色，保证同一参数下输出完全一致"""
+    value = (seed * 2654435761 + index * 40503) & 0xFFFFFF
+    return (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+
+
+# === 图片（Pillow） ===
+def _write_pil(path, size, fmt, color, orientation=None, **save_args):
+    from PIL import Image
+
+    img = Image.new("RGB", size, color)
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[274] = orientation
+        save_args["exif"] = exif.tobytes()
+    img.save(path, fmt, **save_args)
+
+
+def _heif_available():
+    try:
+        import pillow_heif
+    except ImportError:
+        return False
+    pillow_heif.register_heif_opener()
+    return True
+
+
+# === DNG（最小TIFF结构） ===
+def _write_dng(path, size, orientation):
+    """写入只含IFD0的DNG：尺寸、方向和DNGVersion，图像数据为一条全零扫描行"""
+    width, height = size
+    strip = bytes(width * 2)
+    entries = [
+        (0x00FE, 4, 1, 0),              # NewSubfileType：主图像
+        (0x0100, 4, 1, width),          # ImageWidth
+        (0x0101, 4, 1, height),         # ImageLength
+        (0x0102, 3, 1, 16),             # BitsPerSample
+        (0x0103, 3, 1, 1),              # Compression：无压缩
+        (0x0106, 3, 1, 32803),          # PhotometricInterpretation：CFA
+        (0x0111, 4, 1, 0),              # StripOffsets（稍后填写）
+        (0x0112, 3, 1, orientation),    # Orientation
+        (0x0115, 3, 1, 1),              # SamplesPerPixel
+        (0x0116, 4, 1, 1),              # RowsPerStrip
+        (0x0117, 4, 1, len(strip)),     # StripByteCounts
+        (0xC612, 1, 4, 0x00000401),     # DNGVersion 1.4.0.0
+    ]
+    ifd_size = 2 + len(entries) * 12 + 4
+    strip_offset = 8 + ifd_size
+    ifd = struct.pack('<H', len(entries))
+    for tag, typ, count, value in entries:
+        if tag == 0x0111:
+            value = strip_offset
+        if typ == 3:
+            field = struct.pack('<HH', value, 0)
+        elif typ == 1:
+            field = bytes((1, 4, 0, 0))
+        else:
+            field = struct.pack('<I', value)
+        ifd += struct.pack('<HHI', tag, typ, count) + field
+    ifd += struct.pack('<I', 0)
+
+    with open(path, 'wb') as f:
+        f.write(b'II*\x00' + struct.pack('<I', 8) + ifd + strip)
+
+
+# === MP4/MOV（最小ISO-BMFF结构） ===
+def _box(box_type, *payload):
+    data = b''.join(payload)
+    return struct.pack('>I4s', 8 + len(data), box_type) + data
+
+
+def _rotation_matrix(rotation):
+    """tkhd显示矩阵（16.16定点数，w为2.30定点数）"""
+    cos, sin = {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}[rotation]
+    one = 0x10000
+    return struct.pack('>9i', cos * one, sin * one, 0, -sin * one, cos * one, 0, 0, 0, 0x40000000)
+
+
+# === HEIC（只含meta的最小HEIF结构） ===
+# EXIF方向 -> irot角度（逆时针90度的倍数）
+_IROT_ANGLES = {1: 0, 3: 2, 6: 3, 8: 1}
+
+
+def _full_box(box_type, *payload, version=0):
+    return _box(box_type, struct.pack('>I', version << 24), *payload)
+
+
+def _write_heic(path, size, orientation):
+    """写入只含ftyp和meta的HEIC：主图像带ispe和irot属性，没有编码数据（没有HEIF编码器时使用）"""
+    width, height = size
+    hdlr = _full_box(b'hdlr', struct.pack('>I4s12x', 0, b'pict'), b'\x00')
+    pitm = _full_box(b'pitm', struct.pack('>H', 1))
+    ispe = _full_box(b'ispe', struct.pack('>II', width, height))
+    irot = _box(b'irot', bytes((_IROT_ANGLES[orientation],)))
+    ipco = _box(b'ipco', ispe, irot)
+    ipma = _full_box(b'ipma', struct.pack('>IHB', 1, 1, 2), bytes((0x01, 0x82)))
+    meta = _full_box(b'meta', hdlr, pitm, _box(b'iprp', ipco, ipma))
+    ftyp = _box(b'ftyp', b'heic', struct.pack('>I', 0), b'mif1heic')
+
+    with open(path, 'wb') as f:
+        f.write(ftyp + meta)
+
+
+def _write_mp4(path, size, rotation, brand):
+    width, height = size
+    tkhd = _box(b'tkhd', struct.pack('>I5I8x4H', 0x00000003, 0, 0, 1, 0, 1000, 0, 0, 0, 0),
+                _rotation_matrix(rotation), struct.pack('>II', width << 16, height << 16))
+    hdlr = _box(b'hdlr', struct.pack('>II4s12x', 0, 0, b'vide'), b'VideoHandler\x00')
+    sample_entry = _box(b'avc1', bytes(6), struct.pack('>H', 1), bytes(16),
+                        struct.pack('>HHIIIH', width, height, 0x00480000, 0x00480000, 0, 1),
+                        bytes(32), struct.pack('>Hh', 0x18, -1))
+    stsd = _box(b'stsd', struct.pack('>II', 0, 1), sample_entry)
+    stbl = _box(b'stbl', stsd)
+    minf = _box(b'minf', stbl)
+    mdia = _box(b'mdia', hdlr, minf)
+    moov = _box(b'moov', _box(b'trak', tkhd, mdia))
+    ftyp = _box(b'ftyp', brand, struct.pack('>I', 0), brand)
+    mdat = _box(b'mdat', bytes(1024))
+
+    with open(path, 'wb') as f:
+        f.write(ftyp + mdat + moov)
+
+
+# === 对外接口 ===
+def generate(out_dir, sizes=DEFAULT_SIZES, copies=DEFAULT_COPIES, seed=0):
+    """在out_dir中生成样本，返回 {扩展名: 文件数}；缺少Pillow时跳过对应格式，缺少HEIF编码器时只生成HEIC文件头"""
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    index = 0
+
+    def emit(ext, writer, *args, **kwargs):
+        nonlocal index
+        path = os.path.join(out_dir, f"{index:06d}{ext}")
+        writer(path, *args, **kwargs)
+        counts[ext] = counts.get(ext, 0) + 1
+        index += 1
+
+    try:
+        import PIL     # noqa: F401
+        has_pil = True
+    except ImportError:
+        has_pil = False
+    has_heif = has_pil and _heif_available()
+
+    for _ in range(copies):
+        for size in sizes:
+            color = _color(seed, index)
+            if has_pil:
+                for orientation in range(1, 9):
+                    emit(".jpg", _write_pil, size, "JPEG", _color(seed, index), orientation, quality=85)
+                emit(".png", _write_pil, size, "PNG", color)
+                emit(".webp", _write_pil, size, "WEBP", color, 1)
+                emit(".bmp", _write_pil, size, "BMP", color)
+            if has_heif:
+                emit(".heic", _write_pil, size, "HEIF", color, 6)
+            else:
+                emit(".heic", _write_heic, size, 6)
+            for orientation in (1, 6, 8):
+                emit(".dng", _write_dng, size, orientation)
+            for rotation in VIDEO_ROTATIONS:
+                emit(".mp4", _write_mp4, size, rotation, b'isom')
+                emit(".mov", _write_mp4, size, rotation, b'qt  ')
+
+    return counts
+
+
+def parse_sizes(text):
+    """解析 "640x480,1920x1080" 形式的尺寸列表"""
+    sizes = []
+    for item in text.split(","):
+        width, height = item.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return tuple(sizes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.corpus", description="生成基准测试媒体样本")
+    parser.add_argument("out_dir", help="输出目录")
+    parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES,
+                        help="图像/视频尺寸列表，如 640x480,1920x1080")
+    parser.add_argument("--copies", type=int, default=DEFAULT_COPIES, help="每种组合生成的份数")
+    parser.add_argument("--seed", type=int, default=0, help="颜色种子")
+    args = parser.parse_args(argv)
+
+    counts = generate(args.out_dir, args.sizes, args.copies, args.seed)
+    for ext, count in sorted(counts.items()):
+        print(f"{ext}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""基准测试：对样本逐个调用get_orientation和process_file，按扩展名和探测路径统计吞吐量、延迟和峰值内存
+
+用法（在程序目录下运行）：
+    python -m benchmarks.run --out result.json
+    python -m benchmarks.run --corpus 样本目录 --compare 上一版本.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import corpus
+
+PHASES = ("probe", "process")
+
+
+def _peak_rss():
+    """当前进程的峰值内存（字节），平台不支持时返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _code_path(mc, ext):
+    if ext in mc.RAW_EXTS:
+        return "raw"
+    if ext in mc.heif_probe.HEIF_EXTS:
+        return "heif"
+    if ext in mc.VIDEO_EXTS:
+        return "video"
+    return "image"
+
+
+def _run_group(files, phase):
+    """在独立进程中处理一组文件，返回每个文件的耗时和该进程的峰值内存"""
+    import logging
+    import MediaClassifier as mc
+
+    mc.logger.setLevel(logging.WARNING)
+    latencies = []
+    if phase == "probe":
+        for path in files:
+            start = time.perf_counter()
+            mc.get_orientation(path)
+            latencies.append(time.perf_counter() - start)
+    else:
+        work_dir = tempfile.mkdtemp(prefix="mc_bench_")
+        try:
+            copies = []
+            for path in files:
+                copy = os.path.join(work_dir, os.path.basename(path))
+                shutil.copyfile(path, copy)
+                copies.append(copy)
+            ctx = mc.RunContext()
+            for path in copies:
+                start = time.perf_counter()
+                mc.process_file(ctx, path, work_dir, True)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return latencies, _peak_rss()
+
+
+def _summarize(latencies, peak_rss):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+    return {
+        "files": len(ordered),
+        "files_per_sec": len(ordered) / total if total else None,
+        "p50_ms": percentile(0.50) * 1000,
+        "p99_ms": percentile(0.99) * 1000,
+        "peak_rss": peak_rss,
+    }
+
+
+def run(corpus_dir, phases=PHASES, repeat=1):
+    """按扩展名分组，每组在新进程中运行（峰值内存互不影响），返回结果字典"""
+    import MediaClassifier as mc
+
+    groups = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if os.path.isfile(path):
+            groups.setdefault(os.path.splitext(name)[1].lower(), []).append(path)
+
+    results = {}
+    for phase in phases:
+        by_ext = {}
+        path_latencies, path_peaks = {}, {}
+        for ext, files in groups.items():
+            latencies, peaks = [], []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(1) as pool:
+                    group_latencies, group_peak = pool.submit(_run_group, files, phase).result()
+                latencies.extend(group_latencies)
+                if group_peak is not None:
+                    peaks.append(group_peak)
+            by_ext[ext] = _summarize(latencies, max(peaks, default=None))
+
+            code_path = _code_path(mc, ext)
+            path_latencies.setdefault(code_path, []).extend(latencies)
+            path_peaks.setdefault(code_path, []).extend(peaks)
+        results[phase] = {
+            "by_ext": by_ext,
+            "by_path": {name: _summarize(latencies, max(path_peaks[name], default=None))
+                        for name, latencies in path_latencies.items()},
+        }
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "corpus": {ext: len(files) for ext, files in groups.items()},
+        "results": results,
+    }
+
+
+def compare(current, previous):
+    """打印与上一次结果相比的吞吐量变化"""
+    for phase, data in current["results"].items():
+        old_phase = previous.get("results", {}).get(phase, {})
+        for section in ("by_path", "by_ext"):
+            for key, stats in sorted(data[section].items()):
+                old = old_phase.get(section, {}).get(key)
+                if not old or not old.get("files_per_sec") or not stats["files_per_sec"]:
+                    continue
+                change = stats["files_per_sec"] / old["files_per_sec"] - 1
+                print(f"{phase:8} {key:8} {stats['files_per_sec']:10.1f} 文件/秒 "
+                      f"({change:+.1%}) p99 {stats['p99_ms']:.2f}ms (原 {old['p99_ms']:.2f}ms)")
+
+
+def _print_results(report):
+    for phase, data in report["results"].items():
+        print(f"\n[{phase}]")
+        for section in ("by_path", "by_ext"):
+            for key, stats in sorted(data[section].items()):
+                rss = f"{stats['peak_rss'] / 1048576:.1f}MiB" if stats["peak_rss"] else "-"
+                rate = f"{stats['files_per_sec']:.1f}" if stats["files_per_sec"] else "-"
+                print(f"  {key:8} {stats['files']:6d} 个  {rate:>10} 文件/秒  "
+                      f"p50 {stats['p50_ms']:.2f}ms  p99 {stats['p99_ms']:.2f}ms  峰值内存 {rss}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description="MediaClassifier 基准测试")
+    parser.add_argument("--corpus", help="样本目录（默认在临时目录中生成）")
+    parser.add_argument("--sizes", type=corpus.parse_sizes, default=corpus.DEFAULT_SIZES,
+                        help="生成样本时的尺寸列表，如 640x480,1920x1080")
+    parser.add_argument("--copies", type=int, default=corpus.DEFAULT_COPIES,
+                        help="生成样本时每种组合的份数")
+    parser.add_argument("--phase", choices=PHASES, action="append",
+                        help="只运行指定阶段（可重复，默认全部）")
+    parser.add_argument("--repeat", type=int, default=1, help="每组重复运行次数")
+    parser.add_argument("--out", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="与之前保存的结果JSON比较")
+    args = parser.parse_args(argv)
+
+    corpus_dir = args.corpus
+    temp_dir = None
+    if not corpus_dir:
+        temp_dir = corpus_dir = tempfile.mkdtemp(prefix="mc_corpus_")
+        corpus.generate(corpus_dir, args.sizes, args.copies)
+    try:
+        report = run(corpus_dir, tuple(args.phase or PHASES), args.repeat)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    _print_results(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print()
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
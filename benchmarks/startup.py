@@ -0,0 +1,78 @@
+"""启动开销检查：用 python -X importtime 测量只处理视频时的导入耗时，并确认未加载图片后端
+
+用法（在程序目录下运行，超出预算或加载了不需要的模块时退出码为1）：
+    python -m benchmarks.startup --budget-ms 100
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import corpus
+
+DEFAULT_BUDGET_MS = 100
+
+# 只处理视频时不应导入的模块
+FORBIDDEN_MODULES = ("PIL", "rawpy", "pillow_heif")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+_SCRIPT = "import MediaClassifier as mc; mc.get_orientation(sys.argv[1])"
+
+
+def measure(video_path, program_dir):
+    """运行一次只含视频的探测，返回 (MediaClassifier导入耗时微秒, 已导入模块集合, 进程总耗时秒)"""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import sys; " + _SCRIPT, video_path],
+        cwd=program_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+
+    import_us = None
+    modules = set()
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        modules.add(name.split(".")[0])
+        if name == "MediaClassifier":
+            import_us = int(match.group(2))
+    return import_us, modules, wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.startup", description="检查只处理视频时的启动开销")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"MediaClassifier 导入耗时上限（毫秒，默认{DEFAULT_BUDGET_MS}）")
+    parser.add_argument("--runs", type=int, default=5, help="运行次数，取最小值")
+    args = parser.parse_args(argv)
+
+    program_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory(prefix="mc_startup_") as temp_dir:
+        video_path = os.path.join(temp_dir, "sample.mp4")
+        corpus._write_mp4(video_path, (1920, 1080), 90, b'isom')
+        samples = [measure(video_path, program_dir) for _ in range(args.runs)]
+
+    import_ms = min(sample[0] for sample in samples) / 1000
+    wall_ms = min(sample[2] for sample in samples) * 1000
+    loaded = sorted(set(FORBIDDEN_MODULES) & samples[0][1])
+    print(f"MediaClassifier 导入耗时: {import_ms:.1f}ms（预算 {args.budget_ms:.0f}ms）")
+    print(f"进程总耗时: {wall_ms:.1f}ms")
+
+    failed = False
+    if import_ms > args.budget_ms:
+        print("超出启动预算")
+        failed = True
+    if loaded:
+        print(f"只处理视频时加载了不需要的模块: {', '.join(loaded)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
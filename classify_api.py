@@ -0,0 +1,217 @@
+"""可嵌入的批量分类接口：在长期运行的进程中多次分类，不读写控制台、不询问
+
+    with ClassifierSession(jobs=4) as session:
+        batch = session.classify(["D:/导入/0001"])
+        for result in session.iter_classify(["D:/导入/0002"]):
+            print(result.status, result.path, result.dest)
+
+会话持有探测结果缓存、目录模板和各项设置，多个批次之间保持缓存和已加载的解码库。
+
+每个批次的计数器、操作日志和目录占用表等保存在该批次自己的RunContext中，不修改MediaClassifier的模块状态：
+同一进程中的多个会话可以同时运行批次，也可以同时调用MediaClassifier的其他函数。同一会话的批次依次执行。
+日志写入会话自己的logger（名为 "classify_api.session<序号>"），输出到log_handlers并照常传给根logger，
+不经过MediaClassifier的控制台输出。
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import MediaClassifier as mc
+import decoder_pool
+import dedup
+import journal
+import media_cache
+import media_keys
+import run_stats
+import transfer
+
+MODES = ("separate", "combined")
+
+_DONE = object()
+_session_ids = itertools.count(1)
+_journal_lock = threading.Lock()     # 多个会话可能同时在同一目录新建操作日志
+
+
+class FileResult:
+    """单个文件的处理结果
+
+    status: moved（已移动到dest） / extracted（压缩包成员已解压到dest，path为 "压缩包名:成员路径"） /
+    duplicate（与original内容相同，按重复处理方式处理） / ignored（不支持的类型） /
+    failed（error为原因；启用隔离时dest为隔离目录中的位置）
+    """
+    __slots__ = ('status', 'path', 'dest', 'original', 'error')
+
+    def __init__(self, status, path, dest=None, original=None, error=None):
+        self.status = status
+        self.path = path
+        self.dest = dest
+        self.original = original
+        self.error = error
+
+    def __repr__(self):
+        return f"FileResult({self.status!r}, {self.path!r}, dest={self.dest!r})"
+
+
+class BatchResult:
+    """一个批次的结果：逐个文件的结果、计数、统计报告（未启用统计时为None）和操作日志路径"""
+
+    def __init__(self, files, stats, journal_path):
+        self.files = files
+        self.stats = stats
+        self.journal_path = journal_path
+
+    def count(self, status):
+        return sum(1 for result in self.files if result.status == status)
+
+    @property
+    def moved(self):
+        return self.count("moved")
+
+    @property
+    def failed(self):
+        return self.count("failed")
+
+
+class ClassifierSession:
+    """分类会话：创建时确定设置，之后可多次调用classify() / iter_classify()
+
+    mode为 "separate"（照片和视频分开）或 "combined"；template为目录模板（见 --folder-template）；
+    duplicates为 None / "skip" / "hardlink" / "folder"；probe_timeout为ffmpeg和原生解码库探测单个文件的时限
+    （秒，None不限时）；quarantine为True时把无法探测的文件移到隔离目录；journal_dir不为None时每个批次
+    在其中写入可用 --undo 撤销的操作日志；log_handlers为会话logger的handler
+    （默认不输出，根logger上宿主程序已有的handler照常接收）。
+    """
+
+    def __init__(self, mode="separate", jobs=1, raw_processes=0, device_reads=None, transfers=1,
+                 verify="size", duplicates=None, template=None, cache=True, cache_path=None,
+                 probe_timeout=mc.DEFAULT_PROBE_TIMEOUT, quarantine=False,
+                 journal_dir=None, stats=False, log_handlers=None):
+        if mode not in MODES:
+            raise ValueError(f"未知的分类模式: {mode}")
+        if verify not in transfer.VERIFY_MODES:
+            raise ValueError(f"未知的校验方式: {verify}")
+        if duplicates not in (None,) + dedup.ACTIONS:
+            raise ValueError(f"未知的重复处理方式: {duplicates}")
+        self.separate_mode = mode == "separate"
+        self.jobs = jobs
+        self.raw_processes = raw_processes
+        self.device_reads = device_reads
+        self.transfers = transfers
+        self.verify = verify
+        self.duplicates = duplicates
+        self.template = media_keys.FolderTemplate(template or media_keys.DEFAULT_TEMPLATE)
+        self.probe_timeout = probe_timeout
+        self.quarantine = quarantine
+        self.journal_dir = journal_dir
+        self.stats_enabled = stats
+        self.log_handlers = list(log_handlers) if log_handlers else [logging.NullHandler()]
+        self.logger = logging.getLogger(f"{__name__}.session{next(_session_ids)}")
+        self.logger.setLevel(logging.INFO)
+        for log_handler in self.log_handlers:
+            self.logger.addHandler(log_handler)
+        self._cache_path = (cache_path or mc.CACHE_PATH) if cache else None
+        self._cache = None
+        # 解码进程在批次之间复用，超时或崩溃的进程在下次需要时重新启动
+        self._decoders = decoder_pool.DecoderPool(max(jobs, 1))
+        # 缓存连接只能在创建它的线程中使用，批次总在同一个工作线程中执行
+        self._worker = ThreadPoolExecutor(1, thread_name_prefix="classify-session")
+        self._closed = False
+
+    # === 对外接口 ===
+    def classify(self, paths):
+        """分类一批文件或文件夹，完成后返回BatchResult"""
+        results = []
+        report, journal_path = self._submit(paths, results.append).result()
+        return BatchResult(results, report, journal_path)
+
+    def iter_classify(self, paths):
+        """逐个返回FileResult（处理的同时产出）；迭代结束时批次已完成"""
+        results = queue.SimpleQueue()
+        future = self._submit(paths, results.put)
+        future.add_done_callback(lambda _: results.put(_DONE))
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            yield result
+        future.result()     # 批次中的异常在此抛出
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._worker.submit(self._close_cache).result()
+        self._worker.shutdown(wait=True)
+        self._decoders.close()
+        for log_handler in self.log_handlers:
+            self.logger.removeHandler(log_handler)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # === 批次执行 ===
+    def _submit(self, paths, sink):
+        if self._closed:
+            raise RuntimeError("会话已关闭")
+        return self._worker.submit(self._run_batch, [os.fspath(p) for p in paths], sink)
+
+    def _open_cache(self):
+        if self._cache is None and self._cache_path:
+            try:
+                self._cache = media_cache.MediaCache(self._cache_path)
+            except Exception as e:
+                self.logger.warning(f"无法打开缓存，不使用缓存: {str(e)}")
+                self._cache_path = None
+        return self._cache
+
+    def _close_cache(self):
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+
+    def _open_journal(self, paths):
+        if self.journal_dir is None:
+            return None
+        os.makedirs(self.journal_dir, exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d_%H%M%S") + ".jsonl"
+        with _journal_lock:
+            path = mc.get_unique_path(os.path.join(self.journal_dir, name))
+            return journal.create(path, paths, self.separate_mode, self.template.text)
+
+    def _run_batch(self, paths, sink):
+        ctx = mc.RunContext(self.template, run_stats.RunStats(enabled=self.stats_enabled), self.logger)
+        ctx.journal = self._open_journal(paths)
+        ctx.cache = self._open_cache()
+        ctx.result_sink = lambda *fields: sink(FileResult(*fields))
+        ctx.probe_timeout = self.probe_timeout or None
+        ctx.decoders = self._decoders
+        ctx.quarantine = self.quarantine
+        mc.open_transfers(ctx, self.transfers, self.verify)
+        mc.open_duplicates(ctx, self.duplicates)
+        try:
+            # 不进入已有的分类目录，重复导入同一文件夹时只处理新文件
+            mc.process_entries(ctx, mc.scan_paths(ctx, paths, skip_classified=True), self.separate_mode, self.jobs,
+                               self.raw_processes, self.device_reads)
+        finally:
+            mc.close_transfers(ctx)
+            mc.close_duplicates(ctx)
+            if ctx.cache is not None:
+                ctx.cache.flush()
+            journal_path = ctx.journal.path if ctx.journal else None
+            mc.close_journal(ctx, True)
+        report = ctx.stats.snapshot(**ctx.counters()) if self.stats_enabled else None
+        return report, journal_path
+
+
+def classify(paths, **options):
+    """分类一批文件并返回BatchResult（一次性会话；多次调用请使用ClassifierSession保持缓存）"""
+    with ClassifierSession(**options) as session:
+        return session.classify(paths)
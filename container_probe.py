@@ -0,0 +1,490 @@
+"""AVI、Matroska/WebM、FLV、ASF/WMV和MPEG节目流的文件头解析：只读取文件开头的头部结构获取分辨率和旋转角度
+
+按魔数识别容器（不依赖扩展名），按需读取拍摄时间；无法识别或解析时抛出ContainerProbeError，由调用方回退到ffmpeg。
+"""
+import os
+import struct
+from datetime import datetime
+
+import exif
+
+# === 读取限制 ===
+HEAD_BYTES = 64 * 1024      # MPEG序列头和FLV元数据最多读取的字节数
+MAX_ELEMENTS = 256          # 每一层最多遍历的块/元素/对象数量
+MAX_PAYLOAD = 4096          # 单个头部结构最多读取的字节数
+MAX_TAGS = 16               # FLV最多扫描的tag数
+MAX_DEPTH = 8               # AMF嵌套对象的最大深度
+
+CONTAINER_EXTS = ('.avi', '.mkv', '.webm', '.flv', '.wmv', '.asf', '.mpg', '.mpeg')
+
+# ASF对象GUID（按文件中的字节顺序）
+ASF_HEADER = bytes.fromhex('3026b2758e66cf11a6d900aa0062ce6c')              # 75B22630-668E-11CF-A6D9-00AA0062CE6C
+ASF_FILE_PROPERTIES = bytes.fromhex('a1dcab8c47a9cf118ee400c00c205365')     # 8CABDCA1-A947-11CF-8EE4-00C00C205365
+ASF_STREAM_PROPERTIES = bytes.fromhex('9107dcb7b7a9cf118ee600c00c205365')   # B7DC0791-A9B7-11CF-8EE6-00C00C205365
+ASF_HEADER_EXTENSION = bytes.fromhex('b503bf5f2ea9cf118ee300c00c205365')    # 5FBF03B5-A92E-11CF-8EE3-00C00C205365
+ASF_VIDEO_MEDIA = bytes.fromhex('c0ef19bc4d5bcf11a8fd00805f5c442b')         # BC19EFC0-5B4D-11CF-A8FD-00805F5C442B
+
+FILETIME_EPOCH_OFFSET = 11644473600     # 1601-01-01 到 1970-01-01 的秒数
+MATROSKA_EPOCH = 978307200              # 2001-01-01 00:00:00 UTC
+
+# Matroska元素ID（含长度标记位）
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_SEEK_HEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_DATE_UTC = 0x4461
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_PROJECTION = 0x7670
+MKV_PROJECTION_ROLL = 0x7675
+MKV_CLUSTER = 0x1F43B675
+
+_MONTHS = {name: index for index, name in enumerate(
+    ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"), 1)}
+
+
+class ContainerProbeError(ValueError):
+    """容器无法识别或解析，需要回退到ffmpeg"""
+
+
+def sniff(head):
+    """按魔数识别容器：avi / matroska / flv / asf / mpeg，无法识别时返回None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return "avi"
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return "matroska"
+    if head[:3] == b'FLV' and head[3:4] == b'\x01':
+        return "flv"
+    if head[:16] == ASF_HEADER:
+        return "asf"
+    if head[:4] in (b'\x00\x00\x01\xba', b'\x00\x00\x01\xb3'):
+        return "mpeg"
+    return None
+
+
+def _read(f, offset, size):
+    if size < 0:
+        raise ContainerProbeError("头部结构超出范围")
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) < size:
+        raise ContainerProbeError("文件头被截断")
+    return data
+
+
+def _text_datetime(text):
+    """摄像机写入的时间文本："2008:03:03 09:44:56" 或 "MON MAR 03 09:44:56 2008" -> "2008-03-03 09:44:56" """
+    parts = text.replace('\x00', ' ').split()
+    if len(parts) == 5 and parts[1][:3].upper() in _MONTHS and parts[2].isdigit():
+        _, month, day, clock, year = parts
+        text = f"{year}:{_MONTHS[month[:3].upper()]:02d}:{int(day):02d} {clock}"
+    return exif.format_datetime(text)
+
+
+def _local_time(seconds):
+    """UTC时间戳 -> 本地时间文本（与MP4 mvhd的处理一致）；明显无效的时间返回None"""
+    if seconds <= 86400:
+        return None
+    return datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _set_taken(meta, decode, *args):
+    """调用decode(*args)取拍摄时间写入meta；时间字段损坏时忽略，不影响已解析的尺寸（与MP4的处理一致）"""
+    try:
+        taken = decode(*args)
+    except (struct.error, IndexError, ValueError, OverflowError, OSError):
+        return
+    if taken:
+        meta.setdefault("taken", taken)
+
+
+# === AVI（RIFF） ===
+def _riff_chunks(f, start, end):
+    """遍历 [start, end) 中的RIFF块，返回 (块ID, LIST类型或None, 数据起点, 数据终点)"""
+    pos = start
+    for _ in range(MAX_ELEMENTS):
+        if pos + 8 > end:
+            return
+        chunk_id, size = struct.unpack('<4sI', _read(f, pos, 8))
+        data_start = pos + 8
+        list_type = None
+        if chunk_id in (b'LIST', b'RIFF'):
+            list_type = _read(f, data_start, 4)
+            data_start += 4
+        yield chunk_id, list_type, data_start, min(pos + 8 + size, end)
+        pos += 8 + size + (size & 1)      # 块按2字节对齐
+
+
+def _avi_stream_size(f, start, end):
+    """strl中视频流格式的尺寸；非视频流返回None"""
+    stream_type = None
+    for chunk_id, _, data_start, data_end in _riff_chunks(f, start, end):
+        if chunk_id == b'strh' and data_end - data_start >= 4:
+            stream_type = _read(f, data_start, 4)
+        elif chunk_id == b'strf' and stream_type == b'vids' and data_end - data_start >= 12:
+            # BITMAPINFOHEADER：biWidth、biHeight（自下而上存储时高度为正，否则为负）
+            width, height = struct.unpack('<ii', _read(f, data_start + 4, 8))
+            return (abs(width), abs(height)) if width and height else None
+    return None
+
+
+def _probe_avi(f, file_size, meta):
+    hdrl = None
+    for chunk_id, list_type, start, end in _riff_chunks(f, 12, file_size):
+        if list_type == b'hdrl':
+            hdrl = start, end
+            break
+        if list_type == b'movi':
+            break
+    if hdrl is None:
+        raise ContainerProbeError("未找到AVI头部")
+
+    main_size = stream_size = None
+    for chunk_id, list_type, start, end in _riff_chunks(f, *hdrl):
+        if chunk_id == b'avih' and end - start >= 40:
+            # MainAVIHeader的dwWidth/dwHeight，没有视频流格式时使用
+            main_size = struct.unpack('<II', _read(f, start + 32, 8))
+        elif list_type == b'strl' and stream_size is None:
+            stream_size = _avi_stream_size(f, start, end)
+        elif chunk_id == b'IDIT' and meta is not None:
+            # 数码相机写入的拍摄时间
+            _set_taken(meta, _avi_taken, f, start, end)
+    width, height = stream_size or main_size or (0, 0)
+    if not width or not height:
+        raise ContainerProbeError("AVI头部中没有视频尺寸")
+    return width, height, 0
+
+
+def _avi_taken(f, start, end):
+    return _text_datetime(_read(f, start, min(end - start, 64)).decode('latin-1'))
+
+
+# === Matroska / WebM（EBML） ===
+def _read_vint(f, keep_marker=False):
+    """读取EBML变长整数，返回 (值, 字节数, 是否为未知大小)"""
+    first = f.read(1)
+    if not first or not first[0]:
+        raise ContainerProbeError("EBML编码无效")
+    length = 9 - first[0].bit_length()
+    rest = f.read(length - 1)
+    if len(rest) < length - 1:
+        raise ContainerProbeError("文件头被截断")
+    value = first[0] if keep_marker else first[0] & ((1 << (8 - length)) - 1)
+    for byte in rest:
+        value = value << 8 | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, unknown
+
+
+def _ebml_elements(f, start, end):
+    """遍历 [start, end) 中的EBML元素，返回 (元素ID, 数据起点, 数据终点)；只读取元素头"""
+    pos = start
+    for _ in range(MAX_ELEMENTS):
+        if pos + 2 > end:
+            return
+        f.seek(pos)
+        element_id, id_length, _ = _read_vint(f, keep_marker=True)
+        size, size_length, unknown = _read_vint(f)
+        data_start = pos + id_length + size_length
+        data_end = end if unknown else min(data_start + size, end)
+        yield element_id, data_start, data_end
+        if unknown:
+            return              # 未知大小的元素（如直播录制的Segment/Cluster）延续到上一层结尾
+        pos = data_start + size
+
+
+def _ebml_uint(f, start, end):
+    return int.from_bytes(_read(f, start, min(end - start, 8)), 'big')
+
+
+def _ebml_float(f, start, end):
+    size = end - start
+    if size == 4:
+        return struct.unpack('>f', _read(f, start, 4))[0]
+    if size == 8:
+        return struct.unpack('>d', _read(f, start, 8))[0]
+    return 0.0
+
+
+def _mkv_video_track(f, start, end):
+    """解析TrackEntry，非视频轨道返回None"""
+    track_type, video = None, None
+    for element_id, data_start, data_end in _ebml_elements(f, start, end):
+        if element_id == MKV_TRACK_TYPE:
+            track_type = _ebml_uint(f, data_start, data_end)
+        elif element_id == MKV_VIDEO:
+            video = data_start, data_end
+    if track_type != 1 or video is None:
+        return None
+
+    width = height = 0
+    roll = 0.0         # ProjectionPoseRoll（度）
+    for element_id, data_start, data_end in _ebml_elements(f, *video):
+        if element_id == MKV_PIXEL_WIDTH:
+            width = _ebml_uint(f, data_start, data_end)
+        elif element_id == MKV_PIXEL_HEIGHT:
+            height = _ebml_uint(f, data_start, data_end)
+        elif element_id == MKV_PROJECTION:
+            for sub_id, sub_start, sub_end in _ebml_elements(f, data_start, data_end):
+                if sub_id == MKV_PROJECTION_ROLL:
+                    roll = _ebml_float(f, sub_start, sub_end)
+    if not width or not height:
+        raise ContainerProbeError("视频轨道尺寸为0")
+    return width, height, round(roll) % 360
+
+
+def _mkv_seek_positions(f, start, end, segment_start):
+    """SeekHead中各一级元素的位置 {元素ID: 文件偏移}"""
+    positions = {}
+    for element_id, data_start, data_end in _ebml_elements(f, start, end):
+        if element_id != MKV_SEEK:
+            continue
+        seek_id = position = None
+        for sub_id, sub_start, sub_end in _ebml_elements(f, data_start, data_end):
+            if sub_id == MKV_SEEK_ID:
+                seek_id = _ebml_uint(f, sub_start, sub_end)
+            elif sub_id == MKV_SEEK_POSITION:
+                position = _ebml_uint(f, sub_start, sub_end)
+        if seek_id is not None and position is not None:
+            positions[seek_id] = segment_start + position
+    return positions
+
+
+def _level1_element(f, pos, end, expected_id):
+    """读取位于pos的一级元素（SeekHead指向的位置），ID不符时返回None"""
+    for element_id, data_start, data_end in _ebml_elements(f, pos, end):
+        return (data_start, data_end) if element_id == expected_id else None
+    return None
+
+
+def _probe_matroska(f, file_size, meta):
+    segment = None
+    for element_id, data_start, data_end in _ebml_elements(f, 0, file_size):
+        if element_id == MKV_SEGMENT:
+            segment = data_start, data_end
+            break
+    if segment is None:
+        raise ContainerProbeError("未找到Segment")
+
+    # Tracks通常位于第一个Cluster之前；否则按SeekHead定位
+    tracks = info = None
+    seeks = {}
+    for element_id, data_start, data_end in _ebml_elements(f, *segment):
+        if element_id == MKV_SEEK_HEAD and not seeks:
+            seeks = _mkv_seek_positions(f, data_start, data_end, segment[0])
+        elif element_id == MKV_INFO:
+            info = data_start, data_end
+        elif element_id == MKV_TRACKS:
+            tracks = data_start, data_end
+        elif element_id == MKV_CLUSTER:
+            break
+        if tracks and (info or meta is None):
+            break
+    if tracks is None and MKV_TRACKS in seeks:
+        tracks = _level1_element(f, seeks[MKV_TRACKS], segment[1], MKV_TRACKS)
+    if tracks is None:
+        raise ContainerProbeError("未找到Tracks")
+
+    if meta is not None:
+        _set_taken(meta, _mkv_taken, f, info, seeks, segment)
+
+    for element_id, data_start, data_end in _ebml_elements(f, *tracks):
+        if element_id == MKV_TRACK_ENTRY:
+            result = _mkv_video_track(f, data_start, data_end)
+            if result:
+                return result
+    raise ContainerProbeError("未找到视频轨道")
+
+
+def _mkv_taken(f, info, seeks, segment):
+    """Info中的DateUTC（Info不在Tracks之前时按SeekHead定位）"""
+    if info is None and MKV_INFO in seeks:
+        info = _level1_element(f, seeks[MKV_INFO], segment[1], MKV_INFO)
+    if info is None:
+        return None
+    for element_id, data_start, data_end in _ebml_elements(f, *info):
+        if element_id == MKV_DATE_UTC and data_end - data_start == 8:
+            nanoseconds = struct.unpack('>q', _read(f, data_start, 8))[0]
+            return _local_time(MATROSKA_EPOCH + nanoseconds / 1e9)
+    return None
+
+
+# === FLV ===
+class _Amf:
+    """AMF0数据读取（onMetaData脚本tag）"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size):
+        if self.pos + size > len(self.data):
+            raise ContainerProbeError("元数据被截断")
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def value(self, depth=0, into=None):
+        marker = self.take(1)[0]
+        if marker == 0:         # number
+            return struct.unpack('>d', self.take(8))[0]
+        if marker == 1:         # boolean
+            return bool(self.take(1)[0])
+        if marker == 2:         # string
+            return self.take(struct.unpack('>H', self.take(2))[0]).decode('utf-8', 'replace')
+        if marker in (3, 8):    # object / ECMA array
+            if marker == 8:
+                self.take(4)
+            return self.members(depth + 1, {} if into is None else into)
+        if marker in (5, 6):    # null / undefined
+            return None
+        if marker == 10:        # strict array
+            count = struct.unpack('>I', self.take(4))[0]
+            return [self.value(depth + 1) for _ in range(min(count, MAX_ELEMENTS))]
+        if marker == 11:        # date
+            self.take(10)
+            return None
+        if marker == 12:        # long string
+            return self.take(struct.unpack('>I', self.take(4))[0]).decode('utf-8', 'replace')
+        raise ContainerProbeError(f"不支持的AMF类型: {marker}")
+
+    def members(self, depth, values):
+        if depth > MAX_DEPTH:
+            raise ContainerProbeError("元数据嵌套过深")
+        for _ in range(MAX_ELEMENTS * 4):
+            name_length = struct.unpack('>H', self.take(2))[0]
+            if name_length == 0 and self.data[self.pos:self.pos + 1] == b'\x09':
+                self.pos += 1
+                break
+            name = self.take(name_length).decode('utf-8', 'replace')
+            values[name] = self.value(depth)
+        return values
+
+
+def _flv_metadata(data):
+    """解析onMetaData，返回 {名称: 值}；数据截断时返回已读取的部分"""
+    amf = _Amf(data)
+    values = {}
+    try:
+        if amf.value() != "onMetaData":
+            return values
+        amf.value(into=values)
+    except (ContainerProbeError, struct.error):
+        pass
+    return values
+
+
+def _probe_flv(f, file_size, meta):
+    data_offset = struct.unpack('>I', _read(f, 5, 4))[0]
+    pos = data_offset + 4       # 跳过PreviousTagSize0
+    for _ in range(MAX_TAGS):
+        if pos + 11 > file_size:
+            break
+        tag = _read(f, pos, 11)
+        tag_type = tag[0] & 0x1F
+        size = int.from_bytes(tag[1:4], 'big')
+        if tag_type == 18:      # 脚本数据
+            f.seek(pos + 11)
+            values = _flv_metadata(f.read(min(size, HEAD_BYTES)))
+            width, height = values.get("width"), values.get("height")
+            if meta is not None and isinstance(values.get("creationdate"), str):
+                _set_taken(meta, _text_datetime, values["creationdate"])
+            if isinstance(width, float) and isinstance(height, float) and width > 0 and height > 0:
+                return int(width), int(height), 0
+        pos += 11 + size + 4
+    raise ContainerProbeError("FLV元数据中没有视频尺寸")
+
+
+# === ASF / WMV ===
+def _asf_objects(f, start, end):
+    """遍历ASF头部对象，返回 (GUID, 数据起点, 对象终点)"""
+    pos = start
+    for _ in range(MAX_ELEMENTS):
+        if pos + 24 > end:
+            return
+        header = _read(f, pos, 24)
+        size = struct.unpack_from('<Q', header, 16)[0]
+        if size < 24:
+            raise ContainerProbeError("ASF对象大小异常")
+        yield header[:16], pos + 24, min(pos + size, end)
+        pos += size
+
+
+def _asf_video_size(data):
+    """Stream Properties对象数据中的视频尺寸；非视频流返回None"""
+    if data[:16] != ASF_VIDEO_MEDIA or len(data) < 65:
+        return None
+    # 类型数据位于第54字节：编码宽高、标志、格式数据长度，随后为BITMAPINFOHEADER
+    width, height = struct.unpack_from('<II', data, 54)
+    if len(data) >= 77:
+        bitmap_width, bitmap_height = struct.unpack_from('<ii', data, 69)
+        if bitmap_width and bitmap_height:
+            width, height = abs(bitmap_width), abs(bitmap_height)
+    return (width, height) if width and height else None
+
+
+def _probe_asf(f, file_size, meta):
+    header_size = struct.unpack('<Q', _read(f, 16, 8))[0]
+    end = min(header_size, file_size)
+    pending = [(30, end)]
+    while pending:
+        for guid, data_start, data_end in _asf_objects(f, *pending.pop()):
+            if guid == ASF_STREAM_PROPERTIES:
+                data = _read(f, data_start, min(data_end - data_start, MAX_PAYLOAD))
+                size = _asf_video_size(data)
+                if size:
+                    return size + (0,)
+            elif guid == ASF_HEADER_EXTENSION and data_end - data_start >= 22:
+                # 扩展头部中的对象：跳过保留GUID和保留字段，随后为数据长度
+                extension_size = struct.unpack('<I', _read(f, data_start + 18, 4))[0]
+                pending.append((data_start + 22, min(data_start + 22 + extension_size, data_end)))
+            elif guid == ASF_FILE_PROPERTIES and meta is not None and data_end - data_start >= 32:
+                _set_taken(meta, _asf_taken, f, data_start)
+    raise ContainerProbeError("ASF头部中没有视频流")
+
+
+def _asf_taken(f, data_start):
+    """File Properties对象中的创建时间：FILETIME（UTC，100纳秒）"""
+    filetime = struct.unpack('<Q', _read(f, data_start + 24, 8))[0]
+    return _local_time(filetime / 10_000_000 - FILETIME_EPOCH_OFFSET)
+
+
+# === MPEG节目流 / 基本流 ===
+def _probe_mpeg(f, file_size, meta):
+    f.seek(0)
+    data = f.read(HEAD_BYTES)
+    pos = data.find(b'\x00\x00\x01\xb3')
+    if pos < 0 or pos + 7 > len(data):
+        raise ContainerProbeError("文件开头没有MPEG序列头")
+    # 序列头：12位水平尺寸、12位垂直尺寸
+    a, b, c = data[pos + 4:pos + 7]
+    width, height = a << 4 | b >> 4, (b & 0x0F) << 8 | c
+    if not width or not height:
+        raise ContainerProbeError("MPEG序列头尺寸为0")
+    return width, height, 0
+
+
+_PARSERS = {"avi": _probe_avi, "matroska": _probe_matroska, "flv": _probe_flv,
+            "asf": _probe_asf, "mpeg": _probe_mpeg}
+
+
+def probe_container_file(f, meta=None):
+    """从已打开的文件（或内存中的文件头）读取 (宽, 高, 旋转角度)；meta为字典时同时读取拍摄时间"""
+    file_size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    kind = sniff(f.read(16))
+    if kind is None:
+        raise ContainerProbeError("无法识别的视频容器")
+    try:
+        return _PARSERS[kind](f, file_size, meta)
+    except ContainerProbeError:
+        raise
+    except (struct.error, IndexError, ValueError, OverflowError, OSError) as e:
+        raise ContainerProbeError(f"{kind}容器解析失败: {e}") from e
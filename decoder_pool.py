@@ -0,0 +1,116 @@
+"""原生解码进程：rawpy、Pillow等原生解码库在独立的工作进程中运行
+
+损坏的文件可能让原生解码库长时间不返回甚至崩溃。工作进程在超时或崩溃时被结束，下次需要时重新启动，
+主进程和其他文件的处理不受影响；正常情况下工作进程在多个文件之间复用，不重复启动和导入解码库。
+"""
+import os
+import queue
+import threading
+
+
+class ProbeTimeout(Exception):
+    """探测超过时限（工作进程或子进程已被结束）"""
+
+
+class DecoderError(Exception):
+    """工作进程中的解码失败或工作进程异常退出"""
+
+
+def _serve(conn):
+    """工作进程主循环：逐个执行 (函数, 参数)，返回 (是否成功, 结果或错误信息)"""
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        func, args = task
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def call(self, func, args, timeout):
+        self.conn.send((func, args))
+        # 工作进程退出时poll同样返回，recv随即抛出EOFError
+        if not self.conn.poll(timeout):
+            raise ProbeTimeout(f"探测超时（{timeout:g}秒）")
+        try:
+            ok, value = self.conn.recv()
+        except EOFError:
+            self.process.join()
+            raise DecoderError(f"解码进程异常退出（退出码 {self.process.exitcode}）") from None
+        if not ok:
+            raise DecoderError(value)
+        return value
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class DecoderPool:
+    """最多size个工作进程，首次需要时才启动；超时或出错的工作进程被结束，不再复用
+
+    func和参数需可序列化（模块级函数）。在fork得到的子进程（如RAW进程池）中调用时直接在当前进程执行。
+    """
+
+    def __init__(self, size=1):
+        import multiprocessing
+        self._context = multiprocessing.get_context("spawn")
+        self._pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def call(self, func, args=(), timeout=None):
+        """在工作进程中执行func(*args)；timeout为None时不限时"""
+        if os.getpid() != self._pid:
+            return func(*args)
+        with self._slots:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = _Worker(self._context)
+            try:
+                result = worker.call(func, args, timeout)
+            except DecoderError:
+                if worker.process.is_alive():
+                    # 解码函数抛出的异常：工作进程仍可复用
+                    self._idle.put(worker)
+                else:
+                    worker.conn.close()
+                raise
+            except BaseException:
+                worker.kill()
+                raise
+            self._idle.put(worker)
+            return result
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            worker.stop()
@@ -0,0 +1,149 @@
+"""重复文件检测：先按文件大小分组，再比较首尾数据块的部分哈希，最后才对剩余候选计算完整哈希"""
+import os
+import shutil
+import threading
+
+import transfer
+
+# === 检测配置 ===
+PARTIAL_BLOCK = 64 * 1024       # 部分哈希读取的首尾数据块大小
+HASH_BUFFER = 1024 * 1024       # 完整哈希的读取缓冲区大小
+LINK_SUFFIX = ".dup-link"       # 创建硬链接时的临时文件后缀
+
+DUPLICATE_FOLDER = "重复"
+ACTIONS = ("skip", "hardlink", "folder")
+
+
+def _blake2b():
+    import hashlib
+    return hashlib.blake2b(digest_size=32)
+
+
+def partial_hash(path, size):
+    """文件首尾各PARTIAL_BLOCK字节的哈希；不超过两块的文件即为完整哈希"""
+    digest = _blake2b()
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_BLOCK))
+        if size > 2 * PARTIAL_BLOCK:
+            f.seek(size - PARTIAL_BLOCK)
+        digest.update(f.read(PARTIAL_BLOCK))
+    return digest.digest()
+
+
+def full_hash(path):
+    digest = _blake2b()
+    buf = bytearray(HASH_BUFFER)
+    view = memoryview(buf)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                return digest.digest()
+            digest.update(view[:n])
+
+
+class _Candidate:
+    """同一目录中的已知文件，哈希在首次需要时才计算"""
+    __slots__ = ('path', 'size', 'location', 'partial', 'full')
+
+    def __init__(self, path, size, location=None):
+        self.path = path            # 读取内容的位置
+        self.size = size
+        self.location = location or path    # 文件最终所在位置
+        self.partial = None
+        self.full = None
+
+    def partial_hash(self):
+        if self.partial is None:
+            self.partial = partial_hash(self.path, self.size)
+        return self.partial
+
+    def full_hash(self):
+        if self.full is None:
+            self.full = self.partial_hash() if self.size <= 2 * PARTIAL_BLOCK else full_hash(self.path)
+        return self.full
+
+
+class DuplicateIndex:
+    """按目标目录维护 {文件大小: 候选文件}；大小唯一的文件不会被读取
+
+    每个目录首次用到时列出一次，之后只登记本次运行放入的文件。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirs = {}         # 目录 -> {大小: [_Candidate]}
+
+    def _sizes(self, target_dir):
+        sizes = self._dirs.get(target_dir)
+        if sizes is None:
+            sizes = self._dirs[target_dir] = {}
+            try:
+                with os.scandir(target_dir) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_file(follow_symlinks=False):
+                                size = entry.stat(follow_symlinks=False).st_size
+                                sizes.setdefault(size, []).append(_Candidate(entry.path, size))
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+        return sizes
+
+    def find(self, path, size, target_dir):
+        """返回target_dir中与path内容相同的文件（最终位置），没有时返回None"""
+        with self._lock:
+            candidates = list(self._sizes(target_dir).get(size, ()))
+        if not candidates:
+            return None
+
+        probe = _Candidate(path, size)
+        for stage in (_Candidate.partial_hash, _Candidate.full_hash):
+            remaining = []
+            for candidate in candidates:
+                try:
+                    if stage(candidate) == stage(probe):
+                        remaining.append(candidate)
+                except OSError:
+                    # 候选文件已被移走或无法读取：不视为重复
+                    continue
+            if not remaining:
+                return None
+            candidates = remaining
+        return candidates[0].location
+
+    def add(self, path, size, target_dir, location=None):
+        """登记本次运行放入target_dir的文件；path为之后可读取该文件的位置，location为其最终位置"""
+        with self._lock:
+            self._sizes(target_dir).setdefault(size, []).append(_Candidate(path, size, location))
+
+
+def link_duplicate(path, original):
+    """用指向original的硬链接替换path（先建临时链接再替换，中途失败时path不受影响）"""
+    temp_path = path + LINK_SUFFIX
+    os.link(original, temp_path)
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def unlink_duplicate(path):
+    """撤销硬链接：把path替换为内容相同的独立文件"""
+    part = path + transfer.PART_SUFFIX
+    try:
+        with open(path, 'rb') as fsrc, open(part, 'wb') as fdst:
+            transfer.copy_data(fsrc, fdst)
+        shutil.copystat(path, part)
+        os.replace(part, path)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
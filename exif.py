@@ -0,0 +1,140 @@
+"""EXIF/TIFF 标签读取：IFD0的尺寸和方向，按需读取拍摄时间（DateTimeOriginal）和相机型号"""
+import struct
+
+# === 读取限制 ===
+MAX_ENTRIES = 1024          # IFD允许的最大条目数
+MAX_TEXT = 256              # 文本标签最多读取的字节数
+
+# === TIFF 标签 ===
+TAG_NEW_SUBFILE_TYPE = 0x00FE
+TAG_IMAGE_WIDTH = 0x0100
+TAG_IMAGE_LENGTH = 0x0101
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_ORIENTATION = 0x0112
+TAG_DATETIME = 0x0132
+TAG_SUB_IFDS = 0x014A
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_PIXEL_X = 0xA002
+TAG_PIXEL_Y = 0xA003
+TAG_DEFAULT_CROP_SIZE = 0xC620
+
+# 标准TIFF、ORF('RO'/'RS')、RW2
+TIFF_MAGICS = (42, 0x4F52, 0x5352, 0x55)
+
+EXIF_PREFIX = b'Exif\x00\x00'
+
+
+class ExifError(ValueError):
+    """不是有效的TIFF/EXIF结构"""
+
+
+def format_datetime(text):
+    """把EXIF时间 "YYYY:MM:DD HH:MM:SS" 规范为 "YYYY-MM-DD HH:MM:SS"，无效时返回None"""
+    text = text.strip().strip('\x00')
+    if len(text) < 19 or not text[:4].isdigit() or text[:4] == "0000":
+        return None
+    date, time_part = text[:10].replace(':', '-'), text[11:19]
+    return f"{date} {time_part}"
+
+
+def camera_name(make, model):
+    """相机名称：型号已包含厂商名时不重复"""
+    make, model = (make or "").strip(), (model or "").strip()
+    if not model:
+        return make or None
+    if make and not model.lower().startswith(make.lower().split()[0]):
+        return f"{make} {model}"
+    return model
+
+
+def _ifd(read, endian, offset):
+    count = struct.unpack(endian + 'H', read(offset, 2))[0]
+    if count > MAX_ENTRIES:
+        raise ExifError("IFD条目数异常")
+    entries = read(offset + 2, count * 12)
+    return [(struct.unpack_from(endian + 'HHI', entries, i * 12), offset + 2 + i * 12 + 8)
+            for i in range(count)]
+
+
+def _text(read, endian, count, field_offset):
+    """读取ASCII标签（4字节以内内联存放）"""
+    if count <= 4:
+        data = read(field_offset, count)
+    else:
+        data = read(struct.unpack(endian + 'I', read(field_offset, 4))[0], min(count, MAX_TEXT))
+    return data.split(b'\x00', 1)[0].decode('utf-8', 'replace').strip()
+
+
+def read_tags(read, meta=None, magics=(42,)):
+    """读取TIFF结构IFD0的 (宽, 高, 方向)（缺少的为None）
+
+    read(偏移, 长度) 按TIFF头为起点读取数据。meta为字典时同时读取拍摄时间和相机型号，
+    写入 meta["taken"] 和 meta["camera"]。
+    """
+    order = read(0, 2)
+    if order == b'II':
+        endian = '<'
+    elif order == b'MM':
+        endian = '>'
+    else:
+        raise ExifError("不是TIFF结构")
+    magic, ifd_offset = struct.unpack(endian + 'HI', read(2, 6))
+    if magic not in magics:
+        raise ExifError("未知的TIFF魔数")
+
+    values, texts = {}, {}
+    exif_offset = None
+    for (tag, typ, n), field_offset in _ifd(read, endian, ifd_offset):
+        if n == 0:
+            continue
+        if tag in (TAG_IMAGE_WIDTH, TAG_IMAGE_LENGTH, TAG_ORIENTATION):
+            # SHORT/LONG的第一个值内联存放在条目中
+            if typ == 3:
+                values[tag] = struct.unpack(endian + 'H', read(field_offset, 2))[0]
+            elif typ == 4:
+                values[tag] = struct.unpack(endian + 'I', read(field_offset, 4))[0]
+        elif meta is not None and typ == 2 and tag in (TAG_MAKE, TAG_MODEL, TAG_DATETIME):
+            texts[tag] = _text(read, endian, n, field_offset)
+        elif meta is not None and tag == TAG_EXIF_IFD and typ in (4, 13):
+            exif_offset = struct.unpack(endian + 'I', read(field_offset, 4))[0]
+
+    if meta is not None:
+        taken = None
+        if exif_offset:
+            try:
+                for (tag, typ, n), field_offset in _ifd(read, endian, exif_offset):
+                    if tag == TAG_DATETIME_ORIGINAL and typ == 2:
+                        taken = format_datetime(_text(read, endian, n, field_offset))
+                        break
+            except (ExifError, struct.error, ValueError):
+                pass
+        if not taken and TAG_DATETIME in texts:
+            taken = format_datetime(texts[TAG_DATETIME])
+        if taken:
+            meta.setdefault("taken", taken)
+        camera = camera_name(texts.get(TAG_MAKE), texts.get(TAG_MODEL))
+        if camera:
+            meta.setdefault("camera", camera)
+
+    return values.get(TAG_IMAGE_WIDTH), values.get(TAG_IMAGE_LENGTH), values.get(TAG_ORIENTATION)
+
+
+def _reader(data):
+    def read(offset, size):
+        if offset < 0 or offset + size > len(data):
+            raise ExifError("EXIF数据被截断")
+        return data[offset:offset + size]
+    return read
+
+
+def parse(data, meta=None):
+    """解析内存中的EXIF数据（可带Exif前缀），返回方向；无法解析时为1"""
+    if data.startswith(EXIF_PREFIX):
+        data = data[len(EXIF_PREFIX):]
+    try:
+        orientation = read_tags(_reader(data), meta)[2]
+    except (ExifError, struct.error):
+        return 1
+    return orientation if orientation in range(1, 9) else 1
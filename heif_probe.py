@@ -0,0 +1,235 @@
+"""HEIC/HEIF 文件头解析：只读取meta中主图像的ispe（尺寸）和irot/imir（旋转/镜像）属性，按需读取Exif项目"""
+import os
+import struct
+
+import exif
+
+# === 读取限制 ===
+MAX_BOXES = 4096            # 每一层最多遍历的box数量
+MAX_META = 1024 * 1024      # meta box最多读取的字节数
+MAX_EXIF = 64 * 1024        # Exif项目最多读取的字节数
+
+HEIF_EXTS = ('.heic', '.heif')
+
+# (irot角度, imir镜像轴) -> 等效EXIF方向；MIAF规定先旋转再镜像，角度为逆时针90度的倍数
+ORIENTATIONS = {
+    (0, None): 1, (0, 0): 2, (0, 1): 4,
+    (1, None): 8, (1, 0): 7, (1, 1): 5,
+    (2, None): 3, (2, 0): 4, (2, 1): 2,
+    (3, None): 6, (3, 0): 5, (3, 1): 7,
+}
+
+
+class HeifProbeError(ValueError):
+    """文件头无法解析，需要回退到pillow_heif"""
+
+
+# === box 读取 ===
+def _iter_boxes(data, start, end):
+    """遍历内存中 [start, end) 范围内的box，返回 (类型, 数据起点, box终点)"""
+    pos = start
+    for _ in range(MAX_BOXES):
+        if pos + 8 > end:
+            return
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            raise HeifProbeError(f"box大小异常: {box_type!r}")
+        yield box_type, pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def _find_meta(f, file_size):
+    """在文件顶层查找meta box，只读取各box头，返回 (数据起点, box终点)"""
+    pos = 0
+    for _ in range(MAX_BOXES):
+        f.seek(pos)
+        header = f.read(16)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                break
+            size = struct.unpack_from('>Q', header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < header_size:
+            raise HeifProbeError(f"box大小异常: {box_type!r}")
+        if box_type == b'meta':
+            return pos + header_size, min(pos + size, file_size)
+        pos += size
+    raise HeifProbeError("未找到meta")
+
+
+def _parse_ipma(data, start, end):
+    """解析属性关联，返回 {项目ID: [属性序号(从1开始)]}"""
+    version, flags = data[start], int.from_bytes(data[start + 1:start + 4], 'big')
+    pos = start + 4
+    count = struct.unpack_from('>I', data, pos)[0]
+    pos += 4
+    associations = {}
+    for _ in range(count):
+        if version < 1:
+            item_id = struct.unpack_from('>H', data, pos)[0]
+            pos += 2
+        else:
+            item_id = struct.unpack_from('>I', data, pos)[0]
+            pos += 4
+        n = data[pos]
+        pos += 1
+        indexes = []
+        for _ in range(n):
+            if flags & 1:
+                indexes.append(struct.unpack_from('>H', data, pos)[0] & 0x7FFF)
+                pos += 2
+            else:
+                indexes.append(data[pos] & 0x7F)
+                pos += 1
+        associations[item_id] = indexes
+        if pos > end:
+            raise HeifProbeError("ipma被截断")
+    return associations
+
+
+def _parse_meta(data):
+    """从meta数据（不含FullBox头）中取主图像的 (宽, 高, EXIF方向)"""
+    primary = None
+    properties = []
+    associations = {}
+    for box_type, start, end in _iter_boxes(data, 4, len(data)):
+        if box_type == b'pitm':
+            primary = struct.unpack_from('>H' if data[start] == 0 else '>I', data, start + 4)[0]
+        elif box_type == b'iprp':
+            for sub_type, sub_start, sub_end in _iter_boxes(data, start, end):
+                if sub_type == b'ipco':
+                    properties = [(t, s, e) for t, s, e in _iter_boxes(data, sub_start, sub_end)]
+                elif sub_type == b'ipma':
+                    # 可能有多个ipma，后出现的补充前面的
+                    associations.update(_parse_ipma(data, sub_start, sub_end))
+    if primary is None:
+        raise HeifProbeError("缺少pitm")
+    if primary not in associations:
+        raise HeifProbeError("主图像没有属性")
+
+    size = None
+    angle, axis = 0, None
+    for index in associations[primary]:
+        if not 1 <= index <= len(properties):
+            continue
+        box_type, start, end = properties[index - 1]
+        if box_type == b'ispe':
+            size = struct.unpack_from('>II', data, start + 4)
+        elif box_type == b'irot':
+            angle = data[start] & 0x03
+        elif box_type == b'imir':
+            axis = data[start] & 0x01
+    if not size or not size[0] or not size[1]:
+        raise HeifProbeError("缺少ispe")
+    return size[0], size[1], ORIENTATIONS[(angle, axis)]
+
+
+def _uint(data, pos, size):
+    return int.from_bytes(data[pos:pos + size], 'big')
+
+
+def _exif_location(data, meta_offset):
+    """在iinf/iloc中查找Exif项目，返回 (文件偏移, 长度)；没有时返回None"""
+    exif_id = None
+    iloc = idat_start = None
+    for box_type, start, end in _iter_boxes(data, 4, len(data)):
+        if box_type == b'iinf':
+            entry_start = start + (6 if data[start] == 0 else 8)
+            for entry_type, entry_start, _ in _iter_boxes(data, entry_start, end):
+                version = data[entry_start] if entry_type == b'infe' else 0
+                if version < 2:
+                    continue
+                id_size = 2 if version == 2 else 4
+                item_type = data[entry_start + 4 + id_size + 2:entry_start + 4 + id_size + 6]
+                if item_type == b'Exif':
+                    exif_id = _uint(data, entry_start + 4, id_size)
+                    break
+        elif box_type == b'iloc':
+            iloc = start
+        elif box_type == b'idat':
+            idat_start = meta_offset + start
+    if exif_id is None or iloc is None:
+        return None
+
+    version = data[iloc]
+    offset_size, length_size = data[iloc + 4] >> 4, data[iloc + 4] & 0x0F
+    base_offset_size, index_size = data[iloc + 5] >> 4, data[iloc + 5] & 0x0F
+    id_size = 4 if version == 2 else 2
+    pos = iloc + 6
+    count = _uint(data, pos, id_size)
+    pos += id_size
+    for _ in range(count):
+        item_id = _uint(data, pos, id_size)
+        pos += id_size
+        method = 0
+        if version in (1, 2):
+            method = _uint(data, pos, 2) & 0x0F
+            pos += 2
+        pos += 2                                # data_reference_index
+        base_offset = _uint(data, pos, base_offset_size)
+        pos += base_offset_size
+        extent_count = _uint(data, pos, 2)
+        pos += 2
+        extents = []
+        for _ in range(extent_count):
+            if version in (1, 2):
+                pos += index_size
+            extents.append((_uint(data, pos, offset_size), _uint(data, pos + offset_size, length_size)))
+            pos += offset_size + length_size
+        if item_id != exif_id or not extents:
+            continue
+        offset, length = extents[0]
+        if method == 0:
+            return base_offset + offset, length
+        if method == 1 and idat_start is not None:
+            return idat_start + base_offset + offset, length
+        return None
+    return None
+
+
+def _read_exif(f, data, meta_offset, meta):
+    """读取Exif项目中的拍摄时间和相机型号；项目数据以4字节的TIFF头偏移开头"""
+    location = _exif_location(data, meta_offset)
+    if not location:
+        return
+    offset, length = location
+    f.seek(offset)
+    blob = f.read(min(length, MAX_EXIF) if length else MAX_EXIF)
+    if len(blob) < 4:
+        return
+    exif.parse(blob[4 + _uint(blob, 0, 4):], meta)
+
+
+# === 对外接口 ===
+def probe_heif_file(f, meta=None):
+    """从已打开的文件读取主图像的 (编码宽, 编码高, 等效EXIF方向)；meta为字典时同时读取拍摄时间和相机型号"""
+    file_size = f.seek(0, os.SEEK_END)
+    try:
+        start, end = _find_meta(f, file_size)
+        if end - start > MAX_META:
+            raise HeifProbeError("meta过大")
+        f.seek(start)
+        data = f.read(end - start)
+        if len(data) < end - start:
+            raise HeifProbeError("meta被截断")
+        result = _parse_meta(data)
+        if meta is not None:
+            try:
+                _read_exif(f, data, start, meta)
+            except (struct.error, IndexError, ValueError):
+                pass        # Exif损坏不影响尺寸和方向
+        return result
+    except (struct.error, IndexError) as e:
+        raise HeifProbeError(f"文件头解析失败: {e}") from e
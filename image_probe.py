@@ -0,0 +1,201 @@
+"""图片文件头解析：按魔数识别真实格式（不依赖扩展名），直接读取尺寸和EXIF方向
+
+支持JPEG、PNG、WebP、BMP、TIFF，HEIF交给heif_probe；无法识别或解析时抛出ImageProbeError，由调用方回退到Pillow。
+"""
+import struct
+
+import exif
+import heif_probe
+
+# === 读取限制 ===
+HEAD_BYTES = 16 * 1024      # 首次读取的文件头字节数，超出部分按需定位读取
+MAX_SEGMENTS = 64           # JPEG最多扫描的段数
+MAX_CHUNKS = 64             # PNG/WebP最多扫描的块数
+MAX_EXIF = 64 * 1024        # 单个EXIF块最多读取的字节数
+
+HEIF_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1'}
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+
+class ImageProbeError(ValueError):
+    """文件头无法解析，需要回退到Pillow；kind为识别出的格式（未识别时为None）"""
+
+    def __init__(self, message, kind=None):
+        super().__init__(message)
+        self.kind = kind
+
+
+class _Source:
+    """带文件头缓存的有界随机读取"""
+
+    def __init__(self, f, head, base=0):
+        self.f = f
+        self.head = head
+        self.base = base
+
+    def sub(self, offset):
+        return _Source(self.f, self.head, self.base + offset)
+
+    def read(self, offset, size):
+        start = self.base + offset
+        end = start + size
+        if end <= len(self.head):
+            return self.head[start:end]
+        if self.f is None:
+            raise ImageProbeError("数据被截断")
+        self.f.seek(start)
+        data = self.f.read(size)
+        if len(data) < size:
+            raise ImageProbeError("文件头被截断")
+        return data
+
+
+def sniff(head):
+    """按魔数识别格式：jpeg / png / webp / bmp / tiff / heif，无法识别时返回None"""
+    if head[:3] == b'\xff\xd8\xff':
+        return "jpeg"
+    if head[:8] == PNG_MAGIC:
+        return "png"
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return "webp"
+    if head[:2] == b'BM':
+        return "bmp"
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return "tiff"
+    if head[4:8] == b'ftyp':
+        brands = {head[8:12]} | {head[i:i + 4] for i in range(16, min(len(head), 64), 4)}
+        if brands & HEIF_BRANDS:
+            return "heif"
+    return None
+
+
+# === 各格式解析 ===
+def _probe_jpeg(src, meta):
+    orientation = 1
+    pos = 2
+    for _ in range(MAX_SEGMENTS):
+        marker = src.read(pos, 2)
+        if marker[0] != 0xFF:
+            raise ImageProbeError("JPEG段标记无效")
+        code = marker[1]
+        if code == 0xFF:                        # 填充字节
+            pos += 1
+            continue
+        if code == 0x01 or 0xD0 <= code <= 0xD7:    # 无长度的标记
+            pos += 2
+            continue
+        if code in (0xD9, 0xDA):                # EOI/SOS之前没有SOF
+            break
+        length = struct.unpack('>H', src.read(pos + 2, 2))[0]
+        if code == 0xE1 and orientation == 1 and length > 8 and src.read(pos + 4, 6) == exif.EXIF_PREFIX:
+            orientation = exif.parse(src.read(pos + 4, min(length - 2, MAX_EXIF)), meta)
+        elif 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', src.read(pos + 5, 4))
+            return width, height, orientation
+        pos += 2 + length
+    raise ImageProbeError("未找到JPEG SOF段")
+
+
+def _probe_png(src, meta):
+    length, chunk_type, width, height = struct.unpack('>I4sII', src.read(8, 16))
+    if chunk_type != b'IHDR':
+        raise ImageProbeError("缺少IHDR")
+
+    # eXIf应位于IDAT之前，之后的块不再读取
+    pos = 8 + 12 + length
+    for _ in range(MAX_CHUNKS):
+        length, chunk_type = struct.unpack('>I4s', src.read(pos, 8))
+        if chunk_type in (b'IDAT', b'IEND'):
+            break
+        if chunk_type == b'eXIf':
+            return width, height, exif.parse(src.read(pos + 8, min(length, MAX_EXIF)), meta)
+        pos += 12 + length
+    return width, height, 1
+
+
+def _probe_webp(src, meta):
+    chunk_type = src.read(12, 4)
+    if chunk_type == b'VP8 ':
+        if src.read(23, 3) != b'\x9d\x01\x2a':
+            raise ImageProbeError("VP8起始码无效")
+        width, height = struct.unpack('<HH', src.read(26, 4))
+        return width & 0x3FFF, height & 0x3FFF, 1
+    if chunk_type == b'VP8L':
+        if src.read(20, 1) != b'\x2f':
+            raise ImageProbeError("VP8L签名无效")
+        bits = struct.unpack('<I', src.read(21, 4))[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 1
+    if chunk_type != b'VP8X':
+        raise ImageProbeError(f"未知的WebP块: {chunk_type!r}")
+
+    header = src.read(20, 10)
+    width = int.from_bytes(header[4:7], 'little') + 1
+    height = int.from_bytes(header[7:10], 'little') + 1
+    if not header[0] & 0x08:                    # 没有EXIF
+        return width, height, 1
+
+    # EXIF块通常位于文件末尾：只读取块头跳过中间的图像数据
+    pos = 12
+    for _ in range(MAX_CHUNKS):
+        try:
+            chunk_type, length = struct.unpack('<4sI', src.read(pos, 8))
+        except ImageProbeError:
+            break
+        if chunk_type == b'EXIF':
+            return width, height, exif.parse(src.read(pos + 8, min(length, MAX_EXIF)), meta)
+        pos += 8 + length + (length & 1)
+    return width, height, 1
+
+
+def _probe_bmp(src, meta):
+    header_size = struct.unpack('<I', src.read(14, 4))[0]
+    if header_size == 12:                       # BITMAPCOREHEADER
+        width, height = struct.unpack('<HH', src.read(18, 4))
+    else:
+        width, height = struct.unpack('<ii', src.read(18, 8))
+    # 高度为负表示自上而下存储
+    return abs(width), abs(height), 1
+
+
+def _probe_tiff(src, meta):
+    try:
+        width, height, orientation = exif.read_tags(src.read, meta)
+    except exif.ExifError as e:
+        raise ImageProbeError(str(e)) from e
+    if not width or not height:
+        raise ImageProbeError("缺少图像尺寸")
+    return width, height, orientation if orientation in range(1, 9) else 1
+
+
+_PARSERS = {"jpeg": _probe_jpeg, "png": _probe_png, "webp": _probe_webp,
+            "bmp": _probe_bmp, "tiff": _probe_tiff}
+
+
+# === 对外接口 ===
+def probe_image_file(f, meta=None):
+    """从已打开的文件（或内存中的文件头）读取 (格式, 宽, 高, EXIF方向)"""
+    head = f.read(HEAD_BYTES)
+    kind = sniff(head)
+    try:
+        if kind == "heif":
+            return (kind,) + heif_probe.probe_heif_file(f, meta)
+        if kind is None:
+            raise ImageProbeError("无法识别的图片格式")
+        width, height, orientation = _PARSERS[kind](_Source(f, head), meta)
+    except heif_probe.HeifProbeError as e:
+        raise ImageProbeError(str(e), kind) from e
+    except ImageProbeError as e:
+        e.kind = kind
+        raise
+    except struct.error as e:
+        raise ImageProbeError(f"文件头解析失败: {e}", kind) from e
+    if not width or not height:
+        raise ImageProbeError("图像尺寸为0", kind)
+    return kind, width, height, orientation
+
+
+def probe_image(file_path, meta=None):
+    """读取图片文件头，返回 (格式, 宽, 高, EXIF方向)；meta为字典时同时读取拍摄时间和相机型号"""
+    with open(file_path, 'rb') as f:
+        return probe_image_file(f, meta)
@@ -0,0 +1,201 @@
+"""按设备调度探测读取：机械硬盘和网络共享上限制每个设备的并发读取数，按目录/inode顺序读取并预读文件头"""
+import bisect
+import itertools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+# === 调度配置 ===
+ROTATIONAL_READS = 2        # 机械硬盘上同时进行的读取数
+REMOTE_READS = 4            # 网络文件系统上同时进行的读取数
+PREFETCH_AHEAD = 8          # 每次读取完成后预读的排队文件数
+PREFETCH_BYTES = 64 * 1024  # 每个文件预读的字节数（与文件头解析读取的大小一致）
+
+REMOTE_FS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs",
+             "fuse.sshfs", "fuse.rclone", "davfs", "fuse.davfs2"}
+
+
+# === 设备识别 ===
+def _linux_fs_types():
+    """读取 /proc/self/mountinfo，返回 {"主:次": 文件系统类型}"""
+    types = {}
+    try:
+        with open("/proc/self/mountinfo", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.split()
+                if "-" not in fields:
+                    continue
+                separator = fields.index("-")
+                if separator + 1 < len(fields):
+                    types.setdefault(fields[2], fields[separator + 1])
+    except OSError:
+        pass
+    return types
+
+
+def _linux_rotational(dev):
+    """块设备是否为机械硬盘；分区没有queue目录时读取所在磁盘的"""
+    base = os.path.realpath(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+    for path in (base, os.path.dirname(base)):
+        try:
+            with open(os.path.join(path, "queue", "rotational")) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return False
+
+
+def _windows_remote(path):
+    import ctypes
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if not drive:
+        return False
+    if drive.startswith("\\\\"):
+        return True
+    return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4     # DRIVE_REMOTE
+
+
+_fs_types = None            # Linux上的 {"主:次": 文件系统类型}，首次识别设备时读取
+
+
+def device_kind(dev, path):
+    """返回 "rotational" / "remote" / "local"（SSD或无法识别）"""
+    global _fs_types
+    try:
+        if sys.platform.startswith("linux"):
+            if _fs_types is None:
+                _fs_types = _linux_fs_types()
+            if _fs_types.get(f"{os.major(dev)}:{os.minor(dev)}") in REMOTE_FS:
+                return "remote"
+            if _linux_rotational(dev):
+                return "rotational"
+        elif sys.platform == "win32" and _windows_remote(path):
+            return "remote"
+    except (OSError, AttributeError, ValueError):
+        pass
+    return "local"
+
+
+def default_limit(kind):
+    """设备类型对应的并发读取上限，None表示不限制"""
+    return {"rotational": ROTATIONAL_READS, "remote": REMOTE_READS}.get(kind)
+
+
+def prefetch(path, nbytes=PREFETCH_BYTES):
+    """提示内核预读文件头（不等待读取完成）；平台不支持时不做任何事"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, nbytes, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# === 调度器 ===
+class _Device:
+    __slots__ = ('limit', 'active', 'queue', 'last_key')
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.queue = []         # [(位置键, 序号, _Task)]，按位置排序
+        self.last_key = None    # 上一次开始读取的位置，按电梯算法向前推进
+
+
+class _Task:
+    __slots__ = ('executor', 'fn', 'args', 'future', 'path', 'queued_at', 'prefetched')
+
+    def __init__(self, executor, fn, args, path):
+        self.executor = executor
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.path = path
+        self.queued_at = time.perf_counter()
+        self.prefetched = False
+
+
+class IOScheduler:
+    """为每个设备排队探测任务：未超过并发上限时立即提交，否则按 (目录, inode) 顺序依次提交
+
+    limit为每个设备的并发读取数，None时按设备类型自动选择（SSD和未识别的设备不限制）。
+    on_wait(路径, 排队秒数) 在任务开始执行时调用，可用于统计。
+    """
+
+    def __init__(self, limit=None, on_wait=None):
+        self.limit = limit
+        self.on_wait = on_wait
+        self._lock = threading.Lock()
+        self._devices = {}      # st_dev -> _Device
+        self._seq = itertools.count()
+
+    def _device(self, dev, path):
+        device = self._devices.get(dev)
+        if device is None:
+            limit = self.limit or default_limit(device_kind(dev, path))
+            device = self._devices[dev] = _Device(limit)
+        return device
+
+    def submit(self, executor, path, st, inode, fn, *args):
+        """提交读取path的任务，返回Future；st为文件的stat结果"""
+        with self._lock:
+            device = self._device(st.st_dev, path)
+            if device.limit is None:
+                return executor.submit(fn, *args)
+            task = _Task(executor, fn, args, path)
+            if device.active < device.limit:
+                device.active += 1
+                device.last_key = (os.path.dirname(path), inode, path)
+                start = [task]
+            else:
+                bisect.insort(device.queue, ((os.path.dirname(path), inode, path), next(self._seq), task))
+                start = []
+        for task in start:
+            self._start(st.st_dev, task)
+        return task.future
+
+    def _start(self, dev, task):
+        if self.on_wait is not None:
+            self.on_wait(task.path, time.perf_counter() - task.queued_at)
+        try:
+            inner = task.executor.submit(task.fn, *task.args)
+        except BaseException as e:
+            task.future.set_exception(e)
+            self._finished(dev)
+            return
+        inner.add_done_callback(lambda f: self._done(dev, task, f))
+
+    def _done(self, dev, task, inner):
+        try:
+            task.future.set_result(inner.result())
+        except BaseException as e:
+            task.future.set_exception(e)
+        self._finished(dev)
+
+    def _finished(self, dev):
+        """一个读取结束：按电梯顺序启动下一个，并预读其后的排队文件"""
+        with self._lock:
+            device = self._devices[dev]
+            device.active -= 1
+            if not device.queue:
+                return
+            index = bisect.bisect_left(device.queue, (device.last_key,))
+            if index >= len(device.queue):
+                index = 0
+            key, _, task = device.queue.pop(index)
+            device.last_key = key
+            device.active += 1
+            ahead = [item[2] for item in device.queue[index:index + PREFETCH_AHEAD] if not item[2].prefetched]
+            for item in ahead:
+                item.prefetched = True
+        self._start(dev, task)
+        for item in ahead:
+            prefetch(item.path)
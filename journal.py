@@ -0,0 +1,122 @@
+"""操作日志：以JSON Lines追加记录每次移动，用于中断续跑和流式撤销"""
+import json
+import os
+import threading
+import time
+
+# === 写入配置 ===
+FSYNC_EVERY = 256           # 每写入多少条记录执行一次fsync
+FSYNC_INTERVAL = 2.0        # 距上次fsync超过该秒数时立即fsync
+READ_BLOCK = 64 * 1024      # 反向读取时每次读取的字节数
+
+JOURNAL_VERSION = 1
+
+
+class JournalError(ValueError):
+    """日志文件不存在或格式无效"""
+
+
+class Journal:
+    """追加写入的操作日志；每条记录立即写入文件，按批次fsync到磁盘"""
+
+    def __init__(self, path, truncate=False):
+        self.path = path
+        self.f = open(path, 'wb' if truncate else 'ab')
+        # 上次崩溃时写了一半的行单独成行，避免与新记录粘连
+        if not truncate and self.f.tell() and not _ends_with_newline(path):
+            self.f.write(b'\n')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, op, **fields):
+        """追加一条记录（进程崩溃不会丢失，断电最多丢失最近一批）"""
+        line = json.dumps({"op": op, **fields}, ensure_ascii=False)
+        with self._lock:
+            self.f.write(line.encode('utf-8') + b'\n')
+            self.f.flush()
+            self._unsynced += 1
+            if self._unsynced >= FSYNC_EVERY or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self.f.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if not self.f.closed:
+                self._sync()
+                self.f.close()
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def create(path, paths, separate_mode, template=None, **fields):
+    """新建日志并写入运行参数（续跑时据此恢复输入路径、分类模式、目录模板和分片）"""
+    journal = Journal(path)
+    journal.record("start", version=JOURNAL_VERSION, time=time.time(),
+                   paths=[os.path.abspath(p) for p in paths], separate_mode=separate_mode,
+                   template=template, **fields)
+    journal.sync()
+    return journal
+
+
+def _parse(line):
+    """解析一行记录；崩溃时写了一半的行返回None"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def iter_records(path):
+    """按写入顺序逐条返回记录"""
+    with open(path, 'rb') as f:
+        for line in f:
+            record = _parse(line)
+            if record:
+                yield record
+
+
+def iter_records_reverse(path):
+    """从文件末尾开始逐块向前读取，按写入的逆序逐条返回记录（内存占用与文件大小无关）"""
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            size = min(READ_BLOCK, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + tail).split(b'\n')
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                record = _parse(line)
+                if record:
+                    yield record
+        record = _parse(tail)
+        if record:
+            yield record
+
+
+def read_header(path, op="start"):
+    """读取日志的首条记录（操作日志为start，计划文件为plan）"""
+    try:
+        for record in iter_records(path):
+            if record.get("op") == op:
+                return record
+            break
+    except OSError as e:
+        raise JournalError(f"无法读取操作日志: {e}") from e
+    raise JournalError("不是有效的操作日志")
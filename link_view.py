@@ -0,0 +1,189 @@
+"""链接视图：原文件保持不动，在视图目录中按分类目录建立硬链接（同一设备）或符号链接（跨设备）
+
+视图目录中的清单记录每个链接对应的源文件及其大小、修改时间和inode。再次运行时，源文件未变化且链接仍在的
+文件不重新探测也不改动，只为新增或变化的文件建立链接、删除源文件已不存在的链接。每个视图目录对应一个目录模板，
+多个视图（按方向、按日期等）可同时存在，只占用目录项的空间。
+"""
+import errno
+import os
+import stat
+
+import journal
+import media_cache
+import transfer
+
+# === 视图配置 ===
+MANIFEST_NAME = ".media-view.jsonl"     # 视图目录中的清单文件
+LINK_TYPES = ("auto", "hardlink", "symlink")
+VIEW_VERSION = 1
+
+# 自动模式下无法建立硬链接时改用符号链接的错误码
+_SYMLINK_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOSYS,
+                            getattr(errno, "EOPNOTSUPP", errno.EPERM), getattr(errno, "ENOTSUP", errno.EPERM)}
+
+
+def manifest_path(root):
+    return os.path.join(root, MANIFEST_NAME)
+
+
+def read_header(root):
+    """视图清单的首条记录；视图不存在或清单无效时返回None"""
+    path = manifest_path(root)
+    if not os.path.exists(path):
+        return None
+    try:
+        return journal.read_header(path, "view")
+    except journal.JournalError:
+        return None
+
+
+def _under(key, scopes):
+    return any(key == scope or key.startswith(scope.rstrip(os.sep) + os.sep) for scope in scopes)
+
+
+class LinkView:
+    """一个视图目录及其清单；只应在单个线程中使用
+
+    清单在运行期间只追加记录（link / unlink），中断后再次打开时按顺序重放；正常结束时重写为紧凑的清单。
+    """
+
+    def __init__(self, root, template, separate_mode, link_type="auto"):
+        self.root = os.path.abspath(root)
+        self._root_key = media_cache.normalize_path(root)
+        self.link_type = link_type
+        self.kept = 0
+        self.linked = 0
+        self.removed = 0
+        self.rebuilt = False    # 目录模板或分类模式变化，已删除原有链接
+        self._header = {"version": VIEW_VERSION, "template": template, "separate_mode": separate_mode}
+        self._records = {}      # 规范化源路径 -> link记录
+        self._seen = set()      # 本次运行中确认或新建了链接的源文件
+        self._emptied = set()   # 删除过链接的目录（结束时清理空目录）
+
+        os.makedirs(self.root, exist_ok=True)
+        header = read_header(self.root)
+        if header is not None:
+            self._load()
+            if any(header.get(name) != value for name, value in self._header.items()):
+                # 目录模板或分类模式变化：原有链接全部失效，重新建立整个视图
+                for record in self._records.values():
+                    self._remove_link(record)
+                self._records.clear()
+                self.rebuilt = True
+        self._rewrite()
+        self._manifest = journal.Journal(manifest_path(self.root))
+
+    def _load(self):
+        for record in journal.iter_records(manifest_path(self.root)):
+            op = record.get("op")
+            if op == "link":
+                self._records[media_cache.normalize_path(record["src"])] = record
+            elif op == "unlink":
+                self._records.pop(media_cache.normalize_path(record["src"]), None)
+
+    def _rewrite(self):
+        """把当前的链接记录写成紧凑的清单（先写临时文件再替换）"""
+        path = manifest_path(self.root)
+        temp = journal.Journal(path + transfer.PART_SUFFIX, truncate=True)
+        try:
+            temp.record("view", **self._header)
+            for record in self._records.values():
+                temp.record(**record)
+        finally:
+            temp.close()
+        os.replace(temp.path, path)
+
+    # === 对外接口 ===
+    def unchanged(self, path, st, inode):
+        """源文件自上次建立链接以来未变化且链接仍然有效时返回True（该文件无需探测）"""
+        key = media_cache.normalize_path(path)
+        record = self._records.get(key)
+        if record is None or (record["size"], record["mtime_ns"], record["inode"]) != (st.st_size, st.st_mtime_ns, inode):
+            return False
+        if not self._link_valid(record):
+            return False
+        self._seen.add(key)
+        self.kept += 1
+        return True
+
+    def discard(self, path):
+        """删除源文件原有的链接（文件已变化，需要重新建立），返回被删除的链接路径或None"""
+        record = self._records.pop(media_cache.normalize_path(path), None)
+        if record is None:
+            return None
+        self._remove_link(record)
+        self._manifest.record("unlink", src=record["src"])
+        return record["link"]
+
+    def link(self, path, link_path, st):
+        """为源文件建立链接并写入清单，返回链接类型（hardlink / symlink）"""
+        src = os.path.abspath(path)
+        link_type = self.link_type
+        if link_type == "auto":
+            link_type = "symlink" if transfer.is_cross_device(src, os.path.dirname(link_path)) else "hardlink"
+        if link_type == "hardlink":
+            try:
+                os.link(src, link_path)
+            except OSError as e:
+                if self.link_type != "auto" or e.errno not in _SYMLINK_FALLBACK_ERRNOS:
+                    raise
+                link_type = "symlink"
+        if link_type == "symlink":
+            os.symlink(src, link_path)
+
+        record = {"op": "link", "src": src, "link": os.path.abspath(link_path), "type": link_type,
+                  "size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+        key = media_cache.normalize_path(src)
+        self._records[key] = record
+        self._seen.add(key)
+        self._manifest.record(**record)
+        self.linked += 1
+        return link_type
+
+    def close(self, scopes=None):
+        """结束本次运行；scopes为完整扫描过的输入路径，其中未再出现的源文件的链接会被删除
+
+        运行被中断时scopes为None，只整理清单，不删除任何链接。
+        """
+        self._manifest.close()
+        if scopes is not None:
+            scopes = [media_cache.normalize_path(scope) for scope in scopes]
+            for key in [key for key in self._records if key not in self._seen and _under(key, scopes)]:
+                record = self._records.pop(key)
+                self._remove_link(record)
+                self.removed += 1
+        self._prune()
+        self._rewrite()
+
+    # === 链接检查与删除 ===
+    def _link_valid(self, record):
+        try:
+            st = os.lstat(record["link"])
+        except OSError:
+            return False
+        if record["type"] == "symlink":
+            return stat.S_ISLNK(st.st_mode)
+        # 源文件被替换（如编辑器另存）后inode变化，原硬链接仍指向旧内容
+        return not stat.S_ISLNK(st.st_mode) and st.st_ino == record["inode"]
+
+    def _remove_link(self, record):
+        """删除由视图建立的链接；链接已被替换为其他文件时保留"""
+        link_path = record["link"]
+        if self._link_valid(record):
+            try:
+                os.remove(link_path)
+            except OSError:
+                return
+        self._emptied.add(os.path.dirname(link_path))
+
+    def _prune(self):
+        """逐级向上清理删除链接后变空的分类目录（不删除视图目录本身）"""
+        for d in self._emptied:
+            try:
+                while _under(os.path.normcase(d), [self._root_key]) and os.path.normcase(d) != self._root_key \
+                        and os.path.isdir(d) and not os.listdir(d):
+                    os.rmdir(d)
+                    d = os.path.dirname(d)
+            except OSError:
+                continue
+        self._emptied.clear()
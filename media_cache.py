@@ -0,0 +1,104 @@
+"""媒体元数据缓存：按路径、大小、修改时间和inode保存探测结果，文件未变化时跳过重新探测"""
+import os
+import time
+
+# === 缓存配置 ===
+CACHE_VERSION = 4           # 探测逻辑或表结构变化时递增，旧缓存会被丢弃
+MAX_ENTRIES = 500_000       # 最多保留的条目数，超出时淘汰最久未使用的条目
+COMMIT_EVERY = 1000         # 每写入多少条提交一次事务
+
+
+def normalize_path(path):
+    """缓存键使用的规范化路径"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class MediaCache:
+    """SQLite 探测结果缓存；只应在单个线程中使用"""
+
+    def __init__(self, db_path, max_entries=MAX_ENTRIES, rebuild=False):
+        import sqlite3     # 使用--no-cache时不导入
+
+        self.max_entries = max_entries
+        self.stamp = int(time.time())
+        self._used = []         # 本次命中的路径，关闭时批量更新使用时间
+        self._writes = 0
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if rebuild or version != CACHE_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS media")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS media ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER,"
+            " orientation TEXT, width INTEGER, height INTEGER, rotation REAL,"
+            " taken TEXT, camera TEXT, details INTEGER, last_used INTEGER)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS media_last_used ON media (last_used)")
+        self.conn.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        self.conn.commit()
+
+    def get(self, path, st, inode, details=False):
+        """文件大小、修改时间和inode均未变化时返回 (方向, 宽, 高, 旋转, 拍摄时间, 相机)，否则返回None
+
+        details为True时，未读取过拍摄时间和相机型号的条目视为未命中。
+        """
+        key = normalize_path(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, inode, orientation, width, height, rotation, taken, camera, details"
+            " FROM media WHERE path = ?", (key,)
+        ).fetchone()
+        if not row or row[:3] != (st.st_size, st.st_mtime_ns, inode) or (details and not row[9]):
+            return None
+        self._used.append(key)
+        return row[3:9]
+
+    def put(self, path, st, inode, result, details=False):
+        """保存探测结果 (方向, 宽, 高, 旋转, 拍摄时间, 相机)；details表示是否读取过后两项"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (normalize_path(path), st.st_size, st.st_mtime_ns, inode, *result, int(details), self.stamp)
+        )
+        self._count_write()
+
+    def rename(self, src, dest):
+        """文件被移动后更新缓存键（移动不改变大小、修改时间和inode）"""
+        src, dest = normalize_path(src), normalize_path(dest)
+        self.conn.execute("DELETE FROM media WHERE path = ?", (dest,))
+        self.conn.execute("UPDATE media SET path = ? WHERE path = ?", (dest, src))
+        self._count_write()
+
+    def flush(self):
+        """提交尚未提交的写入（长时间运行时在空闲期调用）"""
+        if self._writes:
+            self.conn.commit()
+            self._writes = 0
+
+    def _count_write(self):
+        self._writes += 1
+        if self._writes >= COMMIT_EVERY:
+            self.conn.commit()
+            self._writes = 0
+
+    def _evict(self):
+        """淘汰最久未使用的条目，使总数不超过上限"""
+        count = self.conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM media WHERE path IN"
+                " (SELECT path FROM media ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def close(self):
+        """写回命中记录的使用时间、执行淘汰并关闭数据库"""
+        self.conn.executemany(
+            "UPDATE media SET last_used = ? WHERE path = ?",
+            ((self.stamp, key) for key in self._used)
+        )
+        self._used.clear()
+        self._evict()
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,139 @@
+"""分类目录模板：用一次探测得到的元数据生成（多级）分类目录名，如 {year}/{month}/{orientation}{media}
+
+每个模板字段对应一个键函数；需要拍摄时间或相机型号的键会让探测同时读取这些元数据，不增加额外的读取遍数。
+"""
+import os
+import re
+import string
+from datetime import datetime
+
+DEFAULT_TEMPLATE = "{orientation}{media}"
+UNKNOWN = "未知"
+
+# Windows和常见文件系统不允许出现在目录名中的字符
+_INVALID_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+class MediaInfo:
+    """生成目录名所需的文件信息（来自一次探测或缓存）"""
+    __slots__ = ('path', 'kind', 'orientation', 'width', 'height', 'rotation', 'taken', 'camera', 'separate_mode')
+
+    def __init__(self, path, kind, result, separate_mode, taken=None):
+        self.path = path
+        self.kind = kind
+        self.orientation, self.width, self.height, self.rotation = result[:4]
+        self.taken = result[4] or taken     # 没有拍摄时间时使用调用方提供的时间（如修改时间）
+        self.camera = result[5]
+        self.separate_mode = separate_mode
+
+    def display_size(self):
+        """旋转后的显示尺寸"""
+        if self.kind == "photo":
+            rotated = self.rotation in (5, 6, 7, 8)
+        else:
+            rotated = abs(self.rotation or 0) % 180 == 90
+        return (self.height, self.width) if rotated else (self.width, self.height)
+
+
+def mtime_datetime(mtime):
+    """修改时间（时间戳），格式与拍摄时间一致"""
+    return datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# === 键 ===
+class Key:
+    __slots__ = ('func', 'details')
+
+    def __init__(self, func, details):
+        self.func = func            # MediaInfo -> 文本（None表示未知）
+        self.details = details      # 是否需要探测拍摄时间和相机型号
+
+
+KEYS = {}
+
+
+def register_key(name, func, details=False):
+    """注册模板字段"""
+    KEYS[name] = Key(func, details)
+
+
+def _media(info):
+    if not info.separate_mode:
+        return "媒体"
+    return "图片" if info.kind == "photo" else "视频"
+
+
+def _resolution(info):
+    """视频按短边分为 8K/4K/1440p/1080p/720p/SD，照片按百万像素"""
+    width, height = info.display_size()
+    if not width or not height:
+        return None
+    if info.kind == "photo":
+        return f"{max(1, round(width * height / 1_000_000))}MP"
+    short = min(width, height)
+    for limit, name in ((4320, "8K"), (2160, "4K"), (1440, "1440p"), (1080, "1080p"), (720, "720p")):
+        if short >= limit:
+            return name
+    return "SD"
+
+
+def _date_part(start, end):
+    return lambda info: info.taken[start:end] if info.taken else None
+
+
+register_key("orientation", lambda info: info.orientation)
+register_key("media", _media)
+register_key("year", _date_part(0, 4), details=True)
+register_key("month", _date_part(5, 7), details=True)
+register_key("day", _date_part(8, 10), details=True)
+register_key("date", _date_part(0, 10), details=True)
+register_key("resolution", _resolution)
+register_key("camera", lambda info: info.camera, details=True)
+register_key("ext", lambda info: os.path.splitext(info.path)[1].lstrip('.').upper() or None)
+
+
+def sanitize(name):
+    """把键的取值变为合法的目录名"""
+    name = _INVALID_CHARS.sub('_', str(name)).strip().rstrip('.')
+    if name in ('', '.', '..'):
+        return UNKNOWN
+    return name
+
+
+# === 模板 ===
+class FolderTemplate:
+    """解析后的目录模板；以 / 分隔多级目录，每一级由文本和 {键} 组成"""
+
+    def __init__(self, text):
+        self.text = text
+        self.components = []    # [[(文本, 键名或None, 格式)]]
+        for part in re.split(r'[/\\]', text):
+            if not part:
+                continue
+            parsed = []
+            for literal, field, spec, conversion in string.Formatter().parse(part):
+                if field is not None:
+                    if field not in KEYS:
+                        raise ValueError(f"未知的模板字段: {{{field}}}（可用: {', '.join(KEYS)}）")
+                    if conversion:
+                        raise ValueError(f"模板字段不支持转换: {{{field}!{conversion}}}")
+                parsed.append((literal, field, spec))
+            self.components.append(parsed)
+        if not self.components:
+            raise ValueError("目录模板为空")
+
+        self.needs_details = any(KEYS[field].details for component in self.components
+                                 for _, field, _ in component if field)
+
+    def render(self, info):
+        """生成相对于基准目录的分类目录路径"""
+        parts = []
+        for component in self.components:
+            text = ""
+            for literal, field, spec in component:
+                text += literal
+                if field:
+                    value = KEYS[field].func(info)
+                    text += format(sanitize(value) if value is not None else UNKNOWN, spec)
+            parts.append(sanitize(text))
+        return os.path.join(*parts)
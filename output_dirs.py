@@ -0,0 +1,71 @@
+"""分类目录登记表：记录程序新建的分类目录，分片、监视模式和嵌入接口据此不进入这些目录
+
+登记表保存在程序目录中，不在用户的文件夹里写入标记文件；按目录名无法区分分类目录和按年份或相机型号命名的源文件夹。
+每行一个规范化路径，以 "-" 开头的行表示撤销时已删除该目录。多个进程（如同时运行的分片）追加到同一个文件，
+每次查询前读入其他进程新追加的行。
+"""
+import os
+import threading
+
+import media_cache
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output_dirs.txt")
+
+
+class OutputDirs:
+    """分类目录登记表；可在多个线程中使用"""
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirs = set()      # 已登记的目录（规范化路径）
+        self._offset = 0        # 已读入的文件长度
+
+    def _refresh(self):
+        """读入上次读取之后追加的行"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # 其他进程写了一半的行留到下次读取
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        for line in data[:end].decode('utf-8', 'replace').splitlines():
+            if line.startswith('-'):
+                self._dirs.discard(line[1:])
+            elif line:
+                self._dirs.add(line)
+
+    def _append(self, line):
+        with open(self.path, 'ab') as f:
+            f.write((line + '\n').encode('utf-8'))
+
+    def add(self, path):
+        """登记新建的分类目录（应在创建目录之前调用，其他进程扫描到该目录时已能查到）
+
+        登记表无法写入（如程序目录只读）时只在本对象中记住该目录。
+        """
+        key = media_cache.normalize_path(path)
+        with self._lock:
+            self._dirs.add(key)
+            try:
+                self._append(key)
+            except OSError:
+                pass
+
+    def discard(self, path):
+        """撤销时删除了分类目录，取消登记"""
+        key = media_cache.normalize_path(path)
+        with self._lock:
+            self._refresh()
+            if key in self._dirs:
+                self._append('-' + key)
+                self._dirs.discard(key)
+
+    def __contains__(self, path):
+        key = media_cache.normalize_path(path)
+        with self._lock:
+            self._refresh()
+            return key in self._dirs
@@ -0,0 +1,178 @@
+"""低开销的日志输出：日志记录经队列交给后台线程写出，控制台按固定间隔刷新一行进度
+
+逐个文件的日志写入日志文件（可选），控制台只显示警告、错误和汇总信息，避免控制台输出成为瓶颈。
+"""
+import logging
+import queue
+import sys
+import threading
+import time
+
+# === 显示配置 ===
+REFRESH_INTERVAL = 0.5      # 进度行刷新间隔（秒）
+MIN_ETA_ELAPSED = 2.0       # 运行超过该秒数后才估算剩余时间
+CLEAR_LINE = "\r\033[K"
+
+LOG_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+FILE_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class ProgressLine:
+    """控制台进度行：已处理数、文件/秒和字节/秒；调用count_total()时另显示总数和剩余时间，统计完成前显示为"统计中"
+
+    advance()只更新计数，由后台线程按REFRESH_INTERVAL重绘，调用方不会被控制台写入阻塞。
+    """
+
+    def __init__(self, stream=None, interval=REFRESH_INTERVAL):
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.lock = threading.RLock()   # 与控制台日志输出共用，避免进度行和日志交错
+        self.done = 0
+        self.bytes = 0
+        self._count_lock = threading.Lock()
+        self.total = None
+        self._counted = None    # 未统计总数时为None
+        self._shown = False
+        self._started = time.perf_counter()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.clear()
+
+    def advance(self, nbytes=0):
+        # 并行模式下由探测线程的完成回调调用
+        with self._count_lock:
+            self.done += 1
+            self.bytes += nbytes
+
+    def count_total(self, entries):
+        """在后台线程中统计待处理文件总数（entries为可迭代对象）"""
+        self._counted = 0
+
+        def run():
+            for _ in entries:
+                self._counted += 1
+                if self._stop_event.is_set():
+                    return
+            self.total = self._counted
+        threading.Thread(target=run, daemon=True).start()
+
+    def render(self):
+        elapsed = max(time.perf_counter() - self._started, 1e-6)
+        rate = self.done / elapsed
+        text = f"已处理 {self.done}"
+        if self.total is not None:
+            text += f"/{self.total}"
+        elif self._counted is not None:
+            text += f"（已发现 {self._counted}，统计中）"
+        text += f" 个文件 | {rate:.1f} 文件/秒 | {format_bytes(self.bytes / elapsed)}/秒"
+        if self.total is not None and rate > 0 and elapsed >= MIN_ETA_ELAPSED:
+            text += f" | 剩余 {format_duration(max(self.total - self.done, 0) / rate)}"
+        return text
+
+    def clear(self):
+        with self.lock:
+            if self._shown:
+                self.stream.write(CLEAR_LINE)
+                self.stream.flush()
+                self._shown = False
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            with self.lock:
+                self.stream.write(CLEAR_LINE + self.render())
+                self.stream.flush()
+                self._shown = True
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """输出前先清除进度行（下次刷新时重绘）"""
+
+    def __init__(self, progress_line=None, stream=None):
+        super().__init__(stream)
+        self.progress_line = progress_line
+
+    def emit(self, record):
+        if self.progress_line is None:
+            super().emit(record)
+            return
+        with self.progress_line.lock:
+            self.progress_line.clear()
+            super().emit(record)
+
+
+class _QueueHandler(logging.Handler):
+    """只把记录放入队列：消息已是格式化好的字符串，写出和格式化都在后台线程完成"""
+
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.put_nowait(record)
+
+
+class AsyncLogging:
+    """把logger的输出改为经队列由后台线程写出；stop()写完剩余记录并恢复原来的handler"""
+
+    def __init__(self, logger, handlers):
+        from logging.handlers import QueueListener
+        self.logger = logger
+        self._original = list(logger.handlers)
+        records = queue.SimpleQueue()
+        self._listener = QueueListener(records, *handlers, respect_handler_level=True)
+        self._handlers = handlers
+        self._queue_handler = _QueueHandler(records)
+
+    def start(self):
+        self._listener.start()
+        self.logger.handlers = [self._queue_handler]
+        return self
+
+    def stop(self):
+        self.logger.handlers = self._original
+        self._listener.stop()
+        for handler in self._handlers:
+            handler.close()
+
+
+def file_handler(path, level):
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter(FILE_FORMAT))
+    return handler
+
+
+class ExcludeLogger(logging.Filter):
+    """过滤掉指定logger（及其子logger）的记录"""
+
+    def __init__(self, name):
+        super().__init__()
+        self.excluded = name
+
+    def filter(self, record):
+        return not (record.name == self.excluded or record.name.startswith(self.excluded + "."))
@@ -0,0 +1,229 @@
+"""RAW 文件头解析：只读取 TIFF/EXIF IFD 链获取尺寸和方向"""
+import struct
+
+import exif
+
+# === 读取限制 ===
+HEADER_BYTES = 64 * 1024    # 首次读取的文件头字节数
+MAX_IFDS = 64               # 最多解析的IFD数量（防止循环链）
+MAX_ENTRIES = 1024          # 单个IFD允许的最大条目数
+MAX_SEGMENTS = 64           # JPEG最多扫描的段数
+
+# 数据类型 -> (struct格式, 字节数)
+TYPE_FORMATS = {
+    1: ('B', 1), 3: ('H', 2), 4: ('I', 4), 5: ('II', 8),
+    6: ('b', 1), 8: ('h', 2), 9: ('i', 4), 10: ('ii', 8), 13: ('I', 4),
+}
+POINTER_TYPES = (4, 13)     # SubIFD和EXIF IFD指针只能是LONG或IFD类型
+
+RAF_MAGIC = b"FUJIFILMCCD-RAW "
+
+
+class RawProbeError(ValueError):
+    """文件头无法解析，需要回退到rawpy"""
+
+
+class _Source:
+    """带文件头缓存的有界随机读取"""
+
+    def __init__(self, f, head, base=0):
+        self.f = f
+        self.head = head
+        self.base = base
+
+    def sub(self, offset):
+        """以当前位置为基准的子数据源（如JPEG中的TIFF）"""
+        return _Source(self.f, self.head, self.base + offset)
+
+    def read(self, offset, size):
+        start = self.base + offset
+        if start < 0 or size < 0:
+            raise RawProbeError("无效的偏移量")
+        end = start + size
+        if end <= len(self.head):
+            return self.head[start:end]
+        if self.f is None:
+            raise RawProbeError("数据被截断")
+        self.f.seek(start)
+        data = self.f.read(size)
+        if len(data) < size:
+            raise RawProbeError("文件头被截断")
+        return data
+
+
+# === TIFF 解析 ===
+def _read_values(src, endian, typ, count, field_offset, limit):
+    """读取IFD条目的前limit个数值（内联或偏移存放）"""
+    fmt, size = TYPE_FORMATS[typ]
+    if size * count <= 4:
+        offset = field_offset
+    else:
+        offset = struct.unpack(endian + 'I', src.read(field_offset, 4))[0]
+    count = min(count, limit)
+    values = struct.unpack(endian + fmt * count, src.read(offset, size * count))
+    if typ in (5, 10):
+        return [n / d if d else 0 for n, d in zip(values[::2], values[1::2])]
+    return list(values)
+
+
+def _parse_tiff(src):
+    """遍历IFD链（含SubIFD和EXIF IFD），返回方向和候选尺寸"""
+    order = src.read(0, 2)
+    if order == b'II':
+        endian = '<'
+    elif order == b'MM':
+        endian = '>'
+    else:
+        raise RawProbeError("不是TIFF结构")
+
+    magic, first_ifd = struct.unpack(endian + 'HI', src.read(2, 6))
+    if magic not in exif.TIFF_MAGICS:
+        raise RawProbeError("未知的TIFF魔数")
+
+    orientation = None
+    sizes = []
+    pending = [first_ifd]
+    visited = set()
+
+    while pending and len(visited) < MAX_IFDS:
+        ifd_offset = pending.pop(0)
+        if ifd_offset == 0 or ifd_offset in visited:
+            continue
+        visited.add(ifd_offset)
+
+        count = struct.unpack(endian + 'H', src.read(ifd_offset, 2))[0]
+        if count > MAX_ENTRIES:
+            raise RawProbeError("IFD条目数异常")
+        entries = src.read(ifd_offset + 2, count * 12 + 4)
+
+        tags = {}
+        for i in range(count):
+            tag, typ, n = struct.unpack_from(endian + 'HHI', entries, i * 12)
+            if typ not in TYPE_FORMATS or n == 0:
+                continue
+            if tag in (exif.TAG_SUB_IFDS, exif.TAG_EXIF_IFD):
+                if typ not in POINTER_TYPES:
+                    continue
+                pending.extend(_read_values(src, endian, typ, n, ifd_offset + 2 + i * 12 + 8, MAX_IFDS))
+            elif tag in (exif.TAG_NEW_SUBFILE_TYPE, exif.TAG_IMAGE_WIDTH, exif.TAG_IMAGE_LENGTH,
+                         exif.TAG_ORIENTATION, exif.TAG_PIXEL_X, exif.TAG_PIXEL_Y, exif.TAG_DEFAULT_CROP_SIZE):
+                tags[tag] = _read_values(src, endian, typ, n, ifd_offset + 2 + i * 12 + 8, 2)
+
+        if orientation is None and exif.TAG_ORIENTATION in tags:
+            orientation = int(tags[exif.TAG_ORIENTATION][0])
+
+        if exif.TAG_IMAGE_WIDTH in tags and exif.TAG_IMAGE_LENGTH in tags:
+            width, height = int(tags[exif.TAG_IMAGE_WIDTH][0]), int(tags[exif.TAG_IMAGE_LENGTH][0])
+            # DNG：全尺寸图像以DefaultCropSize为准
+            crop = tags.get(exif.TAG_DEFAULT_CROP_SIZE)
+            if crop and len(crop) == 2 and crop[0] and crop[1]:
+                width, height = int(crop[0]), int(crop[1])
+            sizes.append((width, height))
+        if exif.TAG_PIXEL_X in tags and exif.TAG_PIXEL_Y in tags:
+            sizes.append((int(tags[exif.TAG_PIXEL_X][0]), int(tags[exif.TAG_PIXEL_Y][0])))
+
+        # 继续IFD链
+        pending.append(struct.unpack_from(endian + 'I', entries, count * 12)[0])
+
+    return orientation or 1, sizes
+
+
+def _largest(sizes):
+    """取面积最大的尺寸（通常为原始图像或全尺寸预览）"""
+    sizes = [s for s in sizes if s[0] > 0 and s[1] > 0]
+    if not sizes:
+        raise RawProbeError("未找到图像尺寸")
+    return max(sizes, key=lambda s: s[0] * s[1])
+
+
+# === JPEG 解析（RAF内嵌预览） ===
+def _read_meta(src, meta):
+    """按需读取拍摄时间和相机型号；失败时不影响尺寸和方向"""
+    if meta is None:
+        return
+    try:
+        exif.read_tags(src.read, meta, exif.TIFF_MAGICS)
+    except (ValueError, struct.error):
+        pass
+
+
+def _parse_jpeg(src, meta=None):
+    """扫描JPEG段，返回 (方向, 候选尺寸)；只读取段头和APP1"""
+    if src.read(0, 2) != b'\xff\xd8':
+        raise RawProbeError("不是JPEG数据")
+
+    orientation = 1
+    sizes = []
+    pos = 2
+    for _ in range(MAX_SEGMENTS):
+        marker, length = struct.unpack('>2sH', src.read(pos, 4))
+        if marker[0] != 0xFF:
+            break
+        code = marker[1]
+        if code == 0xDA:            # SOS：之后是图像数据
+            break
+        if code == 0xE1 and src.read(pos + 4, 6) == b'Exif\x00\x00':
+            try:
+                orientation, exif_sizes = _parse_tiff(src.sub(pos + 10))
+                sizes.extend(exif_sizes)
+                _read_meta(src.sub(pos + 10), meta)
+            except (RawProbeError, struct.error, KeyError, TypeError):
+                pass
+        elif 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', src.read(pos + 5, 4))
+            sizes.append((width, height))
+            break
+        pos += 2 + length
+
+    return orientation, sizes
+
+
+# === RAF 解析 ===
+def _probe_raf(src, meta):
+    """富士RAF：方向取自内嵌JPEG的EXIF，尺寸依次取EXIF、JPEG SOF、CFA头"""
+    jpeg_offset, _, cfa_offset, cfa_length = struct.unpack('>IIII', src.read(84, 16))
+
+    orientation, sizes = 1, []
+    if jpeg_offset:
+        try:
+            orientation, sizes = _parse_jpeg(src.sub(jpeg_offset), meta)
+        except (RawProbeError, struct.error):
+            pass
+
+    if not sizes and cfa_offset and cfa_length:
+        count = struct.unpack('>I', src.read(cfa_offset, 4))[0]
+        pos = cfa_offset + 4
+        for _ in range(min(count, MAX_ENTRIES)):
+            tag, size = struct.unpack('>HH', src.read(pos, 4))
+            if tag in (0x100, 0x111) and size >= 4:
+                height, width = struct.unpack('>HH', src.read(pos + 4, 4))
+                sizes.append((width, height))
+            pos += 4 + size
+
+    width, height = _largest(sizes)
+    return width, height, orientation
+
+
+# === 对外接口 ===
+def probe_raw_file(f, meta=None):
+    """从已打开的文件（或内存中的文件头）读取RAW的 (宽, 高, EXIF方向)，无法解析时抛出RawProbeError"""
+    head = f.read(HEADER_BYTES)
+    src = _Source(f, head)
+    try:
+        if head.startswith(RAF_MAGIC):
+            return _probe_raf(src, meta)
+        orientation, sizes = _parse_tiff(src)
+        width, height = _largest(sizes)
+        _read_meta(src, meta)
+        return width, height, orientation
+    except (struct.error, KeyError, TypeError) as e:
+        raise RawProbeError(f"文件头解析失败: {e}") from e
+
+
+def probe_raw(file_path, meta=None):
+    """读取RAW文件头，返回 (宽, 高, EXIF方向)，无法解析时抛出RawProbeError
+
+    meta为字典时同时读取拍摄时间和相机型号。
+    """
+    with open(file_path, 'rb') as f:
+        return probe_raw_file(f, meta)
@@ -0,0 +1,217 @@
+"""运行统计：按阶段和扩展名汇总耗时直方图和移动字节数，记录最慢的文件和失败原因，输出JSON报告"""
+import bisect
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# === 直方图配置 ===
+# 桶上界（秒）：10微秒起按1.5倍递增，约覆盖到两分钟；超出部分计入最后一个桶
+BUCKET_BOUNDS = tuple(1e-5 * 1.5 ** i for i in range(41))
+
+SLOWEST_FILES = 20      # 报告中列出的探测最慢的文件数
+MAX_FAILURES = 1000     # 报告中最多列出的失败文件数（总数另计）
+
+_DISABLED = nullcontext()
+
+
+class StageStats:
+    """单个 (阶段, 扩展名) 的计数、总耗时、最大耗时、字节数和耗时直方图"""
+    __slots__ = ('count', 'total', 'max', 'bytes', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, seconds, nbytes=0):
+        self.count += 1
+        self.total += seconds
+        self.bytes += nbytes
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+    def merge(self, data):
+        """合并export()导出的数据（如进程池中的统计）"""
+        count, total, maximum, nbytes, buckets = data
+        self.count += count
+        self.total += total
+        self.bytes += nbytes
+        self.max = max(self.max, maximum)
+        for index, n in enumerate(buckets):
+            self.buckets[index] += n
+
+    def export(self):
+        return self.count, self.total, self.max, self.bytes, list(self.buckets)
+
+    def percentile(self, p):
+        """由直方图估算的分位数（取所在桶的上界）"""
+        target = self.count * p
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 6),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p95_ms": round(min(self.percentile(0.95), self.max) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "bytes": self.bytes,
+        }
+
+
+class _Timer:
+    __slots__ = ('stats', 'stage', 'ext', 'start')
+
+    def __init__(self, stats, stage, ext):
+        self.stats, self.stage, self.ext = stats, stage, ext
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(self.stage, self.ext, time.perf_counter() - self.start)
+        return False
+
+
+class RunStats:
+    """线程安全的统计汇总；未启用时timer()和add()几乎没有开销"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stages = {}       # (阶段, 扩展名) -> StageStats
+        self._slowest = []      # 最小堆 [(探测耗时, 路径)]，保留最慢的SLOWEST_FILES个
+        self._failures = []     # [(路径, 原因)]
+        self._failure_count = 0
+
+    def timer(self, stage, ext):
+        """计时上下文：with stats.timer("probe.pil", ".jpg"): ..."""
+        return _Timer(self, stage, ext) if self.enabled else _DISABLED
+
+    def add(self, stage, ext, seconds, nbytes=0):
+        if not self.enabled:
+            return
+        with self._lock:
+            stage_stats = self._stages.get((stage, ext))
+            if stage_stats is None:
+                stage_stats = self._stages[(stage, ext)] = StageStats()
+            stage_stats.add(seconds, nbytes)
+
+    def add_file(self, path, seconds):
+        """记录单个文件的探测耗时"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._slowest) < SLOWEST_FILES:
+                heapq.heappush(self._slowest, (seconds, path))
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (seconds, path))
+
+    def add_failure(self, path, reason):
+        """记录探测失败的文件及原因"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._failure_count += 1
+            if len(self._failures) < MAX_FAILURES:
+                self._failures.append((path, reason))
+
+    def export_files(self):
+        """导出最慢文件的记录（进程池中的统计随结果一起返回）"""
+        with self._lock:
+            return list(self._slowest)
+
+    def merge_files(self, slowest):
+        for seconds, path in slowest:
+            self.add_file(path, seconds)
+
+    def export(self):
+        """导出可跨进程传递的原始数据"""
+        with self._lock:
+            return [(stage, ext, data.export()) for (stage, ext), data in self._stages.items()]
+
+    def merge(self, exported):
+        if not self.enabled:
+            return
+        with self._lock:
+            for stage, ext, data in exported:
+                stage_stats = self._stages.get((stage, ext))
+                if stage_stats is None:
+                    stage_stats = self._stages[(stage, ext)] = StageStats()
+                stage_stats.merge(data)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._slowest.clear()
+
+    def snapshot(self, **extra):
+        """报告：{"stages": {阶段: {扩展名: 统计}}, "totals": {阶段: 统计}, "histograms": 原始数据,
+        "slowest_files": [...], "failures": [...], ...}
+
+        histograms为export()的数据，合并多个报告（如分片运行）时可逐桶相加。
+        """
+        with self._lock:
+            stages, totals = {}, {}
+            for (stage, ext), data in sorted(self._stages.items()):
+                stages.setdefault(stage, {})[ext or "-"] = data.to_dict()
+                total = totals.setdefault(stage, StageStats())
+                total.merge(data.export())
+            slowest = [{"path": path, "seconds": round(seconds, 3)}
+                       for seconds, path in sorted(self._slowest, reverse=True)]
+            failures = [{"path": path, "reason": reason} for path, reason in self._failures]
+            failure_count = self._failure_count
+        return {
+            "started": self.started,
+            "elapsed_s": round(time.time() - self.started, 3),
+            **extra,
+            "stages": stages,
+            "totals": {stage: data.to_dict() for stage, data in totals.items()},
+            "histograms": self.export(),
+            "slowest_files": slowest,
+            "failure_count": failure_count,
+            "failures": failures,
+        }
+
+    def write_json(self, path, **extra):
+        """写入报告（先写临时文件再替换，读取方不会看到写了一半的文件）"""
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(**extra), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+
+class SnapshotWriter(threading.Thread):
+    """长时间运行时按固定间隔写出统计快照"""
+
+    def __init__(self, stats, path, interval, extra=None):
+        super().__init__(daemon=True)
+        self.stats = stats
+        self.path = path
+        self.interval = interval
+        self.extra = extra or (lambda: {})
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.stats.write_json(self.path, partial=True, **self.extra())
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
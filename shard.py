@@ -0,0 +1,170 @@
+"""分片运行：按相对目录路径的哈希把输入划分给多个进程或机器，并合并各分片的操作日志和统计报告
+
+同一目录下的文件总是属于同一个分片，因此各分片写入的分类目录互不重叠，无需协调服务。
+"""
+import hashlib
+import json
+import os
+import time
+
+import journal
+import run_stats
+
+
+class ShardError(ValueError):
+    """分片参数或分片日志无效"""
+
+
+def parse_spec(text):
+    """解析 "i/N"（i从1开始），返回 (i, N)"""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ShardError(f"分片格式应为 i/N: {text}") from None
+    if count < 1 or not 1 <= index <= count:
+        raise ShardError(f"分片序号应在 1 到 {max(count, 1)} 之间: {text}")
+    return index, count
+
+
+def format_spec(index, count):
+    return f"{index}/{count}"
+
+
+def shard_of(relative_dir, count):
+    """目录所属的分片（从1开始）；路径统一用 / 分隔，不同平台上结果一致"""
+    key = relative_dir.replace(os.sep, '/').strip('/')
+    if key == '.':
+        key = ''
+    digest = hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count + 1
+
+
+def owns(root, directory, index, count):
+    """directory（位于输入路径root下）是否由分片 index/count 处理"""
+    return shard_of(os.path.relpath(directory, root), count) == index
+
+
+def suffixed(path, index, count):
+    """在扩展名前加上分片后缀：stats.json -> stats.shard1of4.json"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.shard{index}of{count}{ext}"
+
+
+# === 合并 ===
+class ShardSummary:
+    """一个分片日志的合并结果：移动和解压的文件数不含之后记录为失败的操作"""
+    __slots__ = ('path', 'shard', 'moved', 'extracted', 'duplicates', 'completed', 'stats')
+
+    def __init__(self, path, header):
+        self.path = path
+        self.shard = header.get("shard")
+        self.moved = 0
+        self.extracted = 0
+        self.duplicates = 0
+        self.completed = False
+        self.stats = header.get("stats")     # 分片统计报告路径（未启用时为None）
+
+
+def _check_headers(paths):
+    headers = []
+    for path in paths:
+        header = journal.read_header(path)
+        if not header.get("shard"):
+            raise ShardError(f"不是分片运行的操作日志: {path}")
+        headers.append(header)
+
+    counts = {parse_spec(header["shard"])[1] for header in headers}
+    if len(counts) > 1:
+        raise ShardError("分片日志来自不同的分片数")
+    seen = set()
+    for path, header in zip(paths, headers):
+        if header["shard"] in seen:
+            raise ShardError(f"分片 {header['shard']} 重复: {path}")
+        seen.add(header["shard"])
+    if len({header["separate_mode"] for header in headers}) > 1 \
+            or len({header.get("template") for header in headers}) > 1:
+        raise ShardError("分片日志的分类模式或目录模板不一致")
+    return headers
+
+
+def merge_journals(paths, output_path):
+    """把各分片的操作日志合并为一个可撤销的日志，返回 [ShardSummary]
+
+    合并后的日志按分片依次包含除start/end以外的全部记录（移动、解压、重复文件、失败等），
+    撤销和续跑据此判断哪些操作已被之后的记录取代；各分片的分类目录互不重叠，撤销时的先后顺序不影响结果。
+    已撤销过的分片日志不能合并。
+    """
+    headers = _check_headers(paths)
+    output_path = os.path.abspath(output_path)
+    if any(os.path.abspath(path) == output_path for path in paths):
+        raise ShardError("合并输出不能覆盖分片日志")
+
+    all_paths = []
+    for header in headers:
+        all_paths.extend(p for p in header["paths"] if p not in all_paths)
+    merged = journal.Journal(output_path, truncate=True)
+    summaries = []
+    try:
+        merged.record("start", version=journal.JOURNAL_VERSION, time=time.time(), paths=all_paths,
+                      separate_mode=headers[0]["separate_mode"], template=headers[0].get("template"),
+                      merged_from=[os.path.abspath(path) for path in paths])
+        for path, header in zip(paths, headers):
+            summary = ShardSummary(path, header)
+            for record in journal.iter_records(path):
+                op = record.get("op")
+                if op == "undo":
+                    raise ShardError(f"分片日志已撤销过，不能合并: {path}")
+                if op == "end":
+                    summary.completed = True
+                    continue
+                if op == "start":
+                    continue
+                merged.record(**record)
+                if op == "move":
+                    summary.moved += 1
+                elif op == "extract":
+                    summary.extracted += 1
+                elif op == "duplicate":
+                    summary.duplicates += 1
+                elif op == "failed":
+                    # 失败记录取代之前同一文件的移动或解压记录
+                    if "archive" in record:
+                        summary.extracted -= 1
+                    elif "src" in record:
+                        summary.moved -= 1
+            summaries.append(summary)
+        merged.record("end", processed=sum(summary.moved + summary.extracted for summary in summaries))
+    except BaseException:
+        merged.close()
+        os.remove(output_path)
+        raise
+    merged.close()
+    return summaries
+
+
+def merge_stats(summaries, output_path):
+    """合并各分片的统计报告（直方图逐桶相加），写入output_path；返回合并的分片报告数"""
+    merged = run_stats.RunStats(enabled=True)
+    counters = {}
+    started, elapsed, merged_count = None, 0.0, 0
+    for summary in summaries:
+        if not summary.stats:
+            continue
+        try:
+            with open(summary.stats, encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        merged.merge(report.get("histograms", []))
+        merged.merge_files((item["seconds"], item["path"]) for item in report.get("slowest_files", []))
+        for item in report.get("failures", []):
+            merged.add_failure(item["path"], item["reason"])
+        for name in ("processed_files", "duplicate_files", "ignored_files", "failed_files"):
+            counters[name] = counters.get(name, 0) + report.get(name, 0)
+        started = min(started, report["started"]) if started is not None else report["started"]
+        elapsed = max(elapsed, report.get("elapsed_s", 0.0))
+        merged_count += 1
+    if merged_count:
+        merged.started = started
+        merged.write_json(output_path, elapsed_s=elapsed, shards=merged_count, **counters)
+    return merged_count
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 程序以顶层模块的形式组织，测试时从仓库根目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+import os
+
+import MediaClassifier as mc
+import output_dirs
+
+
+def test_registry_is_shared_between_processes_and_leaves_folders_untouched(tmp_path):
+    registry_path = str(tmp_path / "output_dirs.txt")
+    library = tmp_path / "library"
+    source = library / "2019"
+    source.mkdir(parents=True)
+
+    # 一个进程新建分类目录，另一个进程（独立的登记表对象）扫描时能查到
+    writer = output_dirs.OutputDirs(registry_path)
+    reader = output_dirs.OutputDirs(registry_path)
+    target_dirs = mc.TargetDirs(registry=writer)
+    target = target_dirs.reserve(str(library / "2019" / "横屏图片"), "a.jpg")
+
+    assert os.listdir(os.path.dirname(target)) == []
+    assert os.path.dirname(target) in reader
+    assert str(source) not in reader
+
+    # 写了一半的行不读入，写完后再读入
+    with open(registry_path, 'ab') as f:
+        f.write(str(library / "other").encode())
+    assert str(library / "other") not in reader
+    with open(registry_path, 'ab') as f:
+        f.write(b"\n")
+    assert str(library / "other") in reader
+
+    writer.discard(os.path.dirname(target))
+    assert os.path.dirname(target) not in reader
@@ -0,0 +1,66 @@
+import os
+
+import MediaClassifier as mc
+import journal
+import shard
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _shard_journal(path, src_dir, spec, records):
+    run_journal = journal.create(str(path), [src_dir], True, "{orientation}{media}", shard=spec, stats=None)
+    for op, fields in records:
+        run_journal.record(op, **fields)
+    run_journal.record("end", processed=0)
+    run_journal.close()
+
+
+def test_merge_keeps_extract_and_failed_records_for_undo(tmp_path):
+    src_dir = str(tmp_path / "src")
+    out_dir = os.path.join(src_dir, "横屏图片")
+    moved_src, moved_dest = os.path.join(src_dir, "a.jpg"), os.path.join(out_dir, "a.jpg")
+    # b.jpg的第一个目标文件名被其他程序占用（大小相同、内容不同），改名后复制到b_1.jpg
+    copy_src, taken_dest = os.path.join(src_dir, "b.jpg"), os.path.join(out_dir, "b.jpg")
+    copy_dest = os.path.join(out_dir, "b_1.jpg")
+    archive = os.path.join(src_dir, "c.zip")
+    extract_dest = os.path.join(src_dir, "c", "横屏图片", "d.jpg")
+    _write(moved_dest, b"a" * 10)
+    _write(taken_dest, b"x" * 10)
+    _write(copy_dest, b"b" * 10)
+    _write(archive, b"zip")
+    _write(extract_dest, b"d" * 10)
+
+    first, second = tmp_path / "run.shard1of2.jsonl", tmp_path / "run.shard2of2.jsonl"
+    _shard_journal(first, src_dir, "1/2", [
+        ("move", {"src": moved_src, "dest": moved_dest}),
+        ("move", {"src": copy_src, "dest": taken_dest, "copy": True}),
+        ("failed", {"src": copy_src, "error": "目标文件已存在"}),
+        ("move", {"src": copy_src, "dest": copy_dest, "copy": True}),
+        ("extract", {"archive": archive, "member": "d.jpg", "dest": extract_dest}),
+    ])
+    _shard_journal(second, src_dir, "2/2", [])
+
+    merged = str(tmp_path / "merged.jsonl")
+    summaries = shard.merge_journals([str(first), str(second)], merged)
+    assert [(s.moved, s.extracted, s.completed) for s in summaries] == [(2, 1, True), (0, 0, True)]
+    ops = [record["op"] for record in journal.iter_records(merged)]
+    assert ops.count("extract") == 1 and ops.count("failed") == 1
+    assert ops[0] == "start" and ops[-1] == "end" and ops.count("start") == ops.count("end") == 1
+
+    mc.undo_operations(merged)
+
+    assert _read(moved_src) == b"a" * 10
+    assert _read(copy_src) == b"b" * 10
+    assert _read(taken_dest) == b"x" * 10      # 其他程序的文件保留
+    assert not os.path.exists(moved_dest) and not os.path.exists(copy_dest)
+    assert not os.path.exists(extract_dest)
+    assert _read(archive) == b"zip"
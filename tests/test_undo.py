@@ -0,0 +1,82 @@
+import os
+
+import MediaClassifier as mc
+import journal
+import transfer
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _journal(path, src_dir, records, completed=True):
+    run_journal = journal.create(str(path), [src_dir], True, "{orientation}{media}")
+    for op, fields in records:
+        run_journal.record(op, **fields)
+    if completed:
+        run_journal.record("end", processed=0)
+    run_journal.close()
+    return str(path)
+
+
+def test_undo_keeps_copy_when_a_same_size_file_replaced_the_source(tmp_path):
+    src_dir = str(tmp_path / "src")
+    out_dir = os.path.join(src_dir, "横屏图片")
+    # a.jpg的复制已完成；b.jpg的复制没有完成记录（进程在删除源文件前退出）
+    done_src, done_dest = os.path.join(src_dir, "a.jpg"), os.path.join(out_dir, "a.jpg")
+    open_src, open_dest = os.path.join(src_dir, "b.jpg"), os.path.join(out_dir, "b.jpg")
+    _write(done_dest, b"a" * 10)
+    _write(open_dest, b"b" * 10)
+    # 之后原位置出现了大小相同、内容不同的文件
+    _write(done_src, b"x" * 10)
+    _write(open_src, b"y" * 10)
+
+    path = _journal(tmp_path / "run.jsonl", src_dir, [
+        ("move", {"src": done_src, "dest": done_dest, "copy": True}),
+        ("copied", {"src": done_src, "dest": done_dest}),
+        ("move", {"src": open_src, "dest": open_dest, "copy": True}),
+    ], completed=False)
+
+    mc.undo_operations(path)
+
+    assert _read(done_dest) == b"a" * 10 and _read(done_src) == b"x" * 10
+    assert _read(open_dest) == b"b" * 10 and _read(open_src) == b"y" * 10
+
+
+def test_resume_finishes_only_unmarked_copies_with_identical_content(tmp_path):
+    src_dir = str(tmp_path / "src")
+    out_dir = os.path.join(src_dir, "横屏图片")
+    done_src, done_dest = os.path.join(src_dir, "a.jpg"), os.path.join(out_dir, "a.jpg")
+    same_src, same_dest = os.path.join(src_dir, "b.jpg"), os.path.join(out_dir, "b.jpg")
+    other_src, other_dest = os.path.join(src_dir, "c.jpg"), os.path.join(out_dir, "c.jpg")
+    part_src, part_dest = os.path.join(src_dir, "d.jpg"), os.path.join(out_dir, "d.jpg")
+    _write(done_dest, b"a" * 10)
+    _write(done_src, b"x" * 10)         # 完成后原位置出现的其他文件
+    _write(same_dest, b"b" * 10)
+    _write(same_src, b"b" * 10)         # 复制已改名为目标文件，源文件未删除
+    _write(other_dest, b"c" * 10)
+    _write(other_src, b"z" * 10)        # 大小相同、内容不同
+    _write(part_src, b"d" * 10)
+    _write(part_dest + transfer.PART_SUFFIX, b"d" * 4)
+
+    path = _journal(tmp_path / "run.jsonl", src_dir, [
+        ("move", {"src": done_src, "dest": done_dest, "copy": True}),
+        ("copied", {"src": done_src, "dest": done_dest}),
+        ("move", {"src": same_src, "dest": same_dest, "copy": True}),
+        ("move", {"src": other_src, "dest": other_dest, "copy": True}),
+        ("move", {"src": part_src, "dest": part_dest, "copy": True}),
+    ], completed=False)
+
+    mc.moved_targets(path)
+
+    assert _read(done_src) == b"x" * 10
+    assert not os.path.exists(same_src) and _read(same_dest) == b"b" * 10
+    assert _read(other_src) == b"z" * 10
+    assert _read(part_src) == b"d" * 10 and not os.path.exists(part_dest + transfer.PART_SUFFIX)
@@ -0,0 +1,172 @@
+"""文件移动：同一设备直接重命名，跨设备时在内核中复制数据，校验后再删除源文件；不覆盖已存在的目标文件"""
+import errno
+import os
+import shutil
+import threading
+
+# === 复制配置 ===
+COPY_CHUNK = 64 * 1024 * 1024   # copy_file_range/sendfile 每次请求的字节数
+BUFFER_SIZE = 8 * 1024 * 1024   # 无法在内核中复制时使用的缓冲区大小
+PART_SUFFIX = ".part"           # 复制过程中的临时文件后缀
+
+VERIFY_MODES = ("none", "size", "hash")
+
+# 内核复制不可用时回退到下一种方式的错误码
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+                    getattr(errno, "EOPNOTSUPP", errno.EINVAL), getattr(errno, "ENOTSUP", errno.EINVAL)}
+
+# 无法建立硬链接时改为“先占用目标名再替换”的错误码（如exFAT/FAT32、受保护的硬链接）
+_NO_LINK_ERRNOS = {errno.EPERM, errno.EMLINK, errno.ENOSYS,
+                   getattr(errno, "EOPNOTSUPP", errno.EPERM), getattr(errno, "ENOTSUP", errno.EPERM)}
+
+
+class TransferError(OSError):
+    """复制后校验失败，源文件保留"""
+
+
+_dir_devices = {}
+_dir_devices_lock = threading.Lock()
+
+
+def _device_of_dir(path):
+    """目标目录所在设备（按目录缓存）"""
+    with _dir_devices_lock:
+        device = _dir_devices.get(path)
+    if device is None:
+        device = os.stat(path).st_dev
+        with _dir_devices_lock:
+            _dir_devices[path] = device
+    return device
+
+
+def is_cross_device(src, dest_dir):
+    """源文件与目标目录是否位于不同设备"""
+    return os.stat(src).st_dev != _device_of_dir(dest_dir)
+
+
+# === 数据复制 ===
+def _copy_kernel(fsrc, fdst, copy_func):
+    """用copy_file_range或sendfile复制全部数据；一个字节都未复制时失败返回False"""
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    copied = 0
+    while True:
+        try:
+            n = copy_func(infd, outfd, copied)
+        except OSError as e:
+            if copied == 0 and e.errno in _FALLBACK_ERRNOS:
+                return False
+            raise
+        if n == 0:
+            return True
+        copied += n
+
+
+def _copy_buffered(fsrc, fdst):
+    buf = bytearray(BUFFER_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = fsrc.readinto(buf)
+        if not n:
+            return
+        fdst.write(view[:n])
+
+
+def copy_data(fsrc, fdst):
+    """复制文件内容：优先copy_file_range，其次sendfile，最后使用大缓冲区读写"""
+    if hasattr(os, "copy_file_range"):
+        if _copy_kernel(fsrc, fdst, lambda i, o, off: os.copy_file_range(i, o, COPY_CHUNK, off, off)):
+            return
+    if hasattr(os, "sendfile") and os.name == "posix":
+        # 指定输入偏移量，输出文件位置由sendfile自动推进
+        if _copy_kernel(fsrc, fdst, lambda i, o, off: os.sendfile(o, i, off, COPY_CHUNK)):
+            return
+    fsrc.seek(0)
+    fdst.seek(0)
+    fdst.truncate()
+    _copy_buffered(fsrc, fdst)
+
+
+# === 校验 ===
+def _file_hash(path):
+    import hashlib
+    digest = hashlib.blake2b()
+    buf = bytearray(BUFFER_SIZE)
+    view = memoryview(buf)
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                return digest.digest()
+            digest.update(view[:n])
+
+
+def verify_copy(src, dest, mode):
+    """按mode（none/size/hash）比较源文件和副本"""
+    if mode == "none":
+        return
+    if os.stat(src).st_size != os.stat(dest).st_size:
+        raise TransferError(f"复制后文件大小不一致: {os.path.basename(src)}")
+    if mode == "hash" and _file_hash(src) != _file_hash(dest):
+        raise TransferError(f"复制后内容校验失败: {os.path.basename(src)}")
+
+
+# === 对外接口 ===
+def _exists_error(path):
+    return FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+
+
+def rename_no_replace(src, dest):
+    """同一设备内改名；dest已存在时抛出FileExistsError，不覆盖
+
+    POSIX的rename会静默覆盖已有文件，因此先建立硬链接（目标已存在时失败）再删除源文件名；
+    不支持硬链接的文件系统先以O_EXCL创建占位文件再替换。Windows的rename本身不覆盖已有文件。
+    """
+    if os.name == "nt":
+        os.rename(src, dest)
+        return
+    try:
+        os.link(src, dest, follow_symlinks=False)
+    except OSError as e:
+        if e.errno not in _NO_LINK_ERRNOS:
+            raise
+        os.close(os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        try:
+            os.replace(src, dest)
+        except BaseException:
+            os.remove(dest)
+            raise
+        return
+    os.unlink(src)
+
+
+def copy_across(src, dest, verify="size"):
+    """跨设备移动：复制到临时文件并校验，改名为目标文件后再删除源文件"""
+    if os.path.lexists(dest):
+        raise _exists_error(dest)       # 复制前先检查，避免白白复制整个文件
+    part = dest + PART_SUFFIX
+    try:
+        with open(src, 'rb') as fsrc, open(part, 'wb') as fdst:
+            copy_data(fsrc, fdst)
+        shutil.copystat(src, part)
+        verify_copy(src, part, verify)
+        rename_no_replace(part, dest)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+    os.remove(src)
+
+
+def move(src, dest, cross_device, verify="size"):
+    """移动文件；cross_device为False时只做一次重命名。dest已存在时抛出FileExistsError"""
+    if not cross_device:
+        try:
+            rename_no_replace(src, dest)
+            return
+        except OSError as e:
+            # 部分文件系统（如overlayfs）设备号相同但不支持跨目录重命名
+            if e.errno != errno.EXDEV:
+                raise
+    copy_across(src, dest, verify)
@@ -0,0 +1,237 @@
+"""视频文件头解析：在进程内读取容器结构获取分辨率和旋转角度，按需读取拍摄时间和设备型号"""
+import math
+import os
+import struct
+from datetime import datetime
+
+import container_probe
+import exif
+
+# === 读取限制 ===
+MAX_BOXES = 4096            # 每一层最多遍历的box数量
+MAX_PAYLOAD = 4096          # 单个box最多读取的字节数
+
+# ISO-BMFF 容器（MP4/MOV/M4V/3GP）
+MP4_EXTS = ('.mp4', '.mov', '.m4v', '.3gp')
+# 进程内解析文件头的全部视频格式（其余容器见container_probe）
+HEADER_EXTS = MP4_EXTS + container_probe.CONTAINER_EXTS
+
+MAC_EPOCH_OFFSET = 2082844800     # 1904-01-01 到 1970-01-01 的秒数
+
+# QuickTime元数据键（iPhone等设备写入，时间为拍摄地本地时间）
+APPLE_KEYS = {
+    b'com.apple.quicktime.creationdate': "taken",
+    b'com.apple.quicktime.make': "make",
+    b'com.apple.quicktime.model': "model",
+}
+# udta中的用户数据
+UDTA_KEYS = {b'\xa9day': "taken", b'\xa9mak': "make", b'\xa9mod': "model"}
+
+
+class VideoProbeError(ValueError):
+    """容器无法解析，需要回退到ffmpeg"""
+
+
+# === ISO-BMFF box 读取 ===
+def iter_boxes(f, start, end):
+    """遍历 [start, end) 范围内的box，返回 (类型, 数据起点, box终点)；只读取box头"""
+    pos = start
+    for _ in range(MAX_BOXES):
+        if pos + 8 > end:
+            return
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            largesize = f.read(8)
+            if len(largesize) < 8:
+                return
+            size = struct.unpack('>Q', largesize)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            raise VideoProbeError(f"box大小异常: {box_type!r}")
+        yield box_type, pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def find_box(f, start, end, *path):
+    """按路径查找嵌套box，返回 (数据起点, box终点)，未找到返回None"""
+    for box_type in path:
+        for found_type, payload_start, box_end in iter_boxes(f, start, end):
+            if found_type == box_type:
+                start, end = payload_start, box_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def read_payload(f, start, end, limit=MAX_PAYLOAD):
+    """读取box数据（最多limit字节）"""
+    f.seek(start)
+    return f.read(min(end - start, limit))
+
+
+# === MP4/MOV 解析 ===
+def _matrix_rotation(matrix):
+    """由tkhd显示矩阵计算旋转角度（0/90/180/270）"""
+    a, b = matrix[0] / 65536, matrix[1] / 65536
+    if a == 0 and b == 0:
+        return 0
+    return round(math.degrees(math.atan2(b, a))) % 360
+
+
+def _probe_track(f, start, end):
+    """解析单个trak，非视频轨道返回None"""
+    hdlr = find_box(f, start, end, b'mdia', b'hdlr')
+    if not hdlr or read_payload(f, *hdlr)[8:12] != b'vide':
+        return None
+
+    tkhd = find_box(f, start, end, b'tkhd')
+    if not tkhd:
+        raise VideoProbeError("缺少tkhd")
+    data = read_payload(f, *tkhd)
+    if len(data) < 84:
+        raise VideoProbeError("tkhd被截断")
+    matrix_offset = 52 if data[0] == 1 else 40
+    matrix = struct.unpack_from('>9i', data, matrix_offset)
+    track_width, track_height = struct.unpack_from('>II', data, matrix_offset + 36)
+
+    # 编码尺寸取自stsd的第一个视觉样本描述（与ffmpeg输出一致）
+    width = height = 0
+    stsd = find_box(f, start, end, b'mdia', b'minf', b'stbl', b'stsd')
+    if stsd:
+        data = read_payload(f, *stsd, limit=64)
+        if len(data) >= 44:
+            width, height = struct.unpack_from('>HH', data, 40)
+    if not width or not height:
+        width, height = track_width >> 16, track_height >> 16
+    if not width or not height:
+        raise VideoProbeError("视频轨道尺寸为0")
+
+    return width, height, _matrix_rotation(matrix)
+
+
+# === 元数据 ===
+def _iso_datetime(text):
+    """ "2023-05-01T12:34:56+0800" -> "2023-05-01 12:34:56"（保留拍摄地本地时间）"""
+    text = text.strip()
+    if len(text) < 19 or not text[:4].isdigit():
+        return None
+    return f"{text[:10]} {text[11:19]}"
+
+
+def _apple_keys(f, start, end):
+    """读取moov/meta中的keys和ilst，返回 {字段: 文本}"""
+    if read_payload(f, start, end, 4) == bytes(4):
+        start += 4                          # ISO格式的meta是FullBox
+    names = []
+    values = {}
+    for box_type, box_start, box_end in iter_boxes(f, start, end):
+        if box_type == b'keys':
+            data = read_payload(f, box_start, box_end)
+            pos = 8
+            for _ in range(struct.unpack_from('>I', data, 4)[0]):
+                if pos + 8 > len(data):
+                    break
+                size = struct.unpack_from('>I', data, pos)[0]
+                if size < 8:
+                    break
+                names.append(data[pos + 8:pos + size])
+                pos += size
+        elif box_type == b'ilst':
+            for item_type, item_start, item_end in iter_boxes(f, box_start, box_end):
+                index = struct.unpack('>I', item_type)[0]
+                if not 1 <= index <= len(names) or names[index - 1] not in APPLE_KEYS:
+                    continue
+                data_box = find_box(f, item_start, item_end, b'data')
+                if data_box:
+                    text = read_payload(f, *data_box, limit=256)[8:]
+                    values[APPLE_KEYS[names[index - 1]]] = text.decode('utf-8', 'replace')
+    return values
+
+
+def _udta(f, start, end):
+    """读取udta中的©day/©mak/©mod（2字节长度、2字节语言代码后为文本）"""
+    values = {}
+    for box_type, box_start, box_end in iter_boxes(f, start, end):
+        if box_type in UDTA_KEYS:
+            data = read_payload(f, box_start, box_end, limit=256)
+            if len(data) >= 4:
+                size = struct.unpack_from('>H', data)[0]
+                values[UDTA_KEYS[box_type]] = data[4:4 + size].decode('utf-8', 'replace')
+    return values
+
+
+def _read_metadata(f, start, end, meta):
+    """填写 meta["taken"] 和 meta["camera"]：优先QuickTime键，其次udta，时间最后取mvhd（UTC转为本地时间）"""
+    apple, user, created = {}, {}, None
+    for box_type, box_start, box_end in iter_boxes(f, start, end):
+        if box_type == b'meta':
+            apple.update(_apple_keys(f, box_start, box_end))
+        elif box_type == b'udta':
+            user.update(_udta(f, box_start, box_end))
+        elif box_type == b'mvhd':
+            data = read_payload(f, box_start, box_end, 16)
+            if len(data) < 12:
+                continue
+            seconds = struct.unpack_from('>Q' if data[0] == 1 else '>I', data, 4)[0]
+            if seconds > MAC_EPOCH_OFFSET + 86400:
+                created = datetime.fromtimestamp(seconds - MAC_EPOCH_OFFSET).strftime("%Y-%m-%d %H:%M:%S")
+
+    values = {**user, **apple}
+    taken = _iso_datetime(values.get("taken", "")) or created
+    if taken:
+        meta.setdefault("taken", taken)
+    camera = exif.camera_name(values.get("make"), values.get("model"))
+    if camera:
+        meta.setdefault("camera", camera)
+
+
+def probe_mp4_file(f, meta=None):
+    """从已打开的文件（或内存中的文件头）读取第一条视频轨道的 (宽, 高, 旋转角度)
+
+    meta为字典时同时读取拍摄时间和设备型号（元数据损坏不影响分辨率）。
+    """
+    file_size = f.seek(0, os.SEEK_END)
+    try:
+        moov = find_box(f, 0, file_size, b'moov')
+        if not moov:
+            raise VideoProbeError("未找到moov")
+        if meta is not None:
+            try:
+                _read_metadata(f, *moov, meta)
+            except (struct.error, IndexError, ValueError, OverflowError, OSError):
+                pass
+        for box_type, start, end in iter_boxes(f, *moov):
+            if box_type == b'trak':
+                result = _probe_track(f, start, end)
+                if result:
+                    return result
+    except VideoProbeError:
+        raise
+    except (struct.error, IndexError, ValueError) as e:
+        raise VideoProbeError(f"容器解析失败: {e}") from e
+    raise VideoProbeError("未找到视频轨道")
+
+
+def probe_video_file(f, meta=None):
+    """按文件头魔数选择解析器：AVI/Matroska/FLV/ASF/MPEG由container_probe解析，其余按ISO-BMFF解析"""
+    f.seek(0)
+    if container_probe.sniff(f.read(16)) is None:
+        return probe_mp4_file(f, meta)
+    try:
+        return container_probe.probe_container_file(f, meta)
+    except container_probe.ContainerProbeError as e:
+        raise VideoProbeError(str(e)) from e
+
+
+def probe_video(file_path, meta=None):
+    """读取HEADER_EXTS中任一格式的视频文件头，返回 (宽, 高, 旋转角度)"""
+    with open(file_path, 'rb') as f:
+        return probe_video_file(f, meta)
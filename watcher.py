@@ -0,0 +1,223 @@
+"""监视文件夹：Linux上使用inotify，其他平台按目录修改时间轮询；文件大小和修改时间稳定后才交给分类"""
+import os
+import select
+import struct
+import sys
+import time
+
+# === 默认配置 ===
+SETTLE_SECONDS = 2.0        # 文件大小和修改时间保持不变多久才视为写入完成
+POLL_INTERVAL = 2.0         # 轮询模式下检查目录的间隔（秒）
+
+# === inotify 常量 ===
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _walk_dirs(root, skip_dir):
+    """返回root及其所有子目录（跳过skip_dir(目录)返回True的目录和符号链接）"""
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        yield path
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False) and not skip_dir(entry.path):
+                        stack.append(entry.path)
+        except OSError:
+            continue
+
+
+def _list_dir(path):
+    """返回 (文件名集合, 子目录路径列表)"""
+    files, subdirs = set(), []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.add(entry.name)
+    except OSError:
+        pass
+    return files, subdirs
+
+
+class PollingWatcher:
+    """按目录修改时间轮询：只stat目录，目录有变化时才重新列出其中的文件"""
+
+    def __init__(self, root, skip_dir, interval=POLL_INTERVAL):
+        self.root = root
+        self.skip_dir = skip_dir
+        self.interval = interval
+        self._dirs = {}         # 目录 -> (修改时间, 已知文件名集合)
+        for path in _walk_dirs(root, skip_dir):
+            self._remember(path)
+
+    def _remember(self, path):
+        """记录目录状态，返回 (文件名集合, 子目录路径列表)"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return set(), []
+        names, subdirs = _list_dir(path)
+        self._dirs[path] = (mtime, names)
+        return names, subdirs
+
+    def wait(self, timeout=None):
+        """等待一个轮询周期（有待定文件时不超过timeout），返回新出现的文件路径"""
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        found = []
+        for path, (mtime, names) in list(self._dirs.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                del self._dirs[path]
+                continue
+            if current == mtime:
+                continue
+            new_names, subdirs = self._remember(path)
+            found.extend(os.path.join(path, name) for name in sorted(new_names - names))
+            # 新建的子目录：其中已有的文件都视为新文件
+            for subdir in subdirs:
+                if subdir in self._dirs or self.skip_dir(subdir):
+                    continue
+                for sub in _walk_dirs(subdir, self.skip_dir):
+                    files, _ = self._remember(sub)
+                    found.extend(os.path.join(sub, name) for name in sorted(files))
+        return found
+
+    def close(self):
+        self._dirs.clear()
+
+
+class InotifyWatcher:
+    """基于inotify的监视：空闲时阻塞在select上，不占用CPU"""
+
+    def __init__(self, root, skip_dir):
+        import ctypes
+        import ctypes.util
+
+        self.skip_dir = skip_dir
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._wds = {}          # 监视描述符 -> 目录
+        self.overflowed = False
+        for path in _walk_dirs(root, skip_dir):
+            self._add_watch(path)
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd >= 0:
+            self._wds[wd] = path
+
+    def _add_tree(self, path):
+        """监视新出现的目录树，并返回其中已有的文件（在添加监视之前写入的）"""
+        found = []
+        for sub in _walk_dirs(path, self.skip_dir):
+            self._add_watch(sub)
+            files, _ = _list_dir(sub)
+            found.extend(os.path.join(sub, name) for name in sorted(files))
+        return found
+
+    def wait(self, timeout=None):
+        """等待事件（timeout为None时一直阻塞），返回写入完成或移入的文件路径"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        found = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            directory = self._wds.get(wd)
+            if mask & IN_IGNORED:
+                self._wds.pop(wd, None)
+                continue
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self.skip_dir(path):
+                    found.extend(self._add_tree(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                found.append(path)
+        return found
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(root, skip_dir, interval=POLL_INTERVAL):
+    """Linux上优先使用inotify，不可用时回退到轮询"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, skip_dir)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root, skip_dir, interval)
+
+
+class StabilityTracker:
+    """防抖：记录待定文件的大小和修改时间，保持不变达到settle秒后才返回"""
+
+    def __init__(self, settle=SETTLE_SECONDS):
+        self.settle = settle
+        self._pending = {}      # 路径 -> ((大小, 修改时间), 首次观察到该状态的时间)
+
+    def add(self, path):
+        if path not in self._pending:
+            self._pending[path] = (None, time.monotonic())
+
+    def __len__(self):
+        return len(self._pending)
+
+    def timeout(self):
+        """下一次检查前的等待时间；没有待定文件时返回None"""
+        return self.settle / 2 if self._pending else None
+
+    def ready(self):
+        """返回已稳定的文件（按路径排序），已消失的文件直接丢弃"""
+        now = time.monotonic()
+        stable = []
+        for path, (signature, since) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != signature:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle:
+                del self._pending[path]
+                stable.append(path)
+        return sorted(stable)